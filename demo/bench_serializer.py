@@ -0,0 +1,81 @@
+# coding=utf-8
+"""
+DictBase序列化性能测试，对比生成的序列化函数与通用序列化逻辑
+
+用法: python -m demo.bench_serializer [行数] [重复次数]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+import timeit
+
+from sqlalchemy import Column, ForeignKey, String, INTEGER, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+from neptune.db import dictbase
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Department(Base, DictBase):
+    __tablename__ = 'department'
+
+    id = Column(INTEGER, primary_key=True)
+    name = Column(String(63), nullable=False)
+
+
+class Address(Base, DictBase):
+    __tablename__ = 'address'
+
+    id = Column(INTEGER, primary_key=True)
+    location = Column(String(63), nullable=False)
+    user_id = Column(ForeignKey(u'user.id'), nullable=False)
+
+
+class User(Base, DictBase):
+    __tablename__ = 'user'
+    attributes = ['id', 'name', 'department_id', 'age', 'department', 'addresses']
+
+    id = Column(INTEGER, primary_key=True)
+    name = Column(String(63), nullable=False)
+    department_id = Column(ForeignKey(u'department.id'), nullable=False)
+    age = Column(INTEGER, nullable=True)
+
+    department = relationship(u'Department', lazy='joined')
+    addresses = relationship(u'Address', lazy='selectin', uselist=True)
+
+
+def load_users(rows):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    departments = [Department(id=i, name='department-%d' % i) for i in range(10)]
+    session.add_all(departments)
+    for i in range(rows):
+        session.add(User(id=i, name='user-%d' % i, department_id=i % 10, age=i % 60))
+        session.add(Address(id=i, location='location-%d' % i, user_id=i))
+    session.commit()
+    session.close()
+    return session.query(User).all()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    number = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    users = load_users(rows)
+    get_serializer = dictbase._get_serializer
+    for level in ('to_dict', 'to_summary_dict'):
+        dictbase._get_serializer = lambda *args: None
+        generic = timeit.timeit(lambda: [getattr(u, level)() for u in users], number=number)
+        dictbase._get_serializer = get_serializer
+        generated = timeit.timeit(lambda: [getattr(u, level)() for u in users], number=number)
+        print('%-16s rows=%d generic=%.1fus/row generated=%.1fus/row speedup=%.1fx' % (
+            level, rows, generic / number / rows * 1e6, generated / number / rows * 1e6, generic / generated))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,23 @@ import threading
 
 
 def singleton(cls):
-    """单例模式装饰器"""
+    """单例模式装饰器，实例创建后的获取不加锁(双重检查锁定)"""
     instances = {}
     lock = threading.Lock()
 
     def _singleton(*args, **kwargs):
-        with lock:
-            fullkey = str((cls.__module__, cls.__name__, tuple(args), tuple(kwargs.items())))
-            if fullkey not in instances:
-                instances[fullkey] = cls(*args, **kwargs)
-        return instances[fullkey]
+        fullkey = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        try:
+            instance = instances.get(fullkey)
+        except TypeError:
+            # 参数不可哈希时使用字符串作为key
+            fullkey = str((args, tuple(sorted(kwargs.items()))))
+            instance = instances.get(fullkey)
+        if instance is None:
+            with lock:
+                instance = instances.get(fullkey)
+                if instance is None:
+                    instance = instances[fullkey] = cls(*args, **kwargs)
+        return instance
 
     return _singleton
@@ -22,6 +22,39 @@ import uuid
 
 import six
 
+try:
+    from contextvars import ContextVar
+except ImportError:
+    import threading
+
+    class ContextVar(object):
+        """python2下使用线程局部变量模拟contextvars.ContextVar，仅支持get/set/reset"""
+        _MISSING = object()
+
+        def __init__(self, name, default=_MISSING):
+            self.name = name
+            self._default = default
+            self._local = threading.local()
+
+        def get(self, default=_MISSING):
+            value = getattr(self._local, 'value', self._MISSING)
+            if value is self._MISSING:
+                value = self._default if default is self._MISSING else default
+            if value is self._MISSING:
+                raise LookupError(self.name)
+            return value
+
+        def set(self, value):
+            token = getattr(self._local, 'value', self._MISSING)
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            if token is self._MISSING:
+                del self._local.value
+            else:
+                self._local.value = token
+
 
 class ComplexEncoder(json.JSONEncoder):
     """加强版的JSON Encoder，支持日期、日期+时间类型的转换"""
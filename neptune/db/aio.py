@@ -0,0 +1,430 @@
+# coding=utf-8
+"""
+本模块提供基于SQLAlchemy asyncio扩展的异步数据库操作(仅支持python3.7+，SQLAlchemy>=1.4)
+
+AsyncResourceBase复用ResourceBase的过滤条件、默认过滤/排序以及DictBase序列化逻辑，
+同步逻辑通过AsyncSession.run_sync在异步驱动(aiomysql/asyncpg/aiosqlite)的连接上执行，不占用线程
+
+eg.
+
+POOL.reflesh({'connection': 'sqlite+aiosqlite:///test.db'})
+
+class User(AsyncResourceBase):
+    orm_meta = models.User
+    _default_filter = {'removed': None}
+
+users = await User().list({'age': {'gt': 18}})
+"""
+
+from __future__ import absolute_import
+
+import contextlib
+import contextvars
+
+from sqlalchemy.orm import sessionmaker
+from neptune.core import decorators as deco
+from neptune.core import exceptions
+from neptune.core import utils
+from neptune.core.i18n import _
+from neptune.db import crud
+from neptune.db import pool
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:
+    AsyncSession = None
+    create_async_engine = None
+
+# AsyncResourceBase子类 -> 对应的同步资源类
+_SYNC_CLASSES = {}
+# 当前异步任务中各资源对象开启的事务，id(资源对象) -> AsyncSession，同一资源对象可被多个任务并发使用
+_ACTIVE_TRANSACTIONS = contextvars.ContextVar('neptune_async_transactions', default={})
+# 当前异步任务中各连接池的工作单元会话，id(连接池) -> AsyncSession
+_SCOPES = contextvars.ContextVar('neptune_async_scopes', default={})
+# AsyncSession.info中标记工作单元中正在执行的写事务
+_SCOPE_WRITING_KEY = 'neptune.scope_writing'
+
+
+class AsyncDBPool(object):
+    """异步数据库连接池"""
+
+    def __init__(self, param=None):
+        """初始化连接池
+
+        :param param: 连接信息
+        {connection: xxx, [pool_size: xxx], [pool_recycle: xxx], [pool_timeout: xxx], [max_overflow: xxx]}
+        :type param: dict
+        """
+        self._engine = None
+        self._pool = None
+        if param:
+            self.reflesh(param=param)
+
+    def get_session(self):
+        """从连接池中获取一个异步会话对象
+
+        :returns: 会话对象
+        :rtype: `AsyncSession`
+        :raises: ValueError
+        """
+        if self._pool:
+            return self._pool()
+        raise ValueError('failed to get session')
+
+    def current_session(self, write=False):
+        """
+        获取当前异步任务中本连接池的工作单元会话
+
+        :param write: 是否用于写操作，仅为与DBPool接口一致
+        :type write: bool
+        :returns: 会话对象，不在scope()中时返回None
+        :rtype: `AsyncSession`
+        """
+        return _SCOPES.get().get(id(self))
+
+    @contextlib.asynccontextmanager
+    async def scope(self):
+        """
+        异步工作单元上下文，上下文中所有使用本连接池的AsyncResourceBase共享同一个会话以及数据库连接，退出时统一释放，
+        参见DBPool.scope；在上下文中创建的任务会继承该会话，会话不能被并发使用，并发任务请分别使用各自的scope
+
+        eg.
+
+        async with POOL.scope():
+
+            await User().list(filters)
+
+            await Address().create_many(rows)
+
+        :returns: 会话对象
+        :rtype: `AsyncSession`
+        :raises: ValueError
+        """
+        session = self.current_session()
+        if session is not None:
+            yield session
+            return
+        if not self._pool:
+            raise ValueError('failed to get session')
+        async with self._engine.connect() as connection:
+            session = self._pool(bind=connection)
+            scopes = dict(_SCOPES.get())
+            scopes[id(self)] = session
+            token = _SCOPES.set(scopes)
+            try:
+                yield session
+                if session.in_transaction():
+                    await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                _SCOPES.reset(token)
+                await session.close()
+
+    def reflesh(self, param):
+        """
+        重建连接池
+
+        :param param: 连接信息，connection需使用异步驱动，如mysql+aiomysql、postgresql+asyncpg、sqlite+aiosqlite
+        {connection: xxx, [pool_size: xxx], [pool_recycle: xxx], [pool_timeout: xxx], [max_overflow: xxx]}
+        :type param: dict
+        :returns: 是否重建成功
+        :rtype: bool
+        :raises: CriticalError
+        """
+        if create_async_engine is None:
+            raise exceptions.CriticalError(msg=_('asyncio support requires SQLAlchemy>=1.4'))
+        param = dict(param)
+        echo = param.get('echo', 'DEBUG')
+        if utils.is_string_type(echo):
+            param['echo'] = echo.upper() == 'DEBUG'
+        connection = param.pop('connection')
+        self._engine = create_async_engine(connection, **param)
+        self._pool = sessionmaker(bind=self._engine, class_=AsyncSession, expire_on_commit=False)
+        return True
+
+    async def dispose(self):
+        """关闭连接池中的所有连接"""
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    def _stop_maintainer(self):
+        """异步连接池没有最小空闲连接维护线程，供AsyncPoolRegistry替换连接池时调用"""
+        pass
+
+
+@deco.singleton
+class DefaultAsyncDBPool(AsyncDBPool):
+    '''
+    默认db配置用的单例异步数据库连接池
+    '''
+    pass
+
+
+POOL = DefaultAsyncDBPool()
+
+
+class AsyncPoolRegistry(pool.PoolRegistry):
+    """
+    命名异步数据库连接池注册表，名称default对应默认异步连接池POOL，用法与pool.PoolRegistry一致
+
+    eg.
+
+    REGISTRY.configure({'report': {'connection': 'mysql+aiomysql://...'}})
+
+    class Report(AsyncResourceBase):
+        orm_meta = models.Report
+        _dbpool_name = 'report'
+    """
+
+    def configure(self, config):
+        """
+        根据配置创建或重建命名异步连接池，已存在的连接池原地重建(保持对象不变)
+
+        :param config: {名称: 连接信息}，参见AsyncDBPool.reflesh，不支持分片
+        :type config: dict
+        :raises: CriticalError
+        """
+        for name, param in config.items():
+            if 'shards' in param:
+                raise exceptions.CriticalError(msg=utils.format_kwstring(
+                    _('sharded pool %(name)s is not supported in asyncio mode'), name=name))
+        with self._lock:
+            pools = dict(self._pools)
+            for name, param in config.items():
+                current = pools.get(name)
+                if current is not None:
+                    current.reflesh(param)
+                else:
+                    pools[name] = AsyncDBPool(param)
+            self._pools = pools
+
+
+REGISTRY = AsyncPoolRegistry(default=POOL)
+
+
+def get_pool(name):
+    """
+    获取命名异步连接池，参见AsyncPoolRegistry.get
+
+    :param name: 连接池名称
+    :type name: str
+    :returns: 异步连接池
+    :rtype: `AsyncDBPool`
+    :raises: ValueError
+    """
+    return REGISTRY.get(name)
+
+
+class AsyncResourceBase(crud.ResourceBase):
+    """
+    异步资源基础操作子类，定义方式与ResourceBase一致(orm_meta、_primary_keys、_default_filter等)
+
+    子类重写的同步扩展方法(_addtional_list、_get_query等)在run_sync中按同步方式调用；
+    流式读取方法(iter_batches、iter_list、list_columnar)不支持异步，请使用list_by_cursor分页；
+    分片(shard)以及多线程并行查询(list_parallel)不支持异步
+    """
+    # 在同步资源类中恢复为ResourceBase实现的方法
+    _sync_methods = ('get_session', 'transaction', 'list', 'count', 'list_with_total', 'list_by_cursor',
+                     'get', 'get_many', 'create_many', 'upsert_many', 'update_by_filter', 'delete_by_filter',
+                     'iter_batches', 'iter_list', 'list_columnar', 'list_parallel', 'shard', '_execute_by_filter')
+
+    def __init__(self, session=None, transaction=None, dbpool=None):
+        if dbpool is None:
+            dbpool = get_pool(self._dbpool_name) if self._dbpool_name else POOL
+        super(AsyncResourceBase, self).__init__(session=session, transaction=transaction, dbpool=dbpool)
+
+    @classmethod
+    def _get_sync_class(cls):
+        """
+        获取同步资源类，该类继承自本类，并将异步方法恢复为ResourceBase的同步实现
+
+        :returns: 同步资源类
+        :rtype: class
+        """
+        sync_class = _SYNC_CLASSES.get(cls)
+        if sync_class is None:
+            namespace = dict((name, getattr(crud.ResourceBase, name)) for name in cls._sync_methods)
+            namespace['__init__'] = crud.ResourceBase.__init__
+            # 同步资源对象绑定到run_sync传入的会话，不使用命名连接池
+            namespace['_dbpool_name'] = None
+            sync_class = _SYNC_CLASSES[cls] = type(cls.__name__ + 'Sync', (cls,), namespace)
+        return sync_class
+
+    def _get_sync_resource(self, session, transaction=False):
+        """
+        获取绑定到同步会话的同步资源对象
+
+        :param session: run_sync传入的同步会话
+        :type session: `Session`
+        :param transaction: 是否作为外部事务使用，写操作由异步事务负责提交
+        :type transaction: bool
+        :returns: 同步资源对象
+        :rtype: `ResourceBase`
+        """
+        if transaction:
+            return self._get_sync_class()(transaction=session)
+        return self._get_sync_class()(session=session)
+
+    async def _run_sync(self, func, write=False):
+        """
+        在异步会话中执行同步资源操作
+
+        :param func: 函数func(resource)，resource为同步资源对象
+        :type func: callable
+        :param write: 是否为写操作，写操作在事务中执行
+        :type write: bool
+        :returns: 函数返回值
+        :rtype: any
+        """
+        if write:
+            async with self.transaction() as session:
+                return await session.run_sync(lambda s: func(self._get_sync_resource(s, transaction=True)))
+        async with self.get_session() as session:
+            return await session.run_sync(lambda s: func(self._get_sync_resource(s)))
+
+    def _get_transaction(self):
+        """获取外部事务或当前任务中本资源对象开启的事务"""
+        if self._transaction is not None:
+            return self._transaction
+        return _ACTIVE_TRANSACTIONS.get().get(id(self))
+
+    @contextlib.asynccontextmanager
+    async def get_session(self):
+        """
+        异步会话管理上下文, 如果资源初始化时指定使用外部会话/事务，或处于本资源的事务中，则返回对应的会话对象，
+
+        处于连接池的工作单元(AsyncDBPool.scope)中时返回工作单元的会话
+        """
+        transaction = self._get_transaction()
+        scope_session = None
+        if self._session is None and transaction is None:
+            scope_session = self._pool.current_session()
+        if scope_session is not None:
+            yield scope_session
+        elif self._session is None and transaction is None:
+            session = self._pool.get_session()
+            try:
+                yield session
+            finally:
+                await session.close()
+        elif self._session:
+            yield self._session
+        else:
+            yield transaction
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """
+        异步事务管理上下文, 如果资源初始化时指定使用外部事务，则返回的也是外部事务对象，
+
+        保证事务统一性
+
+        eg.
+
+        async with self.transaction() as session:
+
+            await self.create_many(rows)
+
+            await OtherResource(transaction=session).delete_by_filter(filters)
+        """
+        transaction = self._get_transaction()
+        scope_session = self._pool.current_session(write=True) if transaction is None else None
+        if scope_session is not None:
+            # AsyncSession自动开启事务，读操作开启的事务由写事务一并提交；已有写事务时加入该事务
+            if scope_session.info.get(_SCOPE_WRITING_KEY):
+                yield scope_session
+                return
+            scope_session.info[_SCOPE_WRITING_KEY] = True
+            try:
+                if not scope_session.in_transaction():
+                    await scope_session.begin()
+                yield scope_session
+                await scope_session.commit()
+            except Exception:
+                await scope_session.rollback()
+                raise
+            finally:
+                scope_session.info.pop(_SCOPE_WRITING_KEY, None)
+        elif transaction is None:
+            session = self._pool.get_session()
+            transactions = dict(_ACTIVE_TRANSACTIONS.get())
+            transactions[id(self)] = session
+            token = _ACTIVE_TRANSACTIONS.set(transactions)
+            try:
+                async with session.begin():
+                    yield session
+            finally:
+                _ACTIVE_TRANSACTIONS.reset(token)
+                await session.close()
+        else:
+            yield transaction
+
+    async def count(self, filters=None, offset=None, limit=None, hooks=None, approximate=False):
+        """获取符合条件的记录数量，参见ResourceBase.count"""
+        return await self._run_sync(lambda resource: resource.count(
+            filters=filters, offset=offset, limit=limit, hooks=hooks, approximate=approximate))
+
+    async def list(self, filters=None, orders=None, offset=None, limit=None, hooks=None, fields=None):
+        """获取符合条件的记录，参见ResourceBase.list"""
+        return await self._run_sync(lambda resource: resource.list(
+            filters=filters, orders=orders, offset=offset, limit=limit, hooks=hooks, fields=fields))
+
+    async def list_with_total(self, filters=None, orders=None, offset=None, limit=None, fields=None):
+        """获取符合条件的记录以及记录总数，参见ResourceBase.list_with_total"""
+        return await self._run_sync(lambda resource: resource.list_with_total(
+            filters=filters, orders=orders, offset=offset, limit=limit, fields=fields))
+
+    async def list_by_cursor(self, filters=None, orders=None, limit=None, cursor=None, hooks=None):
+        """使用游标方式分页获取符合条件的记录，参见ResourceBase.list_by_cursor"""
+        return await self._run_sync(lambda resource: resource.list_by_cursor(
+            filters=filters, orders=orders, limit=limit, cursor=cursor, hooks=hooks))
+
+    async def get(self, pk):
+        """根据主键获取记录，参见ResourceBase.get"""
+        return await self._run_sync(lambda resource: resource.get(pk))
+
+    async def get_many(self, pks, chunk_size=500):
+        """根据主键批量获取记录，参见ResourceBase.get_many"""
+        return await self._run_sync(lambda resource: resource.get_many(pks, chunk_size=chunk_size))
+
+    async def create_many(self, rows, chunk_size=1000):
+        """批量创建记录，参见ResourceBase.create_many"""
+        return await self._run_sync(lambda resource: resource.create_many(rows, chunk_size=chunk_size),
+                                    write=True)
+
+    async def upsert_many(self, rows, conflict_keys=None, chunk_size=1000):
+        """批量创建或更新记录，参见ResourceBase.upsert_many"""
+        return await self._run_sync(lambda resource: resource.upsert_many(
+            rows, conflict_keys=conflict_keys, chunk_size=chunk_size), write=True)
+
+    async def update_by_filter(self, filters, values, chunk_size=None):
+        """更新符合条件的记录，参见ResourceBase.update_by_filter，所有分块在同一个事务中执行"""
+        return await self._run_sync(lambda resource: resource.update_by_filter(
+            filters, values, chunk_size=chunk_size), write=True)
+
+    async def delete_by_filter(self, filters, soft=True, chunk_size=None):
+        """删除符合条件的记录，参见ResourceBase.delete_by_filter，所有分块在同一个事务中执行"""
+        return await self._run_sync(lambda resource: resource.delete_by_filter(
+            filters, soft=soft, chunk_size=chunk_size), write=True)
+
+    def iter_batches(self, *args, **kwargs):
+        raise exceptions.CriticalError(msg=_('iter_batches is not supported in asyncio mode, use list_by_cursor'))
+
+    def iter_list(self, *args, **kwargs):
+        raise exceptions.CriticalError(msg=_('iter_list is not supported in asyncio mode, use list_by_cursor'))
+
+    def list_columnar(self, *args, **kwargs):
+        raise exceptions.CriticalError(msg=_('list_columnar is not supported in asyncio mode'))
+
+    def list_parallel(self, *args, **kwargs):
+        raise exceptions.CriticalError(msg=_('list_parallel is not supported in asyncio mode'))
+
+    def shard(self, *args, **kwargs):
+        raise exceptions.CriticalError(msg=_('shard is not supported in asyncio mode'))
+
+    def _execute_by_filter(self, *args, **kwargs):
+        raise exceptions.CriticalError(msg=_('_execute_by_filter is not supported in asyncio mode, '
+                                             'use update_by_filter/delete_by_filter'))
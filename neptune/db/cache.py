@@ -0,0 +1,240 @@
+# coding=utf-8
+"""
+本模块提供查询结果缓存
+
+缓存项按表名登记，通过SQLAlchemy session事件在事务提交后使涉及表的缓存项失效
+"""
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+import time
+import weakref
+
+from six.moves import cPickle as pickle
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import object_mapper
+
+LOG = logging.getLogger(__name__)
+# 标识缓存未命中
+MISSING = object()
+# 所有缓存实例，用于事务提交后统一失效
+_CACHES = weakref.WeakSet()
+# session.info中记录本事务写入的表名
+_DIRTY_TABLES_KEY = 'neptune.dirty_tables'
+
+
+class QueryCache(object):
+    """查询结果缓存，LRU+TTL淘汰，按条目数量以及字节数限制大小，线程安全"""
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, ttl=60):
+        """
+        初始化缓存
+
+        :param max_entries: 最大缓存条目数量
+        :type max_entries: int
+        :param max_bytes: 最大缓存字节数(按序列化后的大小计算)
+        :type max_bytes: int
+        :param ttl: 缓存有效期(秒)
+        :type ttl: float
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (过期时间, 序列化数据, 表名列表)
+        self._entries = collections.OrderedDict()
+        # 表名 -> 缓存key集合
+        self._tables = {}
+        # 表名 -> 版本号，表数据变更时递增，用于丢弃变更前开始的查询结果
+        self._generations = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        _CACHES.add(self)
+
+    def generation(self, tables):
+        """
+        获取表的当前版本，查询开始前获取，写入缓存时传入
+
+        :param tables: 表名列表
+        :type tables: list
+        :returns: 版本信息
+        :rtype: tuple
+        """
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key):
+        """
+        获取缓存结果，每次返回独立的副本
+
+        :param key: 缓存key
+        :type key: tuple
+        :returns: 缓存结果，未命中返回MISSING
+        :rtype: any
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            if entry[0] < time.time():
+                self._discard(key, entry)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            # 重新插入到末尾，标识为最近使用
+            self._entries[key] = entry
+            self.hits += 1
+            data = entry[1]
+        return pickle.loads(data)
+
+    def set(self, key, value, tables, generation=None):
+        """
+        写入缓存结果
+
+        :param key: 缓存key
+        :type key: tuple
+        :param value: 缓存结果
+        :type value: any
+        :param tables: 结果涉及的表名列表
+        :type tables: list
+        :param generation: 查询开始前获取的表版本，若期间表已变更则不写入
+        :type generation: tuple
+        """
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            LOG.debug('query result can not be cached: %s', e)
+            return
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != tuple(
+                    self._generations.get(table, 0) for table in tables):
+                return
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._discard(key, entry)
+            self._entries[key] = (time.time() + self.ttl, data, tuple(tables))
+            self._bytes += len(data)
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, old_entry = self._entries.popitem(last=False)
+                self._discard(old_key, old_entry)
+                self.evictions += 1
+
+    def invalidate(self, tables):
+        """
+        使涉及指定表的缓存项失效
+
+        :param tables: 表名列表
+        :type tables: list
+        """
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in self._tables.pop(table, ()):
+                    entry = self._entries.pop(key, None)
+                    if entry is not None:
+                        self._discard(key, entry)
+                        self.invalidations += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        :returns: 统计信息
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _discard(self, key, entry):
+        self._bytes -= len(entry[1])
+        for table in entry[2]:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+
+def mark_dirty(session, tables):
+    """
+    登记session中写入的表，事务提交后使相关缓存失效
+
+    ORM flush以及Query批量更新/删除会自动登记，直接执行Core语句时需调用本方法
+
+    :param session: session对象
+    :type session: session
+    :param tables: 表名列表
+    :type tables: list
+    """
+    session.info.setdefault(_DIRTY_TABLES_KEY, set()).update(tables)
+
+
+def invalidate(tables):
+    """
+    使所有缓存中涉及指定表的缓存项失效
+
+    :param tables: 表名列表
+    :type tables: list
+    """
+    for cache in list(_CACHES):
+        cache.invalidate(tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        for table in object_mapper(obj).tables:
+            tables.add(table.fullname)
+    if tables:
+        mark_dirty(session, tables)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+def _after_bulk_update(update_context):
+    mark_dirty(update_context.session, [table.fullname for table in update_context.mapper.tables])
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _after_bulk_delete(delete_context):
+    mark_dirty(delete_context.session, [table.fullname for table in delete_context.mapper.tables])
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    tables = session.info.pop(_DIRTY_TABLES_KEY, None)
+    if tables:
+        invalidate(tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_DIRTY_TABLES_KEY, None)
@@ -4,19 +4,568 @@
 """
 
 from __future__ import absolute_import
+import array
+import base64
+import datetime
+import decimal
+import json
 import logging
 import collections
+import re
 import contextlib
 import copy
-from sqlalchemy import text, and_, or_
+import functools
+import heapq
+import itertools
+import time
+import six
+from six.moves import collections_abc
+from concurrent import futures
+import sqlalchemy
+from sqlalchemy import text, and_, or_, bindparam, event, tuple_, func, literal_column
 import sqlalchemy.exc
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext import baked
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import scoped_session
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import lazyload
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import Mapper
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.dml import Insert
+from sqlalchemy.sql.elements import BindParameter, ClauseElement, ColumnClause
+from neptune.db import cache
+from neptune.db import models
 from neptune.db import pool
+from neptune.db import slowlog
+from neptune.db.dictbase import DictBase
 from neptune.core import utils
 from neptune.core import exceptions
 from neptune.db import filter_wrapper
 from neptune.core.i18n import _
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 LOG = logging.getLogger(__name__)
 
+# 查询语句缓存，按过滤条件"结构"缓存已构建、已编译的查询，相同结构的查询仅需绑定新的参数值
+STATEMENT_CACHE = baked.bakery(size=500)
+# 构建查询的方法，子类重写后可能在查询中加入过滤条件以外的值，不能使用查询语句缓存
+_QUERY_BUILDERS = ('_get_query', '_apply_filters', '_filter_key_mapping', '_get_filter_expressions')
+# 过滤条件取值计划，(ResourceBase子类, orm_meta, 过滤条件结构, 默认过滤条件结构) -> [(取值方式, 表达式结构, 常量值)]，
+# 按过滤条件的遍历顺序，参见_direct_mode
+_FILTER_PLANS = sqlalchemy.util.LRUCache(500)
+# 列名 -> 可用于绑定参数名的列名
+_BIND_LABELS = {}
+# 不转换过滤值的Filter操作符，缓存命中时可直接从过滤条件中取值
+_DIRECT_OPERATORS = frozenset(six.get_unbound_function(getattr(filter_wrapper.Filter, name))
+                              for name in ('op', 'op_in', 'op_nin', 'op_eq', 'op_ne', 'op_lt', 'op_lte',
+                                           'op_gt', 'op_gte'))
+# 生成结果只取决于过滤值的操作符，生成SQL常量时相同的过滤值可复用表达式结构
+_CONSTANT_OPERATORS = _DIRECT_OPERATORS | frozenset(
+    six.get_unbound_function(getattr(filter_wrapper.FilterBool, name)) for name in ('op', 'op_in', 'op_nin', 'op_eq',
+                                                                                    'op_ne'))
+
+
+def _bind_expression(expr, bind_params, label):
+    """
+    将表达式中的值替换为按顺序命名的绑定参数，(参数名, 原值)按顺序追加到bind_params
+
+    相同结构的表达式总是以相同的顺序遍历，因此参数名称与值可以在缓存的查询语句中一一对应；
+    参数名包含过滤条件的列名，慢查询日志据此对敏感参数脱敏
+
+    :param expr: SQL表达式
+    :type expr: `ClauseElement`
+    :param bind_params: 绑定参数(参数名, 值)列表
+    :type bind_params: list
+    :param label: 过滤条件的列名
+    :type label: str
+    :returns: 替换后的SQL表达式
+    :rtype: `ClauseElement`
+    """
+
+    def _replace(element):
+        if isinstance(element, BindParameter):
+            name = _bind_name(len(bind_params), label)
+            bind_params.append((name, element.effective_value))
+            # SQLAlchemy>=1.4中IN的值列表为单个expanding参数
+            return bindparam(name, type_=element.type, expanding=element.expanding)
+        # 列对象保持原样，避免丢失ORM注解
+        if isinstance(element, ColumnClause):
+            return element
+        return None
+
+    return visitors.replacement_traverse(expr, {}, _replace)
+
+
+def _bind_name(index, label):
+    """生成过滤条件绑定参数名，nf_序号_列名"""
+    safe_label = _BIND_LABELS.get(label)
+    if safe_label is None:
+        safe_label = _BIND_LABELS[label] = re.sub(r'\W', '_', label)
+    return 'nf_%d_%s' % (index, safe_label)
+
+
+def _filter_expression(entry, op, value, bind_params=None):
+    """
+    将列+操作符+值转换为SQL表达式
+
+    :param entry: 列元数据索引项，包含列对象、表达式的外包装器以及操作符对应的处理函数
+    :type entry: `ColumnIndexEntry`
+    :param op: 操作符，如None, eq, ne, gt, gte, lt, lte 等
+    :type op: str
+    :param value: 过滤值
+    :type value: any
+    :param bind_params: 若指定列表，表达式中的值将被替换为按顺序命名的绑定参数，参见_bind_expression
+    :type bind_params: list
+    :returns: SQL表达式，不支持时返回None
+    :rtype: `ClauseElement`
+    """
+    expr = None
+    func = entry.operators.get(op or None, None)
+    if func:
+        expr = func(entry.column, value)
+        if expr is not None:
+            if entry.expr_wrapper:
+                expr = entry.expr_wrapper(expr)
+            if bind_params is not None:
+                expr = _bind_expression(expr, bind_params, entry.name)
+    return expr
+
+
+def _plain_value(value):
+    """判断过滤值是否原样作为绑定参数，None、bool生成为SQL常量，列表以及SQL表达式的参数数量不定"""
+    return value is not None and not isinstance(value, (bool, ClauseElement)) and not utils.is_list_type(value)
+
+
+def _direct_mode(entry, op, value, bound):
+    """
+    判断过滤条件的绑定参数是否为原始过滤值，是则缓存命中时可直接从过滤条件中取值，无需重新构建表达式
+
+    仅Filter自身实现的比较操作符(不转换过滤值)可以直接取值；这些操作符以及布尔列的操作符生成SQL常量(没有参数)时，
+    相同的过滤值生成相同的表达式
+
+    :param entry: 列元数据索引项
+    :type entry: `ColumnIndexEntry`
+    :param op: 操作符
+    :type op: str
+    :param value: 过滤值
+    :type value: any
+    :param bound: 表达式的绑定参数(参数名, 值)列表
+    :type bound: list
+    :returns: scalar: 单个值，items: 列表的每个元素一个参数，expanding: 整个列表一个参数(SQLAlchemy>=1.4)，
+              constant: 生成为SQL常量(如None、bool)，没有参数，None: 不能直接取值
+    :rtype: str
+    """
+    func = six.get_method_function(entry.operators.get(op or None, None))
+    if entry.expr_wrapper is not None:
+        return None
+    if not bound and func in _CONSTANT_OPERATORS and (value is None or isinstance(value, (bool,) + six.string_types)):
+        return 'constant'
+    if func not in _DIRECT_OPERATORS:
+        return None
+    values = [item for _name, item in bound]
+    if not utils.is_list_type(value):
+        if _plain_value(value) and len(values) == 1 and values[0] is value:
+            return 'scalar'
+        return None
+    if not value or not all(_plain_value(item) for item in value):
+        return None
+    if len(values) == len(value) and all(a is b for a, b in zip(values, value)):
+        return 'items'
+    if len(values) == 1 and utils.is_list_type(values[0]) and len(values[0]) == len(value) and \
+            all(a is b for a, b in zip(values[0], value)):
+        return 'expanding'
+    return None
+
+
+def _expression_shape(expr):
+    """
+    获取已替换绑定参数的表达式结构，包括元素类型以及操作符
+
+    True/False/None等值不会成为绑定参数，而是作为常量(或IS NULL等操作符)直接生成在SQL中，
+    仅凭过滤值的类型无法区分，因此查询语句缓存的key需要包含表达式结构
+
+    :param expr: SQL表达式
+    :type expr: `ClauseElement`
+    :returns: 可哈希的表达式结构
+    :rtype: tuple
+    """
+    shape = []
+    for element in visitors.iterate(expr, {}):
+        operator = getattr(element, 'operator', None)
+        shape.append((element.__visit_name__, getattr(operator, '__name__', None)))
+    return tuple(shape)
+
+
+class _FilterParams(dict):
+    """过滤条件绑定参数值，shape为过滤条件以及对应表达式的结构，作为查询语句缓存key的一部分"""
+
+    def __init__(self, params, shape):
+        super(_FilterParams, self).__init__(params)
+        self.shape = shape
+
+
+# 列元数据索引项
+# column: 列对象，expr_wrapper: 表达式外包装器，visit_name: 列类型名称，
+# handler: 对应的Filter对象，operators: 支持的操作符 -> 处理函数(None表示不指定操作符)
+ColumnIndexEntry = collections.namedtuple('ColumnIndexEntry',
+                                          ['name', 'column', 'expr_wrapper', 'visit_name', 'handler', 'operators'])
+# (ResourceBase子类, orm_meta) -> {列名: ColumnIndexEntry}
+_COLUMN_INDEXES = {}
+
+
+# 预加载计划缓存，(Model, 序列化级别) -> 加载选项列表，None表示无法确定序列化的属性
+_LOAD_PLANS = {}
+# 序列化级别 -> (属性列表名, 属性列表方法名, 关联对象的序列化级别)，参见DictBase
+_LOAD_LEVELS = {
+    'list': ('attributes', 'list_columns', 'summary'),
+    'detail': ('detail_attributes', 'get_columns', 'list'),
+    'summary': ('summary_attributes', 'sum_columns', 'summary'),
+}
+# 预加载计划的最大关联深度，超出部分使用relationship自身的加载方式
+_LOAD_PLAN_DEPTH = 3
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _reset_column_indexes():
+    """Model映射发生变化时，清空列元数据索引以及预加载计划，下次使用时重建"""
+    _COLUMN_INDEXES.clear()
+    _LOAD_PLANS.clear()
+
+
+@event.listens_for(object, 'attribute_instrument', propagate=True)
+def _attribute_instrumented(cls, key, inst):
+    """已完成配置的Model新增属性时不会触发after_configured，同样需要清空"""
+    _reset_column_indexes()
+
+
+def _extract_column_visit_name(column):
+    """
+    获取列类型名称
+
+    :param column: 列对象
+    :type column: `ColumnAttribute`
+    :returns: 列类型名称
+    :rtype: str
+    """
+    col_type = getattr(column, 'type', None)
+    if col_type:
+        return getattr(col_type, '__visit_name__', None)
+    return None
+
+
+class SQLiteUpsert(Insert):
+    """sqlite的INSERT ... ON CONFLICT (...) DO UPDATE语句(sqlite>=3.24)"""
+
+    def __init__(self, table, conflict_keys, update_columns, **kwargs):
+        super(SQLiteUpsert, self).__init__(table, **kwargs)
+        self.conflict_keys = conflict_keys
+        self.update_columns = update_columns
+
+
+@compiles(SQLiteUpsert, 'sqlite')
+def _compile_sqlite_upsert(insert, compiler, **kwargs):
+    sql = compiler.visit_insert(insert, **kwargs)
+    preparer = compiler.preparer
+    sql += ' ON CONFLICT (%s)' % ', '.join(preparer.quote(key) for key in insert.conflict_keys)
+    if insert.update_columns:
+        sql += ' DO UPDATE SET %s' % ', '.join(
+            '%s = excluded.%s' % (preparer.quote(col), preparer.quote(col)) for col in insert.update_columns)
+    else:
+        sql += ' DO NOTHING'
+    return sql
+
+
+def _split_rows(rows, chunk_size):
+    """
+    将记录按chunk_size分块，块内再按字段集合分组，确保每条多行INSERT的字段一致
+
+    :param rows: 记录列表
+    :type rows: list
+    :param chunk_size: 每块记录数量
+    :type chunk_size: int
+    :returns: 记录块生成器
+    :rtype: generator
+    """
+    for idx in range(0, len(rows), chunk_size):
+        groups = collections.OrderedDict()
+        for row in rows[idx:idx + chunk_size]:
+            groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+        for group in groups.values():
+            yield group
+
+
+def _encode_cursor(orders, values):
+    """
+    将排序规则以及最后一行记录的排序列值编码为不透明的翻页游标
+
+    JSON无法表示的值按类型编码，其他类型(如UUID)编码为字符串，解码时按列的python类型还原
+
+    :param orders: 排序规则，eg. ['+name', '+id']
+    :type orders: list
+    :param values: 排序列值
+    :type values: list
+    :returns: 游标
+    :rtype: str
+    """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime.datetime):
+            encoded.append(['dt', [value.year, value.month, value.day, value.hour,
+                                   value.minute, value.second, value.microsecond]])
+        elif isinstance(value, datetime.date):
+            encoded.append(['d', [value.year, value.month, value.day]])
+        elif isinstance(value, datetime.time):
+            encoded.append(['t', [value.hour, value.minute, value.second, value.microsecond]])
+        elif isinstance(value, datetime.timedelta):
+            encoded.append(['td', [value.days, value.seconds, value.microseconds]])
+        elif isinstance(value, decimal.Decimal):
+            encoded.append(['dec', str(value)])
+        elif isinstance(value, six.binary_type) and not isinstance(value, str):
+            encoded.append(['b', utils.ensure_unicode(base64.b64encode(value))])
+        elif value is None or isinstance(value, (bool, float) + six.integer_types + six.string_types):
+            encoded.append(['v', value])
+        else:
+            encoded.append(['s', six.text_type(value)])
+    data = json.dumps({'orders': orders, 'values': encoded}, separators=(',', ':'))
+    return utils.ensure_unicode(base64.urlsafe_b64encode(utils.ensure_bytes(data)))
+
+
+def _decode_cursor(cursor, python_types=None):
+    """
+    解码翻页游标
+
+    :param cursor: 游标
+    :type cursor: str
+    :param python_types: 各排序列的python类型，用于还原编码为字符串的值
+    :type python_types: list
+    :returns: (排序规则, 排序列值)
+    :rtype: tuple
+    :raises: ValueError
+    """
+    data = json.loads(utils.ensure_unicode(base64.urlsafe_b64decode(utils.ensure_bytes(cursor))))
+    python_types = python_types or []
+    values = []
+    for idx, (tag, value) in enumerate(data['values']):
+        if tag == 'dt':
+            values.append(datetime.datetime(*value))
+        elif tag == 'd':
+            values.append(datetime.date(*value))
+        elif tag == 't':
+            values.append(datetime.time(*value))
+        elif tag == 'td':
+            values.append(datetime.timedelta(*value))
+        elif tag == 'dec':
+            values.append(decimal.Decimal(value))
+        elif tag == 'b':
+            values.append(base64.b64decode(utils.ensure_bytes(value)))
+        elif tag == 's':
+            python_type = python_types[idx] if idx < len(python_types) else None
+            values.append(python_type(value) if python_type is not None else value)
+        else:
+            values.append(value)
+    return data['orders'], values
+
+
+def _column_python_type(column):
+    """
+    获取列对应的python类型
+
+    :param column: 列对象
+    :type column: `Column`
+    :returns: python类型，无法确定时返回None
+    :rtype: type
+    """
+    try:
+        return column.type.python_type
+    except (NotImplementedError, AttributeError):
+        return None
+
+
+def _int64_typecode():
+    """
+    获取64位整数的array类型码，python2没有'q'，64位平台的'l'为64位，否则返回None(使用list)
+
+    :returns: 类型码
+    :rtype: str
+    """
+    for typecode in ('q', 'l'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            continue
+    return None
+
+
+_INT64_TYPECODE = _int64_typecode()
+
+
+def _column_nullable(column):
+    """
+    判断列是否可以为NULL
+
+    :param column: 列对象或ORM属性
+    :type column: `Column`/`InstrumentedAttribute`
+    :returns: 是否可以为NULL，无法确定时返回True
+    :rtype: bool
+    """
+    prop = getattr(column, 'property', None)
+    columns = getattr(prop, 'columns', None)
+    if columns:
+        column = columns[0]
+    if getattr(column, 'primary_key', False):
+        return False
+    return getattr(column, 'nullable', True)
+
+
+def _new_column_buffer(column):
+    """
+    创建列数据缓冲区，非空的整数、浮点数列使用紧凑的array，其余使用list
+
+    :param column: 列对象
+    :type column: `Column`
+    :returns: 缓冲区
+    :rtype: array/list
+    """
+    python_type = _column_python_type(column)
+    nullable = getattr(column, 'nullable', True) and not getattr(column, 'primary_key', False)
+    if not nullable and python_type is not None and not issubclass(python_type, bool):
+        if issubclass(python_type, six.integer_types) and _INT64_TYPECODE is not None:
+            return array.array(_INT64_TYPECODE)
+        if issubclass(python_type, float):
+            return array.array('d')
+    return []
+
+
+def _to_numpy_array(column, values):
+    """
+    将列数据缓冲区转换为numpy数组，dtype由列类型决定，包含NULL时整数列使用float64(NaN)，
+    布尔列使用object，日期时间列使用NaT
+
+    :param column: 列对象
+    :type column: `Column`
+    :param values: 列数据缓冲区
+    :type values: array/list
+    :returns: numpy数组
+    :rtype: `numpy.ndarray`
+    """
+    if isinstance(values, array.array):
+        # 直接共享array的内存
+        return numpy.frombuffer(values, dtype=numpy.float64 if values.typecode == 'd' else numpy.int64)
+    python_type = _column_python_type(column)
+    has_null = any(value is None for value in values)
+    dtype = object
+    if python_type is None:
+        dtype = object
+    elif issubclass(python_type, bool):
+        dtype = object if has_null else numpy.bool_
+    elif issubclass(python_type, six.integer_types):
+        dtype = numpy.float64 if has_null else numpy.int64
+    elif issubclass(python_type, float):
+        dtype = numpy.float64
+    elif issubclass(python_type, datetime.datetime):
+        dtype = 'datetime64[us]'
+    elif issubclass(python_type, datetime.date):
+        dtype = 'datetime64[D]'
+    elif issubclass(python_type, datetime.timedelta):
+        dtype = 'timedelta64[us]'
+    if dtype is numpy.float64 and has_null:
+        values = [numpy.nan if value is None else value for value in values]
+    return numpy.array(values, dtype=dtype)
+
+
+def _merge_sorted(parts, sort_keys, nulls_first=True):
+    """
+    k路归并多个已按相同规则排序的记录列表
+
+    :param parts: 记录列表的列表
+    :type parts: list
+    :param sort_keys: 排序规则[(字段名, 是否降序)]
+    :type sort_keys: list
+    :param nulls_first: 升序时NULL是否排在最前(MySQL/sqlite)，否则排在最后(PostgreSQL)
+    :type nulls_first: bool
+    :returns: 合并后的记录列表
+    :rtype: list
+    """
+
+    def _compare(a, b):
+        for field, desc in sort_keys:
+            x, y = a.get(field), b.get(field)
+            if x == y:
+                continue
+            if x is None or y is None:
+                less = (x is None) == nulls_first
+            else:
+                less = x < y
+            return -1 if less != desc else 1
+        return 0
+
+    heap = []
+    iterators = [iter(part) for part in parts]
+    for idx, iterator in enumerate(iterators):
+        for row in iterator:
+            heap.append((_SortKey(row, _compare), idx, row))
+            break
+    heapq.heapify(heap)
+    results = []
+    while heap:
+        key, idx, row = heap[0]
+        results.append(row)
+        for row in iterators[idx]:
+            heapq.heapreplace(heap, (_SortKey(row, _compare), idx, row))
+            break
+        else:
+            heapq.heappop(heap)
+    return results
+
+
+class _SortKey(object):
+    """按比较函数排序的包装对象，用于heapq"""
+    __slots__ = ('row', 'compare')
+
+    def __init__(self, row, compare):
+        self.row = row
+        self.compare = compare
+
+    def __lt__(self, other):
+        return self.compare(self.row, other.row) < 0
+
+    def __eq__(self, other):
+        return self.compare(self.row, other.row) == 0
+
+
+def _track_operation(filters_index=0):
+    """
+    资源方法装饰器，标记当前正在执行的资源操作以及过滤条件，用于慢查询日志
+
+    :param filters_index: 过滤条件参数在位置参数中的索引
+    :type filters_index: int
+    """
+
+    def _decorator(func):
+        @functools.wraps(func)
+        def _wrapper(self, *args, **kwargs):
+            filters = kwargs.get('filters', args[filters_index] if len(args) > filters_index else None)
+            with slowlog.operation(self, func.__name__, filters, threshold=self._slow_query_threshold):
+                return func(self, *args, **kwargs)
+
+        return _wrapper
+
+    return _decorator
+
+
+def _real_session(session):
+    """获取scoped_session背后实际的session对象"""
+    if isinstance(session, scoped_session):
+        return session()
+    return session
+
 
 class ResourceBase(object):
     """
@@ -42,9 +591,28 @@ class ResourceBase(object):
     # error_msg，字符串，错误提示消息
     # converter，对象实例，converter中的类型，可以自定义
     _validate = []
+    # 是否启用查询语句缓存，相同过滤条件结构的list/count只构建、编译一次SQL
+    # 子类重写了_get_query/_apply_filters/_filter_key_mapping/_get_filter_expressions时不使用缓存，
+    # 这些方法可能加入运行时的值(如租户ID)，缓存后将被其他调用复用
+    _statement_cache = True
+    # count(approximate=True)时，估算数量不小于此值才会返回估算值，否则返回精确数量
+    _approximate_count_threshold = 100000
+    # 查询结果缓存，默认不启用，可设置为cache.QueryCache实例，同一子类的实例共享
+    # 通过transaction()提交的写操作会使涉及表的缓存项失效
+    _result_cache = None
+    # 慢查询阈值(秒)，None表示使用连接池的slow_query_threshold配置
+    _slow_query_threshold = None
+    # 使用的命名连接池，参见pool.PoolRegistry，None表示使用默认连接池，初始化时指定dbpool优先
+    _dbpool_name = None
+    # 分片键列名，使用ShardedDBPool时必须指定，过滤条件中指定了分片键(等于/IN)时只访问对应的分片，
+    # 否则list/count/list_with_total/update_by_filter/delete_by_filter在所有分片上并行执行并合并结果，
+    # 事务以及其他操作需通过shard(value)指定分片
+    _shard_key = None
 
     def __init__(self, session=None, transaction=None, dbpool=None):
-        self._pool = dbpool or pool.POOL
+        if dbpool is None:
+            dbpool = pool.get_pool(self._dbpool_name) if self._dbpool_name else pool.POOL
+        self._pool = dbpool
         self._session = session
         self._transaction = transaction
 
@@ -75,45 +643,164 @@ class ResourceBase(object):
         handlers = self._filter_hander_mapping()
         return handlers.get(name.lower(), filter_wrapper.Filter())
 
-    def _apply_filters(self, query, orm_meta, filters=None, orders=None):
+    def _make_column_entry(self, orm_meta, name):
+        """
+        解析列并生成列元数据索引项，Filter对象由_get_filter_handler获取
 
-        def _extract_column_visit_name(column):
-            '''
-            获取列名称
-            :param column: 列对象
-            :type column: `ColumnAttribute`
-            '''
-            col_type = getattr(column, 'type', None)
-            if col_type:
-                return getattr(col_type, '__visit_name__', None)
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :param name: 列名称
+        :type name: str
+        :returns: 列元数据索引项，列不存在时返回None
+        :rtype: `ColumnIndexEntry`
+        """
+        expr_wrapper, column = filter_wrapper.column_from_expression(orm_meta, name)
+        if column is None:
+            return None
+        visit_name = _extract_column_visit_name(column)
+        handler = None
+        if visit_name:
+            handler = self._get_filter_handler(visit_name)
+        handler = handler or filter_wrapper.Filter()
+        operators = {None: handler.op}
+        for attr in dir(handler):
+            if attr.startswith('op_'):
+                operators[attr[3:]] = getattr(handler, attr)
+        return ColumnIndexEntry(name, column, expr_wrapper, visit_name, handler, operators)
+
+    def _get_column_index(self, orm_meta):
+        """
+        获取orm_meta的列元数据索引，每个(资源类, orm_meta)只构建一次
+
+        索引包含列名对应的列对象、列类型名称、Filter对象以及支持的操作符，
+        每个资源类使用独立的索引，子类可重写_filter_hander_mapping或_get_filter_handler
+
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :returns: 列名 -> `ColumnIndexEntry`，orm_meta不是映射类时返回None
+        :rtype: dict
+        """
+        key = (self.__class__, orm_meta)
+        index = _COLUMN_INDEXES.get(key, None)
+        if index is None:
+            mapper = getattr(sqlalchemy.inspect(orm_meta, raiseerr=False), 'mapper', None)
+            if mapper is None:
+                return None
+            index = {}
+            for name in mapper.all_orm_descriptors.keys():
+                entry = self._make_column_entry(orm_meta, name)
+                if entry is not None:
+                    index[name] = entry
+            _COLUMN_INDEXES[key] = index
+        return index
+
+    def _get_column_entry(self, orm_meta, name):
+        """
+        获取列元数据索引项
+
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :param name: 列名称
+        :type name: str
+        :returns: 列元数据索引项，列不存在时返回None
+        :rtype: `ColumnIndexEntry`
+        """
+        index = self._get_column_index(orm_meta)
+        if index is not None:
+            return index.get(name, None)
+        return self._make_column_entry(orm_meta, name)
+
+    def _plan_loads(self, orm_meta, level, depth=0):
+        """
+        根据DictBase的序列化级别分析将被序列化的relationship
+
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :param level: 序列化级别，list/detail/summary
+        :type level: str
+        :param depth: 当前关联深度
+        :type depth: int
+        :returns: [(relationship属性, 加载方式, 子计划)]，无法确定时返回None
+        :rtype: list
+        """
+        attr_name, method_name, child_level = _LOAD_LEVELS[level]
+        if not (isinstance(orm_meta, type) and issubclass(orm_meta, DictBase)):
+            return None
+        # 子类重写了属性列表方法，无法静态分析
+        if six.get_unbound_function(getattr(orm_meta, method_name)) is not \
+                six.get_unbound_function(getattr(DictBase, method_name)):
             return None
+        attributes = getattr(orm_meta, attr_name)
+        if not attributes:
+            # detail级别默认包含所有已加载的relationship，保持relationship自身的加载方式
+            if level == 'detail' or orm_meta._extra_keys is not DictBase._extra_keys:
+                return None
+        plan = []
+        for prop in models.get_model_info(orm_meta).relationships.values():
+            attr = getattr(orm_meta, prop.key)
+            if prop.key in attributes:
+                children = None
+                if depth + 1 < _LOAD_PLAN_DEPTH:
+                    children = self._plan_loads(prop.mapper.class_, child_level, depth + 1)
+                plan.append((attr, 'selectinload' if prop.uselist else 'joinedload', children))
+            elif prop.lazy not in ('select', True, 'noload', 'raise', 'raise_on_sql', 'dynamic'):
+                # 不会被序列化的预加载relationship改为访问时加载
+                plan.append((attr, 'lazyload', None))
+        return plan
+
+    def _get_load_options(self, orm_meta, level):
+        """
+        获取序列化级别对应的预加载选项，集合使用selectinload，多对一使用joinedload，计划按Model以及级别缓存
+
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :param level: 序列化级别，list/detail/summary
+        :type level: str
+        :returns: 加载选项列表，无法确定时返回None
+        :rtype: list
+        """
+        key = (orm_meta, level)
+        if key in _LOAD_PLANS:
+            return _LOAD_PLANS[key]
+
+        loaders = {'selectinload': selectinload, 'joinedload': joinedload, 'lazyload': lazyload}
+
+        def _build(plan, parent):
+            options = []
+            for attr, strategy, children in plan:
+                if parent is None:
+                    loader = loaders[strategy](attr)
+                else:
+                    loader = getattr(parent, strategy)(attr)
+                child_options = _build(children, loader) if children else []
+                # 子路径已包含父路径的加载方式
+                options.extend(child_options or [loader])
+            return options
+
+        plan = self._plan_loads(orm_meta, level)
+        options = None if plan is None else _build(plan, None)
+        _LOAD_PLANS[key] = options
+        return options
+
+    def _get_filter_expressions(self, orm_meta, filters, bind_params=None):
+        """
+        将过滤条件转换为SQL表达式列表
+
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :param filters: 过滤条件字典
+        :type filters: dict
+        :param bind_params: 若指定列表，表达式中的值将被替换为按顺序命名的绑定参数，(参数名, 原值)按顺序追加到列表中
+        :type bind_params: list
+        :returns: (不支持的过滤条件列表, 表达式列表)
+        :rtype: tuple
+        """
 
-        def _handle_filter(expr_wrapper, handler, op, column, value):
+        def _handle_filter(entry, op, value):
             '''
-            将具体列+操作+值转化为SQL表达式（SQLAlchmey表达式）
-            :param expr_wrapper: 表达式的外包装器，比如一对一的外键列expr_wrapper为relationship.column.has
-            :type expr_wrapper: callable
-            :param handler: filter wrapper对应的Filter对象
-            :type handler: `talos.db.filter_wrapper.Filter`
-            :param op: 过滤条件，如None, eq, ne, gt, gte, lt, lte 等
-            :type op: str
-            :param column: 列对象
-            :type column: `ColumnAttribute`
-            :param value: 过滤值
-            :type value: any
+            将具体列+操作+值转化为SQL表达式（SQLAlchmey表达式），参见_filter_expression
             '''
-            expr = None
-            func = None
-            if op:
-                func = getattr(handler, 'op_%s' % op, None)
-            else:
-                func = getattr(handler, 'op', None)
-            if func:
-                expr = func(column, value)
-                if expr is not None:
-                    if expr_wrapper:
-                        expr = expr_wrapper(expr)
-            return expr
+            return _filter_expression(entry, op, value, bind_params=bind_params)
 
         def _get_expression(filters):
             '''
@@ -164,26 +851,25 @@ class ResourceBase(object):
             :param value:
             :return:
             """
-            expr_wrapper, column = filter_wrapper.column_from_expression(orm_meta, name)
+            entry = self._get_column_entry(orm_meta, name)
             unsupported = []
             expressions = []
-            if column is not None:
-                handler = self._get_filter_handler(_extract_column_visit_name(column))
-                if isinstance(value, collections.Mapping):
+            if entry is not None:
+                if isinstance(value, collections_abc.Mapping):
                     for operator, value in value.items():
-                        expr = _handle_filter(expr_wrapper, handler, operator, column, value)
+                        expr = _handle_filter(entry, operator, value)
                         if expr is not None:
                             expressions.append(expr)
                         else:
                             unsupported.append((name, operator, value))
                 else:
                     # op is None
-                    expr = _handle_filter(expr_wrapper, handler, None, column, value)
+                    expr = _handle_filter(entry, None, value)
                     if expr is not None:
                         expressions.append(expr)
                     else:
                         unsupported.append((name, None, value))
-            if column is None:
+            if entry is None:
                 unsupported.insert(0, (name, None, value))
             if len(expressions) == 0:
                 return unsupported, None
@@ -193,9 +879,12 @@ class ResourceBase(object):
                 return unsupported, and_(*expressions)
 
         reserved_keys = self._filter_key_mapping()
+        return _get_expression(filters or {})
+
+    def _apply_filters(self, query, orm_meta, filters=None, orders=None, bind_params=None):
         filters = filters or {}
         if filters:
-            unsupported, expressions = _get_expression(filters)
+            unsupported, expressions = self._get_filter_expressions(orm_meta, filters, bind_params=bind_params)
             for expr in expressions:
                 query = query.filter(expr)
         orders = orders or []
@@ -208,16 +897,17 @@ class ResourceBase(object):
                 elif field.startswith('-'):
                     order = '-'
                     field = field[1:]
-                expr_wrapper, column = filter_wrapper.column_from_expression(orm_meta, field)
+                entry = self._get_column_entry(orm_meta, field)
                 # 不支持relationship排序
-                if column is not None and expr_wrapper is None:
+                if entry is not None and entry.expr_wrapper is None:
                     if order == '+':
-                        query = query.order_by(column)
+                        query = query.order_by(entry.column)
                     else:
-                        query = query.order_by(column.desc())
+                        query = query.order_by(entry.column.desc())
         return query
 
-    def _get_query(self, session, orm_meta=None, filters=None, orders=None, joins=None, ignore_default=False):
+    def _get_query(self, session, orm_meta=None, filters=None, orders=None, joins=None, ignore_default=False,
+                   bind_params=None, level=None):
         """获取一个query对象，这个对象已经应用了filter，可以确保查询的数据只包含我们感兴趣的数据，常用于过滤已被删除的数据
 
         :param session: session对象
@@ -231,6 +921,10 @@ class ResourceBase(object):
         :type orders: list
         :param joins: 指定动态join,eg.[{'table': model, 'conditions': [model_a.col_1 == model_b.col_1]}]
         :type joins: list
+        :param bind_params: 若指定列表，过滤值将被替换为命名绑定参数，(参数名, 原值)按顺序追加到列表中
+        :type bind_params: list
+        :param level: 结果的序列化级别(list/detail/summary)，指定时预加载将被序列化的relationship
+        :type level: str
         :returns: query对象
         :rtype: query
         :raises: ValueError
@@ -260,12 +954,196 @@ class ResourceBase(object):
                     spec_args.extend(item['conditions'])
                 query = query.join(*spec_args,
                                    isouter=item.get('isouter', True))
-        query = self._apply_filters(query, orm_meta, filters, orders)
+        query = self._apply_filters(query, orm_meta, filters, orders, bind_params=bind_params)
         # 如果不是忽略default模式，default_filter必须进行过滤
         if not ignore_default:
-            query = self._apply_filters(query, orm_meta, self.default_filter)
+            query = self._apply_filters(query, orm_meta, self.default_filter, bind_params=bind_params)
+        if level:
+            options = self._get_load_options(orm_meta, level)
+            if options:
+                query = query.options(*options)
         return query
 
+    def _filter_shape(self, filters):
+        """
+        获取过滤条件的结构，结构仅包含列名、操作符、$or/$and嵌套以及值的类型，不包含具体的值
+
+        :param filters: 过滤条件字典
+        :type filters: dict
+        :returns: 可哈希的过滤条件结构
+        :rtype: tuple
+        """
+
+        def _value_shape(value):
+            if value is None:
+                return None
+            if utils.is_list_type(value):
+                # IN列表的长度决定了绑定参数的数量
+                return (type(value[0]).__name__ if value else None, len(value))
+            return type(value).__name__
+
+        reserved_keys = self._filter_key_mapping()
+        shape = []
+        for name, value in (filters or {}).items():
+            if name in reserved_keys:
+                shape.append((name, tuple(self._filter_shape(key_filters) for key_filters in value)))
+            elif isinstance(value, collections_abc.Mapping):
+                shape.append((name, tuple((operator, _value_shape(v)) for operator, v in value.items())))
+            else:
+                shape.append((name, None, _value_shape(value)))
+        return tuple(shape)
+
+    def _statement_cacheable(self, hooks, addtional):
+        """
+        判断本次查询是否可以使用查询语句缓存，钩子函数以及重写的_addtional_*、查询构建方法可以任意修改query，因此无法缓存
+
+        :param hooks: 钩子函数列表
+        :type hooks: list
+        :param addtional: _addtional_list/_addtional_count
+        :type addtional: str
+        :returns: 是否可以使用缓存
+        :rtype: bool
+        """
+        if not self._statement_cache or hooks:
+            return False
+        return not any(self._overrides(name) for name in _QUERY_BUILDERS + (addtional,))
+
+    def _overrides(self, name):
+        """判断子类是否重写了ResourceBase的方法"""
+        return (six.get_unbound_function(getattr(self.__class__, name)) is not
+                six.get_unbound_function(getattr(ResourceBase, name)))
+
+    def _iter_filter_leaves(self, orm_meta, filters):
+        """
+        按_get_filter_expressions的遍历顺序生成过滤条件中的(列元数据索引项, 操作符, 值)，不包括不存在的列
+
+        :param orm_meta: ORM Model
+        :type orm_meta: ORM Model
+        :param filters: 过滤条件
+        :type filters: dict
+        :returns: 生成器
+        :rtype: generator
+        """
+        reserved_keys = self._filter_key_mapping()
+        for name, value in (filters or {}).items():
+            if name in reserved_keys:
+                for key_filters in value:
+                    for leaf in self._iter_filter_leaves(orm_meta, key_filters):
+                        yield leaf
+                continue
+            entry = self._get_column_entry(orm_meta, name)
+            if entry is None:
+                continue
+            if isinstance(value, collections_abc.Mapping):
+                for operator, item in value.items():
+                    yield entry, operator, item
+            else:
+                yield entry, None, value
+
+    def _get_filter_params(self, filters=None):
+        """
+        获取过滤条件(包括default filter)对应的绑定参数值，供查询语句缓存使用
+
+        相同过滤条件结构第一次调用时构建各过滤条件的表达式并记录取值计划，之后直接从过滤条件中读取原值，
+        只有会转换过滤值的操作符(如like、布尔列)或取值方式与记录时不同(如None/bool常量变化)时才重新构建对应的表达式
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :returns: 绑定参数名称 -> 值，shape属性为过滤条件以及表达式的结构
+        :rtype: `_FilterParams`
+        """
+        # 参数值的收集顺序必须与_get_query中过滤条件的应用顺序一致
+        orm_meta = self.orm_meta
+        default_filter = self.default_filter
+        key = (self.__class__, orm_meta, self._filter_shape(filters), self._filter_shape(default_filter))
+        leaves = itertools.chain(self._iter_filter_leaves(orm_meta, filters),
+                                 self._iter_filter_leaves(orm_meta, default_filter))
+        plan = _FILTER_PLANS.get(key)
+        new_plan = [] if plan is None else None
+        bind_params = []
+        shapes = []
+        for idx, (entry, op, value) in enumerate(leaves):
+            mode, shape = plan[idx][:2] if plan is not None else (None, None)
+            if mode == 'constant' and type(value) is type(plan[idx][2]) and value == plan[idx][2]:
+                pass
+            elif mode == 'scalar' and _plain_value(value):
+                bind_params.append((_bind_name(len(bind_params), entry.name), value))
+            elif mode == 'expanding' and utils.is_list_type(value) and all(_plain_value(item) for item in value):
+                bind_params.append((_bind_name(len(bind_params), entry.name), tuple(value)))
+            elif mode == 'items' and utils.is_list_type(value) and all(_plain_value(item) for item in value):
+                for item in value:
+                    bind_params.append((_bind_name(len(bind_params), entry.name), item))
+            else:
+                start = len(bind_params)
+                expr = _filter_expression(entry, op, value, bind_params=bind_params)
+                shape = None if expr is None else _expression_shape(expr)
+                if new_plan is not None:
+                    mode = None if expr is None else _direct_mode(entry, op, value, bind_params[start:])
+                    new_plan.append((mode, shape, value if mode == 'constant' else None))
+            shapes.append(shape)
+        if new_plan is not None:
+            _FILTER_PLANS[key] = new_plan
+        return _FilterParams(bind_params, key[2:] + (tuple(shapes),))
+
+    def _get_cached_query(self, session, filters=None, orders=None, offset=None, limit=None, columns=None,
+                          count=False, window_count=False, params=None, level=None):
+        """
+        获取使用查询语句缓存的查询对象，过滤条件结构相同的查询只构建、编译一次，后续查询仅绑定新的参数值
+
+        :param session: session对象
+        :type session: session
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序，如果None，则默认使用default order
+        :type orders: list
+        :param offset: 起始偏移量
+        :type offset: int
+        :param limit: 数量限制
+        :type limit: int
+        :param columns: 投影列，指定时只查询这些列
+        :type columns: list
+        :param count: 是否生成SELECT COUNT(*)查询(不包含子查询)
+        :type count: bool
+        :param window_count: 是否在每行末尾附加COUNT(*) OVER()窗口列，即符合条件的记录总数
+        :type window_count: bool
+        :param params: 已获取的过滤条件绑定参数值，相同过滤条件的多个查询可共享，参见_get_filter_params
+        :type params: `_FilterParams`
+        :param level: 结果的序列化级别，指定时预加载将被序列化的relationship，投影以及count查询忽略此参数
+        :type level: str
+        :returns: 已绑定参数的查询结果对象，支持迭代、count()、all()、first()等
+        :rtype: `sqlalchemy.ext.baked.Result`
+        """
+        orm_meta = self.orm_meta
+        filters = filters or {}
+        orders = self.default_order if orders is None else orders
+        if params is None:
+            params = self._get_filter_params(filters)
+        cache_key = (self.__class__, orm_meta, params.shape, tuple(orders))
+        params = dict(params)
+
+        def _build(session):
+            return self._get_query(session, filters=filters, orders=list(orders), bind_params=[])
+
+        bq = STATEMENT_CACHE(_build, cache_key)
+        if level and not columns and not count:
+            options = self._get_load_options(orm_meta, level)
+            if options:
+                bq += (lambda q: q.options(*options)), ('options', level)
+        if columns:
+            bq += (lambda q: q.with_entities(*columns)), tuple(columns)
+        if count:
+            bq += lambda q: q.with_entities(func.count(literal_column('*'))).enable_assertions(False).select_from(
+                orm_meta)
+        if window_count:
+            bq += lambda q: q.add_columns(func.count(literal_column('*')).over())
+        if offset:
+            bq += lambda q: q.offset(bindparam('nf_offset'))
+            params['nf_offset'] = offset
+        if limit is not None:
+            bq += lambda q: q.limit(bindparam('nf_limit'))
+            params['nf_limit'] = limit
+        return bq(_real_session(session)).params(params)
+
     @property
     def default_filter(self):
         """
@@ -301,7 +1179,7 @@ class ResourceBase(object):
         """
         事务管理上下文, 如果资源初始化时指定使用外部事务，则返回的也是外部事务对象，
 
-        保证事务统一性
+        保证事务统一性；处于连接池的工作单元(DBPool.scope)中时在工作单元的会话上开启事务，或加入其已开启的事务
 
         eg.
 
@@ -315,8 +1193,24 @@ class ResourceBase(object):
 
             OtherResource(transaction=session).create()
         """
+        if self._transaction is None and isinstance(self._pool, pool.ShardedDBPool):
+            raise exceptions.CriticalError(msg=_('transaction on sharded pool requires a shard, use shard(value)'))
         session = None
-        if self._transaction is None:
+        scope_session = self._pool.current_session(write=True) if self._transaction is None else None
+        if scope_session is not None:
+            # 工作单元中已开启事务时加入该事务，由开启者提交
+            if scope_session.transaction is not None:
+                yield scope_session
+                return
+            try:
+                scope_session.begin()
+                yield scope_session
+                scope_session.commit()
+            except Exception as e:
+                LOG.exception(e)
+                scope_session.rollback()
+                raise e
+        elif self._transaction is None:
             try:
                 old_transaction = self._transaction
                 session = self._pool.transaction()
@@ -345,14 +1239,65 @@ class ResourceBase(object):
                 new_data[validator.field] = data[validator.field]
         return new_data
 
+    def _validate_data(self, data, situation):
+        """
+        使用_validate中的验证器验证并转换数据，未定义验证器时原样返回数据的副本
+
+        验证器需提供field、validate_on、error_msg、converter属性，以及validate(value)方法，
+        validate返回True表示验证通过，否则返回错误信息；converter需提供convert(value)方法
+
+        :param data: 数据
+        :type data: dict
+        :param situation: 场景，如create、update
+        :type situation: str
+        :returns: 验证并转换后的数据，仅包含定义了验证器的字段
+        :rtype: dict
+        :raises: FieldRequired, ValidationError
+        """
+        if not self._validate:
+            return dict(data)
+        validated = {}
+        for validator in self._validate:
+            mode = None
+            for item in validator.validate_on or []:
+                item_situation, _sep, item_mode = item.partition(':')
+                if item_situation in (situation, 'create_or_update'):
+                    mode = item_mode or 'O'
+                    break
+            if mode is None:
+                continue
+            field = validator.field
+            if field not in data:
+                if mode.upper() == 'M':
+                    raise exceptions.FieldRequired(attribute=field)
+                continue
+            value = data[field]
+            result = validator.validate(value)
+            if result is not True:
+                raise exceptions.ValidationError(attribute=field, msg=validator.error_msg or result)
+            if getattr(validator, 'converter', None) is not None:
+                value = validator.converter.convert(value)
+            validated[field] = value
+        return validated
+
     @contextlib.contextmanager
     def get_session(self):
         """
-        会话管理上下文, 如果资源初始化时指定使用外部会话，则返回的也是外部会话对象
+        会话管理上下文, 如果资源初始化时指定使用外部会话，则返回的也是外部会话对象，
+
+        处于连接池的工作单元(DBPool.scope)中时返回工作单元的会话
         """
+        scope_session = None
         if self._session is None and self._transaction is None:
+            scope_session = self._pool.current_session()
+        if scope_session is not None:
+            yield scope_session
+        elif self._session is None and self._transaction is None:
+            if isinstance(self._pool, pool.ShardedDBPool):
+                raise exceptions.CriticalError(msg=_('session on sharded pool requires a shard, use shard(value)'))
+            session = None
+            old_session = self._session
             try:
-                old_session = self._session
                 session = self._pool.get_session()
                 self._session = session
                 yield session
@@ -365,45 +1310,346 @@ class ResourceBase(object):
         else:
             yield self._transaction
 
-    def _addtional_count(self, query, filters):
-        return query
+    def _in_external_session(self):
+        """
+        是否使用外部会话/事务，或处于已开启事务的工作单元中，此时查询结果可能包含未提交的写入，
+        不能使用结果缓存，也不能拆分到其他连接上并行执行
 
-    def count(self, filters=None, offset=None, limit=None, hooks=None):
+        :returns: 是否使用外部会话
+        :rtype: bool
         """
-        获取符合条件的记录数量
+        if self._session is not None or self._transaction is not None:
+            return True
+        scope_session = self._pool.current_session()
+        return scope_session is not None and scope_session.transaction is not None
 
-        :param filters: 过滤条件
-        :type filters: dict
-        :param offset: 起始偏移量
-        :type offset: int
-        :param limit: 数量限制
-        :type limit: int
-        :param hooks: 钩子函数列表，函数形式为func(query, filters)
-        :type hooks: list
-        :returns: 数量
-        :rtype: int
+    def shard(self, value):
         """
-        offset = offset or 0
-        with self.get_session() as session:
-            query = self._get_query(session, filters=filters, orders=[])
-            if hooks:
-                for h in hooks:
-                    query = h(query, filters)
-            query = self._addtional_count(query, filters=filters)
-            if offset:
-                query = query.offset(offset)
-            if limit is not None:
-                query = query.limit(limit)
-            return query.count()
+        获取绑定到分片键值所在分片的资源对象，用于在单个分片上执行事务以及其他操作
 
-    def _addtional_list(self, query, filters):
-        return query
+        eg.
 
-    def list(self, filters=None, orders=None, offset=None, limit=None, hooks=None):
-        """
-        获取符合条件的记录
+        resource = User().shard(tenant_id)
 
-        :param filters: 过滤条件
+        with resource.transaction() as session:
+
+            resource.create_many(rows)
+
+        :param value: 分片键的值
+        :type value: any
+        :returns: 资源对象
+        :rtype: `ResourceBase`
+        :raises: CriticalError, ValidationError
+        """
+        if not isinstance(self._pool, pool.ShardedDBPool):
+            raise exceptions.CriticalError(msg=utils.format_kwstring(
+                _('%(name)s is not using a sharded pool'), name=self.__class__.__name__))
+        return self._on_shard(self._pool.get_shard(self._coerce_shard_value(value)))
+
+    def _on_shard(self, name):
+        resource = copy.copy(self)
+        resource._pool = self._pool.get_pool(name)
+        return resource
+
+    def _get_shard_values(self, filters):
+        """
+        从过滤条件中获取分片键的值，仅识别顶层的等于以及IN条件
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :returns: 分片键的值列表，未指定时返回None
+        :rtype: list
+        :raises: ValidationError
+        """
+        if not filters or self._shard_key not in filters:
+            return None
+        value = filters[self._shard_key]
+        if isinstance(value, dict):
+            if 'eq' in value:
+                value = value['eq']
+            elif 'in' in value:
+                value = value['in']
+            else:
+                return None
+        if value is None:
+            return None
+        if utils.is_list_type(value):
+            return [self._coerce_shard_value(item) for item in value]
+        return [self._coerce_shard_value(value)]
+
+    def _coerce_shard_value(self, value):
+        """
+        将分片键的值转换为分片键列的python类型，表单、查询字符串中的值均为字符串，不转换将被路由到错误的分片
+
+        :param value: 分片键的值
+        :type value: any
+        :returns: 转换后的值
+        :rtype: any
+        :raises: ValidationError
+        """
+        entry = self._get_column_entry(self.orm_meta, self._shard_key) if self._shard_key else None
+        python_type = _column_python_type(entry.column) if entry is not None else None
+        if value is None or python_type is None or isinstance(value, python_type):
+            return value
+        try:
+            if issubclass(python_type, bool):
+                return utils.bool_from_string(value, strict=True)
+            return python_type(value)
+        except (TypeError, ValueError, decimal.InvalidOperation):
+            raise exceptions.ValidationError(attribute=self._shard_key, msg=utils.format_kwstring(
+                _('invalid shard key value: %(value)s'), value=value))
+
+    def _get_shard_resources(self, filters):
+        """
+        根据过滤条件获取需要访问的各分片的资源对象
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :returns: 资源对象列表，未使用分片连接池或使用外部会话/事务时返回None
+        :rtype: list
+        :raises: CriticalError
+        """
+        if not isinstance(self._pool, pool.ShardedDBPool) or self._session is not None or \
+                self._transaction is not None:
+            return None
+        if not self._shard_key:
+            raise exceptions.CriticalError(msg=utils.format_kwstring(
+                _('%(name)s._shard_key can not be None when using sharded pool'), name=self.__class__.__name__))
+        return [self._on_shard(name) for name in self._pool.get_shards(self._get_shard_values(filters))]
+
+    def _run_on_shards(self, resources, func):
+        """
+        在各分片上并行执行func(resource)，单个分片时直接执行
+
+        :returns: 各分片的结果列表，顺序与resources一致
+        :rtype: list
+        """
+        if not resources:
+            return []
+        if len(resources) == 1:
+            return [func(resources[0])]
+        executor = futures.ThreadPoolExecutor(max_workers=len(resources))
+        try:
+            return list(executor.map(func, resources))
+        finally:
+            executor.shutdown(wait=True)
+
+    def _merge_shards(self, resources, parts, orders, offset, limit):
+        """
+        合并各分片的查询结果，指定排序时k路归并，并全局应用offset/limit
+
+        :returns: 记录列表
+        :rtype: list
+        :raises: ValidationError
+        """
+        sort_keys = [(order.lstrip('+-'), order.startswith('-')) for order in orders]
+        if not parts:
+            return []
+        if len(parts) == 1:
+            results = parts[0]
+        elif not sort_keys:
+            results = list(itertools.chain.from_iterable(parts))
+        else:
+            for part in parts:
+                if part:
+                    for field, desc in sort_keys:
+                        if field not in part[0]:
+                            raise exceptions.ValidationError(
+                                attribute=field, msg=_('order field must be included in results to merge shards'))
+                    break
+            with resources[0].get_session() as session:
+                dialect = _real_session(session).get_bind(self.orm_meta).dialect
+            results = _merge_sorted(parts, sort_keys, nulls_first=dialect.name != 'postgresql')
+        return results[offset:] if limit is None else results[offset:offset + limit]
+
+    def _get_result_tables(self):
+        """
+        获取查询结果涉及的表名，包括序列化时可能引用的relationship表
+
+        :returns: 表名列表
+        :rtype: list
+        """
+        return models.get_model_info(self.orm_meta).related_tables
+
+    def _get_cached_result(self, kind, hooks, func, *args):
+        """
+        使用查询结果缓存获取结果，未启用缓存、使用钩子函数或外部会话/事务时直接调用func
+
+        :param kind: 查询类型，list/count
+        :type kind: str
+        :param hooks: 钩子函数列表
+        :type hooks: list
+        :param func: 实际执行查询的函数
+        :type func: callable
+        :param args: 查询参数，用于生成缓存key
+        :type args: tuple
+        :returns: 查询结果
+        :rtype: any
+        """
+        result_cache = self._result_cache
+        if result_cache is None or hooks or self._in_external_session():
+            return func()
+        key = (self.__class__, self.orm_meta, id(self._pool), kind,
+               json.dumps([args, self.default_filter], sort_keys=True, default=repr))
+        result = result_cache.get(key)
+        if result is not cache.MISSING:
+            return result
+        tables = self._get_result_tables()
+        generation = result_cache.generation(tables)
+        result = func()
+        result_cache.set(key, result, tables, generation=generation)
+        return result
+
+    def _addtional_count(self, query, filters):
+        return query
+
+    def _estimate_count(self, session, filters=None):
+        """
+        获取符合条件的记录数量估算值，仅支持MySQL/PostgreSQL
+
+        没有任何过滤条件(包括default filter)时使用表统计信息，否则使用EXPLAIN的行数估算，
+        估算值小于_approximate_count_threshold时返回None，由调用方获取精确数量
+
+        :param session: session对象
+        :type session: session
+        :param filters: 过滤条件
+        :type filters: dict
+        :returns: 估算数量，无法估算时返回None
+        :rtype: int
+        """
+        real_session = _real_session(session)
+        mapper = sqlalchemy.inspect(self.orm_meta)
+        table = mapper.local_table
+        dialect = real_session.get_bind(mapper).dialect
+        if dialect.name not in ('mysql', 'postgresql'):
+            return None
+        try:
+            if not filters and not self.default_filter:
+                if dialect.name == 'mysql':
+                    sql = ('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                           'WHERE TABLE_SCHEMA = COALESCE(:schema, DATABASE()) AND TABLE_NAME = :name')
+                    params = {'schema': table.schema, 'name': table.name}
+                else:
+                    sql = 'SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)'
+                    params = {'name': table.fullname}
+                estimate = real_session.execute(text(sql), params, mapper=mapper).scalar()
+                return int(estimate) if estimate is not None else None
+            query = self._get_query(session, filters=filters, orders=[])
+            compiled = query.statement.compile(dialect=dialect)
+            if compiled.positional:
+                params = tuple(compiled.params[key] for key in compiled.positiontup)
+            else:
+                params = compiled.params
+            connection = real_session.connection(mapper=mapper, close_with_result=True)
+            if dialect.name == 'mysql':
+                row = connection.execute('EXPLAIN ' + compiled.string, params).first()
+                estimate = row['rows'] * float(row['filtered'] if 'filtered' in row.keys() else 100) / 100
+            else:
+                plan = connection.execute('EXPLAIN (FORMAT JSON) ' + compiled.string, params).scalar()
+                if isinstance(plan, six.string_types):
+                    plan = json.loads(plan)
+                estimate = plan[0]['Plan']['Plan Rows']
+        except sqlalchemy.exc.DBAPIError as e:
+            LOG.warning('failed to estimate count of %s: %s', self.orm_meta.__name__, e)
+            return None
+        if estimate >= self._approximate_count_threshold:
+            return int(estimate)
+        return None
+
+    @_track_operation()
+    def count(self, filters=None, offset=None, limit=None, hooks=None, approximate=False):
+        """
+        获取符合条件的记录数量
+
+        未指定offset/limit时生成不带子查询、不带排序的SELECT COUNT(*)
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param offset: 起始偏移量
+        :type offset: int
+        :param limit: 数量限制
+        :type limit: int
+        :param hooks: 钩子函数列表，函数形式为func(query, filters)
+        :type hooks: list
+        :param approximate: 是否允许返回估算数量，参见_estimate_count，仅在未指定offset/limit/hooks时生效
+        :type approximate: bool
+        :returns: 数量
+        :rtype: int
+        """
+        resources = self._get_shard_resources(filters)
+        if resources is not None:
+            total = sum(self._run_on_shards(resources, lambda resource: resource.count(
+                filters=filters, hooks=hooks, approximate=approximate and not offset and limit is None)))
+            total = max(total - (offset or 0), 0)
+            return total if limit is None else min(total, limit)
+        return self._get_cached_result(
+            'count', hooks, lambda: self._count(filters=filters, offset=offset, limit=limit, hooks=hooks,
+                                                approximate=approximate),
+            filters, offset, limit, approximate)
+
+    def _count(self, filters=None, offset=None, limit=None, hooks=None, approximate=False):
+        """
+        获取符合条件的记录数量，不使用查询结果缓存，参见count
+        """
+        offset = offset or 0
+        with self.get_session() as session:
+            if approximate and not offset and limit is None and not hooks:
+                estimate = self._estimate_count(session, filters=filters)
+                if estimate is not None:
+                    return estimate
+            if self._statement_cacheable(hooks, '_addtional_count'):
+                if not offset and limit is None:
+                    query = self._get_cached_query(session, filters=filters, orders=[], count=True)
+                    return query.scalar()
+                query = self._get_cached_query(session, filters=filters, orders=[], offset=offset, limit=limit)
+                return query.count()
+            query = self._get_query(session, filters=filters, orders=[])
+            if not offset and limit is None and not hooks and not self._overrides('_addtional_count'):
+                # 与缓存的count查询一致，直接SELECT count(*)，避免Query.count()生成的子查询
+                query = query.with_entities(func.count(literal_column('*'))).enable_assertions(False).select_from(
+                    self.orm_meta)
+                return query.scalar()
+            if hooks:
+                for h in hooks:
+                    query = h(query, filters)
+            query = self._addtional_count(query, filters=filters)
+            if offset:
+                query = query.offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+            return query.count()
+
+    def _addtional_list(self, query, filters):
+        return query
+
+    def _get_projection(self, fields):
+        """
+        解析投影字段为列对象
+
+        :param fields: 字段列表，True表示使用orm_meta.attributes中的列(未定义attributes时使用全部列)
+        :type fields: list/bool
+        :returns: (字段列表, 列对象列表)
+        :rtype: tuple
+        :raises: ValidationError
+        """
+        info = models.get_model_info(self.orm_meta)
+        if fields is True:
+            fields = getattr(self.orm_meta, 'attributes', None) or list(info.columns)
+            fields = [field for field in fields if field not in info.relationships]
+        columns = []
+        for field in fields:
+            entry = self._get_column_entry(self.orm_meta, field)
+            if entry is None or entry.expr_wrapper is not None or field in info.relationships:
+                raise exceptions.ValidationError(attribute=field, msg=_('field is not a column'))
+            columns.append(entry.column)
+        return list(fields), columns
+
+    @_track_operation()
+    def list(self, filters=None, orders=None, offset=None, limit=None, hooks=None, fields=None):
+        """
+        获取符合条件的记录
+
+        :param filters: 过滤条件
         :type filters: dict
         :param orders: 排序
         :type orders: list
@@ -413,19 +1659,864 @@ class ResourceBase(object):
         :type limit: int
         :param hooks: 钩子函数列表，函数形式为func(query, filters)
         :type hooks: list
+        :param fields: 投影字段列表，指定时只查询这些列，直接由行数据生成dict，不构建ORM对象，
+                       True表示使用orm_meta.attributes中的列
+        :type fields: list/bool
         :returns: 记录列表
         :rtype: list
         """
+        resources = self._get_shard_resources(filters)
+        if resources is not None:
+            orders = self.default_order if orders is None else orders
+            offset = offset or 0
+            if len(resources) == 1:
+                return resources[0].list(filters=filters, orders=orders, offset=offset, limit=limit, hooks=hooks,
+                                         fields=fields)
+            shard_limit = None if limit is None else offset + limit
+            parts = self._run_on_shards(resources, lambda resource: resource.list(
+                filters=filters, orders=orders, limit=shard_limit, hooks=hooks, fields=fields))
+            return self._merge_shards(resources, parts, orders, offset, limit)
+        return self._get_cached_result(
+            'list', hooks, lambda: self._list(filters=filters, orders=orders, offset=offset, limit=limit,
+                                              hooks=hooks, fields=fields),
+            filters, orders, offset, limit, fields)
+
+    def _list(self, filters=None, orders=None, offset=None, limit=None, hooks=None, fields=None):
+        """
+        获取符合条件的记录，不使用查询结果缓存，参见list
+        """
         offset = offset or 0
+        columns = None
+        if fields:
+            fields, columns = self._get_projection(fields)
+        with self.get_session() as session:
+            if self._statement_cacheable(hooks, '_addtional_list'):
+                query = self._get_cached_query(session, filters=filters, orders=orders, offset=offset, limit=limit,
+                                               columns=columns, level='list')
+            else:
+                query = self._get_query(session, filters=filters, orders=orders, level=None if columns else 'list')
+                if hooks:
+                    for h in hooks:
+                        query = h(query, filters)
+                query = self._addtional_list(query, filters)
+                if columns:
+                    query = query.with_entities(*columns)
+                if offset:
+                    query = query.offset(offset)
+                if limit is not None:
+                    query = query.limit(limit)
+            if columns:
+                return [dict(zip(fields, row)) for row in query]
+            results = [rec.to_dict() for rec in query]
+            return results
+
+    def _supports_window_function(self, session):
+        """
+        判断数据库是否支持窗口函数
+
+        :param session: session对象
+        :type session: session
+        :returns: 是否支持
+        :rtype: bool
+        """
+        dialect = _real_session(session).get_bind(self.orm_meta).dialect
+        if dialect.name == 'postgresql':
+            return True
+        if dialect.name == 'mysql':
+            version = tuple(v for v in (dialect.server_version_info or ()) if isinstance(v, int))
+            if getattr(dialect, '_is_mariadb', False):
+                return version >= (10, 2)
+            return version >= (8, 0)
+        if dialect.name == 'sqlite':
+            return dialect.dbapi.sqlite_version_info >= (3, 25)
+        return False
+
+    @_track_operation()
+    def list_with_total(self, filters=None, orders=None, offset=None, limit=None, fields=None):
+        """
+        在同一个会话中获取符合条件的记录以及记录总数，适用于分页接口
+
+        数据库支持窗口函数时，通过COUNT(*) OVER()在一次查询中同时获取记录和总数，
+        否则使用相同的过滤条件参数依次执行list以及count查询
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序
+        :type orders: list
+        :param offset: 起始偏移量
+        :type offset: int
+        :param limit: 数量限制
+        :type limit: int
+        :param fields: 投影字段列表，参见list
+        :type fields: list/bool
+        :returns: (记录列表, 记录总数)
+        :rtype: tuple
+        """
+        offset = offset or 0
+        resources = self._get_shard_resources(filters)
+        if resources is not None:
+            orders = self.default_order if orders is None else orders
+            if len(resources) == 1:
+                return resources[0].list_with_total(filters=filters, orders=orders, offset=offset, limit=limit,
+                                                    fields=fields)
+            shard_limit = None if limit is None else offset + limit
+            parts = self._run_on_shards(resources, lambda resource: resource.list_with_total(
+                filters=filters, orders=orders, limit=shard_limit, fields=fields))
+            results = self._merge_shards(resources, [part[0] for part in parts], orders, offset, limit)
+            return results, sum(part[1] for part in parts)
+        columns = None
+        if fields:
+            fields, columns = self._get_projection(fields)
+
+        def _to_dict(row):
+            if columns:
+                return dict(zip(fields, row))
+            return row.to_dict()
+
+        with self.get_session() as session:
+            if not (self._statement_cacheable(None, '_addtional_list') and
+                    self._statement_cacheable(None, '_addtional_count')):
+                return self._list_with_total_uncached(session, filters, orders, offset, limit, fields, columns)
+            params = self._get_filter_params(filters)
+            if not offset and limit is None:
+                query = self._get_cached_query(session, filters=filters, orders=orders, columns=columns,
+                                               params=params, level='list')
+                results = [_to_dict(row) for row in query]
+                return results, len(results)
+            if self._supports_window_function(session):
+                query = self._get_cached_query(session, filters=filters, orders=orders, offset=offset, limit=limit,
+                                               columns=columns, window_count=True, params=params, level='list')
+                rows = query.all()
+                if rows or not offset:
+                    total = rows[0][-1] if rows else 0
+                    if columns:
+                        return [dict(zip(fields, row[:-1])) for row in rows], total
+                    return [row[0].to_dict() for row in rows], total
+                # 偏移量超出记录总数时没有返回行，需要单独获取总数
+                results = []
+            else:
+                query = self._get_cached_query(session, filters=filters, orders=orders, offset=offset, limit=limit,
+                                               columns=columns, params=params, level='list')
+                results = [_to_dict(row) for row in query]
+            total = self._get_cached_query(session, filters=filters, orders=[], count=True, params=params).scalar()
+            return results, total
+
+    def _list_with_total_uncached(self, session, filters, orders, offset, limit, fields, columns):
+        """
+        不使用查询语句缓存获取记录以及记录总数，应用_addtional_list，参见list_with_total
+
+        重写了_addtional_count时总数使用count查询获取，否则与记录使用相同的查询
+        """
+        query = self._get_query(session, filters=filters, orders=orders, level=None if columns else 'list')
+        query = self._addtional_list(query, filters)
+        if columns:
+            query = query.with_entities(*columns)
+
+        def _to_dict(row):
+            if columns:
+                return dict(zip(fields, row))
+            return row.to_dict()
+
+        shared_count = self._statement_cacheable(None, '_addtional_count')
+        if not offset and limit is None:
+            results = [_to_dict(row) for row in query]
+            return results, len(results) if shared_count else self._count(filters=filters)
+        window = shared_count and self._supports_window_function(session)
+        paged = query.add_columns(func.count(literal_column('*')).over()) if window else query
+        if offset:
+            paged = paged.offset(offset)
+        if limit is not None:
+            paged = paged.limit(limit)
+        if window:
+            rows = paged.all()
+            if rows or not offset:
+                total = rows[0][-1] if rows else 0
+                if columns:
+                    return [dict(zip(fields, row[:-1])) for row in rows], total
+                return [row[0].to_dict() for row in rows], total
+            # 偏移量超出记录总数时没有返回行，需要单独获取总数
+            results = []
+        else:
+            results = [_to_dict(row) for row in paged]
+        total = query.order_by(None).count() if shared_count else self._count(filters=filters)
+        return results, total
+
+    def iter_batches(self, filters=None, orders=None, offset=None, limit=None, hooks=None, batch_size=1000):
+        """
+        以生成器方式分批获取符合条件的记录，使用服务端游标(stream_results)以及yield_per逐批读取，
+        每行转换为dict后即从session中移除，内存占用只与batch_size相关，与结果总量无关
+
+        joined方式的集合eager load无法与yield_per共用，会自动改为selectin方式按批加载；
+        非事务会话中relationship的加载使用独立连接，因此在MySQL服务端游标读取过程中同样可用
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序
+        :type orders: list
+        :param offset: 起始偏移量
+        :type offset: int
+        :param limit: 数量限制
+        :type limit: int
+        :param hooks: 钩子函数列表，函数形式为func(query, filters)
+        :type hooks: list
+        :param batch_size: 每批记录数量
+        :type batch_size: int
+        :returns: 记录列表生成器，每次生成不超过batch_size条记录
+        :rtype: generator
+        """
+        offset = offset or 0
+        with self.get_session() as session:
+            query = self._get_query(session, filters=filters, orders=orders, level='list')
+            if hooks:
+                for h in hooks:
+                    query = h(query, filters)
+            query = self._addtional_list(query, filters)
+            if offset:
+                query = query.offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+            if self._get_load_options(self.orm_meta, 'list') is None:
+                for prop in models.get_model_info(self.orm_meta).relationships.values():
+                    if prop.uselist and prop.lazy in ('joined', False):
+                        query = query.options(selectinload(getattr(self.orm_meta, prop.key)))
+            query = query.yield_per(batch_size).execution_options(stream_results=True)
+            real_session = _real_session(session)
+            results = []
+            for rec in query:
+                results.append(rec.to_dict())
+                real_session.expunge(rec)
+                if len(results) >= batch_size:
+                    yield results
+                    results = []
+            if results:
+                yield results
+
+    def iter_list(self, filters=None, orders=None, offset=None, limit=None, hooks=None, batch_size=1000):
+        """
+        以生成器方式逐条获取符合条件的记录，参见iter_batches
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序
+        :type orders: list
+        :param offset: 起始偏移量
+        :type offset: int
+        :param limit: 数量限制
+        :type limit: int
+        :param hooks: 钩子函数列表，函数形式为func(query, filters)
+        :type hooks: list
+        :param batch_size: 每次从数据库读取的记录数量
+        :type batch_size: int
+        :returns: 记录生成器
+        :rtype: generator
+        """
+        for results in self.iter_batches(filters=filters, orders=orders, offset=offset, limit=limit,
+                                         hooks=hooks, batch_size=batch_size):
+            for result in results:
+                yield result
+
+    def _get_seek_orders(self, orders=None):
+        """
+        获取唯一确定行顺序的排序规则，即排序列后追加未包含的主键列
+
+        :param orders: 排序，如果None，则默认使用default order
+        :type orders: list
+        :returns: [(排序规则, 列名, 是否递减, 列对象)]
+        :rtype: list
+        """
+        orders = self.default_order if orders is None else orders
+        primary_keys = self.primary_keys
+        if not utils.is_list_type(primary_keys):
+            primary_keys = [primary_keys]
+        seek_orders = []
+        fields = set()
+        for field in list(orders) + ['+%s' % key for key in primary_keys]:
+            desc = field.startswith('-')
+            if field.startswith('+') or field.startswith('-'):
+                field = field[1:]
+            entry = self._get_column_entry(self.orm_meta, field)
+            # 不支持relationship排序，与_apply_filters行为一致
+            if field in fields or entry is None or entry.expr_wrapper is not None:
+                continue
+            fields.add(field)
+            seek_orders.append(('-' + field if desc else '+' + field, field, desc, entry.column))
+        return seek_orders
+
+    def _get_seek_expression(self, session, seek_orders, values):
+        """
+        根据上一页最后一行的排序列值生成范围定位(seek)表达式
+
+        排序列均不可为NULL且排序方向一致时使用行值比较(a, id) > (:a, :id)，可直接使用联合索引做范围扫描，
+        否则展开为a > :a OR (a = :a AND id > :id)，可为NULL的列按数据库的NULL排序位置
+        (MySQL/sqlite升序时最前，PostgreSQL/Oracle升序时最后)生成IS NULL/IS NOT NULL条件
+
+        :param session: session对象
+        :type session: session
+        :param seek_orders: _get_seek_orders返回的排序规则
+        :type seek_orders: list
+        :param values: 排序列值
+        :type values: list
+        :returns: SQL表达式
+        :rtype: `ClauseElement`
+        """
+        columns = [order[3] for order in seek_orders]
+        directions = set([order[2] for order in seek_orders])
+        dialect = _real_session(session).get_bind(self.orm_meta).dialect
+        nullable = any(value is None or _column_nullable(column) for column, value in zip(columns, values))
+        if not nullable and (len(columns) == 1 or (len(directions) == 1 and
+                                                   dialect.name in ('mysql', 'postgresql', 'sqlite'))):
+            if len(columns) == 1:
+                left, right = columns[0], values[0]
+            else:
+                left, right = tuple_(*columns), tuple_(*values)
+            return left < right if seek_orders[0][2] else left > right
+        # NULL是否小于任何值
+        null_smallest = dialect.name not in ('postgresql', 'oracle')
+        expressions = []
+        for idx, (order, field, desc, column) in enumerate(seek_orders):
+            conditions = [columns[i].is_(None) if values[i] is None else columns[i] == values[i] for i in range(idx)]
+            # 当前排序方向上NULL是否排在最前
+            nulls_first = null_smallest != desc
+            if values[idx] is None:
+                if not nulls_first:
+                    # NULL排在最后，之后没有记录
+                    continue
+                conditions.append(column.isnot(None))
+            else:
+                after = column < values[idx] if desc else column > values[idx]
+                if not nulls_first and _column_nullable(column):
+                    after = or_(after, column.is_(None))
+                conditions.append(after)
+            expressions.append(and_(*conditions))
+        if not expressions:
+            return sqlalchemy.false()
+        return or_(*expressions)
+
+    @_track_operation()
+    def list_by_cursor(self, filters=None, orders=None, limit=None, cursor=None, hooks=None):
+        """
+        使用游标(keyset/seek)方式分页获取符合条件的记录
+
+        排序规则会自动追加主键列以确保顺序唯一，每一页都通过索引范围定位获取，翻页深度不影响查询耗时，
+        排序列可以为NULL，但可为NULL的列无法使用行值比较，范围扫描的效率较低
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序
+        :type orders: list
+        :param limit: 数量限制
+        :type limit: int
+        :param cursor: 上一页返回的游标，None表示第一页
+        :type cursor: str
+        :param hooks: 钩子函数列表，函数形式为func(query, filters)
+        :type hooks: list
+        :returns: (记录列表, 下一页游标)，没有下一页时游标为None
+        :rtype: tuple
+        :raises: ValidationError
+        """
+        seek_orders = self._get_seek_orders(orders)
+        orders = [order[0] for order in seek_orders]
+        values = None
+        if cursor:
+            try:
+                cursor_orders, values = _decode_cursor(
+                    cursor, python_types=[_column_python_type(order[3]) for order in seek_orders])
+            except (TypeError, ValueError, KeyError, AttributeError, decimal.InvalidOperation):
+                raise exceptions.ValidationError(attribute='cursor', msg=_('invalid cursor'))
+            if cursor_orders != orders or len(values) != len(orders):
+                raise exceptions.ValidationError(attribute='cursor', msg=_('cursor does not match orders'))
+        with self.get_session() as session:
+            query = self._get_query(session, filters=filters, orders=orders, level='list')
+            if hooks:
+                for h in hooks:
+                    query = h(query, filters)
+            query = self._addtional_list(query, filters)
+            if values is not None:
+                query = query.filter(self._get_seek_expression(session, seek_orders, values))
+            if limit is not None:
+                query = query.limit(limit + 1)
+            records = query.all()
+            next_cursor = None
+            if limit is not None and len(records) > limit:
+                records = records[:limit]
+                last = records[-1]
+                next_cursor = _encode_cursor(orders, [getattr(last, order[1]) for order in seek_orders])
+            return [rec.to_dict() for rec in records], next_cursor
+
+    def _execute_chunks(self, rows, chunk_size, write_chunk):
+        """
+        在同一个事务中分块写入记录
+
+        :param rows: 记录列表
+        :type rows: list
+        :param chunk_size: 每块记录数量
+        :type chunk_size: int
+        :param write_chunk: 函数func(session, table, chunk)，写入一块记录并返回(插入数量, 更新数量)
+        :type write_chunk: callable
+        :returns: {'inserted': 插入数量, 'updated': 更新数量, 'chunks': [{'rows': 记录数, 'elapsed': 耗时(秒)}]}
+        :rtype: dict
+        """
+        info = models.get_model_info(self.orm_meta)
+        table = info.table
+        summary = {'inserted': 0, 'updated': 0, 'chunks': []}
+        if not rows:
+            return summary
+        with self.transaction() as session:
+            real_session = _real_session(session)
+            for chunk in _split_rows(rows, chunk_size):
+                started = time.time()
+                inserted, updated = write_chunk(real_session, table, chunk)
+                elapsed = time.time() - started
+                summary['inserted'] += inserted
+                summary['updated'] += updated
+                summary['chunks'].append({'rows': len(chunk), 'elapsed': elapsed})
+                LOG.debug('%s bulk write: %d rows in %.3fs', self.orm_meta.__name__, len(chunk), elapsed)
+            # Core语句不经过flush，需要主动登记写入的表
+            cache.mark_dirty(real_session, [t.fullname for t in info.mapper.tables])
+        return summary
+
+    def create_many(self, rows, chunk_size=1000):
+        """
+        批量创建记录，每条记录先经过_validate验证，然后在同一个事务中分块执行多行INSERT
+
+        :param rows: 记录列表
+        :type rows: list
+        :param chunk_size: 每条INSERT语句的记录数量
+        :type chunk_size: int
+        :returns: {'inserted': 插入数量, 'updated': 0, 'chunks': [{'rows': 记录数, 'elapsed': 耗时(秒)}]}
+        :rtype: dict
+        :raises: FieldRequired, ValidationError
+        """
+        rows = [self._validate_data(row, 'create') for row in rows]
+
+        def _write_chunk(session, table, chunk):
+            session.execute(table.insert().values(chunk), mapper=self.orm_meta)
+            return len(chunk), 0
+
+        return self._execute_chunks(rows, chunk_size, _write_chunk)
+
+    def upsert_many(self, rows, conflict_keys=None, chunk_size=1000):
+        """
+        批量创建或更新记录，每条记录先经过_validate验证，然后在同一个事务中分块执行
+        MySQL: INSERT ... ON DUPLICATE KEY UPDATE
+        PostgreSQL/sqlite: INSERT ... ON CONFLICT (...) DO UPDATE
+
+        :param rows: 记录列表
+        :type rows: list
+        :param conflict_keys: 冲突判定列(唯一索引列)，默认为主键列，冲突时更新除这些列以外的字段
+        :type conflict_keys: list
+        :param chunk_size: 每条INSERT语句的记录数量
+        :type chunk_size: int
+        :returns: {'inserted': 插入数量, 'updated': 更新数量(包括值未变化的已存在记录),
+                   'chunks': [{'rows': 记录数, 'elapsed': 耗时(秒)}]}；MySQL/sqlite按写入前已存在的记录统计，
+                   并发写入相同记录时为近似值
+        :rtype: dict
+        :raises: FieldRequired, ValidationError, CriticalError
+        """
+        if conflict_keys is None:
+            conflict_keys = self.primary_keys
+        if not utils.is_list_type(conflict_keys):
+            conflict_keys = [conflict_keys]
+        conflict_keys = list(conflict_keys)
+        rows = [self._validate_data(row, 'create') for row in rows]
+
+        def _count_existing(session, table, chunk):
+            columns = [table.c[key] for key in conflict_keys]
+            keys = [tuple(row.get(key) for key in conflict_keys) for row in chunk]
+            if len(columns) == 1:
+                expr = columns[0].in_([key[0] for key in keys])
+            else:
+                expr = tuple_(*columns).in_(keys)
+            query = sqlalchemy.select([func.count(literal_column('*'))]).select_from(table).where(expr)
+            return session.execute(query, mapper=self.orm_meta).scalar()
+
+        def _write_chunk(session, table, chunk):
+            dialect = session.get_bind(self.orm_meta).dialect
+            update_columns = [key for key in sorted(chunk[0].keys()) if key not in conflict_keys]
+            if dialect.name == 'mysql':
+                # SQLAlchemy的MySQL方言总是启用CLIENT_FOUND_ROWS，值未变化的重复行与插入同样计1行，
+                # 无法从rowcount区分插入/更新，同一事务中预先统计已存在的记录
+                existing = _count_existing(session, table, chunk)
+                stmt = mysql.insert(table).values(chunk)
+                # 无可更新字段时，以主键自赋值代替DO NOTHING
+                columns = update_columns or conflict_keys[:1]
+                stmt = stmt.on_duplicate_key_update(
+                    collections.OrderedDict((col, stmt.inserted[col]) for col in columns))
+                session.execute(stmt, mapper=self.orm_meta)
+                return len(chunk) - existing, existing
+            if dialect.name == 'postgresql':
+                stmt = postgresql.insert(table).values(chunk)
+                if update_columns:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=conflict_keys,
+                        set_=collections.OrderedDict((col, stmt.excluded[col]) for col in update_columns))
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=conflict_keys)
+                # xmax = 0 表示该行为本次新插入，DO NOTHING跳过的已存在记录不返回，与其他方言一致计为更新
+                flags = [row[0] for row in session.execute(
+                    stmt.returning(literal_column('(xmax = 0)')), mapper=self.orm_meta)]
+                inserted = len([flag for flag in flags if flag])
+                return inserted, len(chunk) - inserted
+            if dialect.name == 'sqlite':
+                # sqlite无法从rowcount区分插入/更新，同一事务中预先统计已存在的记录
+                existing = _count_existing(session, table, chunk)
+                session.execute(SQLiteUpsert(table, conflict_keys, update_columns).values(chunk),
+                                mapper=self.orm_meta)
+                return len(chunk) - existing, existing
+            raise exceptions.CriticalError(msg=utils.format_kwstring(
+                _('upsert is not supported by dialect %(dialect)s'), dialect=dialect.name))
+
+        return self._execute_chunks(rows, chunk_size, _write_chunk)
+
+    def _execute_by_filter(self, filters, execute, chunk_size=None):
+        """
+        对符合条件的记录执行集合操作(UPDATE/DELETE)
+
+        指定chunk_size时，按主键(联合主键时为第一个主键列)排序划分范围，每个范围单独执行一条语句，
+        未处于外部事务时每个范围使用独立事务，避免长时间持有大量行锁
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param execute: 函数func(query)，对query执行操作并返回影响行数
+        :type execute: callable
+        :param chunk_size: 每个范围的记录数量，None表示使用单条语句
+        :type chunk_size: int
+        :returns: 影响行数
+        :rtype: int
+        """
+        resources = self._get_shard_resources(filters)
+        if resources is not None:
+            # 各分片在各自的事务中执行，不保证跨分片的原子性
+            return sum(self._run_on_shards(
+                resources, lambda resource: resource._execute_by_filter(filters, execute, chunk_size=chunk_size)))
+        if not chunk_size:
+            with self.transaction() as session:
+                return execute(self._get_query(session, filters=filters, orders=[]))
+        primary_keys = self.primary_keys
+        if utils.is_list_type(primary_keys):
+            primary_keys = primary_keys[0]
+        column = getattr(self.orm_meta, primary_keys)
+        affected = 0
+        last = None
+        while True:
+            with self.transaction() as session:
+                query = self._get_query(session, filters=filters, orders=[])
+                if last is not None:
+                    query = query.filter(column > last)
+                # 通过索引定位本范围的上界，范围内的记录在本次操作后可能不再符合过滤条件
+                boundary = query.with_entities(column).order_by(column).offset(chunk_size - 1).limit(1).scalar()
+                if boundary is not None:
+                    query = query.filter(column <= boundary)
+                affected += execute(query)
+            if boundary is None:
+                break
+            last = boundary
+        return affected
+
+    @_track_operation()
+    def update_by_filter(self, filters, values, chunk_size=None):
+        """
+        使用单条UPDATE语句更新符合条件(包括默认过滤条件)的记录，不加载记录到内存
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param values: 更新的字段及值
+        :type values: dict
+        :param chunk_size: 按主键范围分块更新，每块的记录数量，None表示不分块
+        :type chunk_size: int
+        :returns: 影响行数
+        :rtype: int
+        :raises: FieldRequired, ValidationError
+        """
+        values = self._validate_data(values, 'update')
+        if not values:
+            return 0
+
+        def _execute(query):
+            return query.update(values, synchronize_session=False)
+
+        return self._execute_by_filter(filters, _execute, chunk_size=chunk_size)
+
+    @_track_operation()
+    def delete_by_filter(self, filters, soft=True, chunk_size=None):
+        """
+        使用单条语句删除符合条件(包括默认过滤条件)的记录，不加载记录到内存
+
+        soft为True且存在removed列时设置removed为当前时间，否则使用DELETE语句直接删除
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param soft: 是否软删除
+        :type soft: bool
+        :param chunk_size: 按主键范围分块删除，每块的记录数量，None表示不分块
+        :type chunk_size: int
+        :returns: 影响行数
+        :rtype: int
+        """
+        if soft and 'removed' in models.get_model_info(self.orm_meta).columns:
+            removed = datetime.datetime.now()
+
+            def _execute(query):
+                return query.update({'removed': removed}, synchronize_session=False)
+        else:
+            def _execute(query):
+                return query.delete(synchronize_session=False)
+
+        return self._execute_by_filter(filters, _execute, chunk_size=chunk_size)
+
+    def _normalize_primary_key(self, keys, pk):
+        """
+        将主键值转换为统一形式，单主键时为值本身，联合主键时为按_primary_keys顺序排列的元组
+
+        :param keys: 主键列名列表
+        :type keys: list
+        :param pk: 主键值，联合主键时可为元组/列表或{列名: 值}字典
+        :type pk: any
+        :returns: 主键值
+        :rtype: any
+        :raises: ValidationError
+        """
+        if isinstance(pk, collections_abc.Mapping):
+            pk = tuple(pk.get(key) for key in keys)
+        elif not utils.is_list_type(pk):
+            pk = (pk,)
+        pk = tuple(pk)
+        if len(pk) != len(keys):
+            raise exceptions.ValidationError(attribute=','.join(keys), msg=utils.format_kwstring(
+                _('primary key must contain %(count)d values'), count=len(keys)))
+        if len(keys) == 1:
+            return pk[0]
+        return pk
+
+    def get(self, pk):
+        """
+        根据主键获取记录
+
+        :param pk: 主键值，联合主键时可为元组/列表或{列名: 值}字典
+        :type pk: any
+        :returns: 记录，不存在时返回None
+        :rtype: dict
+        """
+        results = self.get_many([pk])
+        for value in results.values():
+            return value
+        return None
+
+    def get_many(self, pks, chunk_size=500):
+        """
+        根据主键批量获取记录
+
+        未设置默认过滤条件时，优先从session的identity map中获取已加载的记录，
+        剩余主键按chunk_size分块，使用IN(联合主键时为行值IN或OR展开)批量查询
+
+        :param pks: 主键值列表，联合主键时元素可为元组/列表或{列名: 值}字典
+        :type pks: list
+        :param chunk_size: 每次查询的主键数量
+        :type chunk_size: int
+        :returns: {主键值: 记录}，按传入顺序排列，不存在的主键不包含在结果中；联合主键时key为元组
+        :rtype: `collections.OrderedDict`
+        :raises: ValidationError
+        """
+        keys = self.primary_keys
+        if not utils.is_list_type(keys):
+            keys = [keys]
+        keys = list(keys)
+        columns = [getattr(self.orm_meta, key) for key in keys]
+        pks = list(collections.OrderedDict.fromkeys(self._normalize_primary_key(keys, pk) for pk in pks))
+        found = {}
+        with self.get_session() as session:
+            real_session = _real_session(session)
+            remaining = pks
+            if not self.default_filter:
+                # identity map中的记录不一定符合默认过滤条件，仅在未设置默认过滤条件时使用
+                mapper = sqlalchemy.inspect(self.orm_meta)
+                mapper_keys = models.get_model_info(self.orm_meta).primary_keys
+                if sorted(mapper_keys) == sorted(keys):
+                    remaining = []
+                    for pk in pks:
+                        values = dict(zip(keys, pk if len(keys) > 1 else (pk,)))
+                        identity_key = mapper.identity_key_from_primary_key([values[key] for key in mapper_keys])
+                        rec = real_session.identity_map.get(identity_key)
+                        if rec is not None and not sqlalchemy.inspect(rec).expired_attributes:
+                            found[pk] = rec.to_dict()
+                        else:
+                            remaining.append(pk)
+            dialect = real_session.get_bind(self.orm_meta).dialect
+            for idx in range(0, len(remaining), chunk_size):
+                chunk = remaining[idx:idx + chunk_size]
+                if len(columns) == 1:
+                    expr = columns[0].in_(chunk)
+                elif dialect.name in ('mysql', 'postgresql', 'sqlite'):
+                    expr = tuple_(*columns).in_(chunk)
+                else:
+                    expr = or_(*[and_(*[col == value for col, value in zip(columns, pk)]) for pk in chunk])
+                query = self._get_query(session, orders=[], level='list').filter(expr)
+                for rec in query:
+                    pk = tuple(getattr(rec, key) for key in keys)
+                    found[pk if len(keys) > 1 else pk[0]] = rec.to_dict()
+        return collections.OrderedDict((pk, found[pk]) for pk in pks if pk in found)
+
+    @_track_operation(filters_index=1)
+    def list_columnar(self, fields=True, filters=None, orders=None, offset=None, limit=None, hooks=None,
+                      batch_size=1000):
+        """
+        以列存储形式获取符合条件的记录，适用于报表等分析型读取
+
+        行数据从游标分批读取后直接追加到各列的数组中，不构建ORM对象以及行字典；
+        安装了numpy时返回numpy数组，dtype由列类型决定，否则非空整数、浮点数列返回array.array，其余列返回list
+
+        :param fields: 字段列表，True表示使用orm_meta.attributes中的列(未定义attributes时使用全部列)
+        :type fields: list/bool
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序
+        :type orders: list
+        :param offset: 起始偏移量
+        :type offset: int
+        :param limit: 数量限制
+        :type limit: int
+        :param hooks: 钩子函数列表，函数形式为func(query, filters)
+        :type hooks: list
+        :param batch_size: 每次从数据库读取的记录数量
+        :type batch_size: int
+        :returns: {字段名: 列数据}，按fields顺序排列
+        :rtype: `collections.OrderedDict`
+        :raises: ValidationError
+        """
+        fields, columns = self._get_projection(fields)
+        buffers = [_new_column_buffer(column) for column in columns]
         with self.get_session() as session:
             query = self._get_query(session, filters=filters, orders=orders)
             if hooks:
                 for h in hooks:
                     query = h(query, filters)
             query = self._addtional_list(query, filters)
+            query = query.with_entities(*columns)
             if offset:
                 query = query.offset(offset)
             if limit is not None:
                 query = query.limit(limit)
-            results = [rec.to_dict() for rec in query]
-            return results
+            rows = iter(query.yield_per(batch_size).execution_options(stream_results=True))
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                for idx, values in enumerate(zip(*batch)):
+                    try:
+                        buffers[idx].extend(values)
+                    except (TypeError, OverflowError):
+                        # NOT NULL列也可能因外连接等返回NULL，或数值超出64位范围，退化为list
+                        buffers[idx] = buffers[idx].tolist()
+                        buffers[idx].extend(values)
+        if numpy is not None:
+            buffers = [_to_numpy_array(column, values) for column, values in zip(columns, buffers)]
+        return collections.OrderedDict(zip(fields, buffers))
+
+    def _get_partition_expressions(self, session, column, filters, hooks, partitions):
+        """
+        将列的取值范围划分为不超过partitions个分片，返回各分片的过滤表达式
+
+        整数列按最小/最大值等宽划分，其他类型的列按分位点划分(需要该列有索引)
+
+        :param session: session对象
+        :type session: session
+        :param column: 分片列
+        :type column: `Column`
+        :param filters: 过滤条件
+        :type filters: dict
+        :param hooks: 钩子函数列表
+        :type hooks: list
+        :param partitions: 分片数量
+        :type partitions: int
+        :returns: 各分片的过滤表达式，没有符合条件的记录时返回空列表
+        :rtype: list
+        """
+        query = self._get_query(session, filters=filters, orders=[])
+        if hooks:
+            for h in hooks:
+                query = h(query, filters)
+        query = self._addtional_list(query, filters)
+        lower, upper = query.with_entities(func.min(column), func.max(column)).one()
+        if lower is None:
+            return []
+        if isinstance(lower, six.integer_types) and not isinstance(lower, bool):
+            step = float(upper - lower + 1) / partitions
+            boundaries = [lower + int(step * idx) for idx in range(1, partitions)]
+        else:
+            total = query.count()
+            boundaries = [query.with_entities(column).filter(column.isnot(None)).order_by(column).offset(
+                total * idx // partitions).limit(1).scalar() for idx in range(1, partitions)]
+        boundaries = sorted(set(b for b in boundaries if b is not None and lower < b <= upper))
+        if not boundaries:
+            return [None]
+        expressions = [column < boundaries[0]]
+        for idx in range(1, len(boundaries)):
+            expressions.append(and_(column >= boundaries[idx - 1], column < boundaries[idx]))
+        expressions.append(or_(column >= boundaries[-1], column.is_(None)))
+        return expressions
+
+    def list_parallel(self, filters=None, orders=None, partitions=4, column=None, hooks=None, fields=None):
+        """
+        按主键(或指定的有索引的列)范围分片，在线程池中使用独立的会话并行查询各分片并合并结果，适用于全量导出
+
+        指定排序(或存在默认排序)时各分片结果通过k路归并保持整体顺序，排序字段必须包含在序列化结果中；
+        使用外部会话/事务时在该会话中串行查询
+
+        :param filters: 过滤条件
+        :type filters: dict
+        :param orders: 排序
+        :type orders: list
+        :param partitions: 分片数量，即并行查询数量，不应超过连接池大小
+        :type partitions: int
+        :param column: 分片列名，默认为主键(联合主键时为第一个主键列)
+        :type column: str
+        :param hooks: 钩子函数列表，函数形式为func(query, filters)
+        :type hooks: list
+        :param fields: 投影字段列表，参见list
+        :type fields: list/bool
+        :returns: 记录列表
+        :rtype: list
+        :raises: ValidationError
+        """
+        orders = self.default_order if orders is None else orders
+        if partitions <= 1 or self._in_external_session():
+            return self.list(filters=filters, orders=orders, hooks=hooks, fields=fields)
+        if column is None:
+            column = self.primary_keys
+            if utils.is_list_type(column):
+                column = column[0]
+        entry = self._get_column_entry(self.orm_meta, column)
+        if entry is None or entry.expr_wrapper is not None:
+            raise exceptions.ValidationError(attribute=column, msg=_('field is not a column'))
+        sort_keys = []
+        for order in orders:
+            desc = order.startswith('-')
+            sort_keys.append((order.lstrip('+-'), desc))
+        with self.get_session() as session:
+            expressions = self._get_partition_expressions(session, entry.column, filters, hooks, partitions)
+            dialect = _real_session(session).get_bind(self.orm_meta).dialect
+        if not expressions:
+            return []
+
+        def _list_partition(expr):
+            resource = copy.copy(self)
+            partition_hooks = list(hooks or [])
+            if expr is not None:
+                partition_hooks.append(lambda query, filters: query.filter(expr))
+            return resource.list(filters=filters, orders=orders, hooks=partition_hooks, fields=fields)
+
+        executor = futures.ThreadPoolExecutor(max_workers=len(expressions))
+        try:
+            parts = list(executor.map(_list_partition, expressions))
+        finally:
+            executor.shutdown(wait=True)
+        if not sort_keys:
+            return list(itertools.chain.from_iterable(parts))
+        for part in parts:
+            if part:
+                for field, desc in sort_keys:
+                    if field not in part[0]:
+                        raise exceptions.ValidationError(
+                            attribute=field, msg=_('order field must be included in results to merge partitions'))
+                break
+        return _merge_sorted(parts, sort_keys, nulls_first=dialect.name != 'postgresql')
@@ -1,7 +1,52 @@
 from __future__ import absolute_import
 
+import datetime
+import decimal
+import uuid
+
 import six
-from sqlalchemy.orm import object_mapper
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+from sqlalchemy.orm import ColumnProperty
+from sqlalchemy.orm import RelationshipProperty
+from neptune.db import models
+
+# 生成的序列化函数缓存，(Model, 序列化级别, prefix, flat_dict) -> 函数，None表示使用通用序列化
+_SERIALIZERS = {}
+# 序列化级别 -> (属性列表名, 属性列表方法名, 关联对象的序列化方法名)
+_SERIALIZE_LEVELS = {
+    'list': ('attributes', 'list_columns', 'to_summary_dict'),
+    'detail': ('detail_attributes', 'get_columns', 'to_dict'),
+    'summary': ('summary_attributes', 'sum_columns', 'to_summary_dict'),
+}
+# 值不可能是容器或DictBase的列类型，序列化时直接取值
+_SCALAR_TYPES = (bool, float, str, bytes, datetime.datetime, datetime.date, datetime.time, datetime.timedelta,
+                 decimal.Decimal, uuid.UUID) + six.integer_types + six.string_types
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _reset_caches():
+    """Model映射发生变化时，清空生成的序列化函数，下次使用时重新生成"""
+    _SERIALIZERS.clear()
+
+
+@event.listens_for(object, 'attribute_instrument', propagate=True)
+def _attribute_instrumented(cls, key, inst):
+    """已完成配置的Model新增属性时不会触发after_configured，同样需要清空"""
+    _reset_caches()
+
+
+def _get_column_keys(cls):
+    """
+    获取Model类的列名，参见models.ModelInfo
+
+    :param cls: Model类
+    :type cls: class
+    :returns: 列名
+    :rtype: tuple
+    """
+    return models.get_model_info(cls).column_keys
 
 
 class ModelBase(six.Iterator):
@@ -38,14 +83,19 @@ class ModelBase(six.Iterator):
         """
         return []
 
-    def __iter__(self):
-        columns = list(dict(object_mapper(self).columns).keys())
+    def _column_keys(self):
+        """获取列名以及用户扩展属性名"""
+        columns = _get_column_keys(self.__class__)
         # NOTE(russellb): Allow models to specify other keys that can be looked
         # up, beyond the actual db columns.  An example would be the 'name'
         # property for an Instance.
-        columns.extend(self._extra_keys)
+        extra_keys = self._extra_keys
+        if extra_keys:
+            columns = columns + tuple(extra_keys)
+        return columns
 
-        return ModelIterator(self, iter(columns))
+    def __iter__(self):
+        return ModelIterator(self, iter(self._column_keys()))
 
     def update(self, values):
         """更新Model属性，模仿dict行为."""
@@ -57,10 +107,12 @@ class ModelBase(six.Iterator):
 
         Includes attributes from joins.
         """
-        local = dict((key, value) for key, value in self)
-        joined = dict([(k, v) for k, v in six.iteritems(self.__dict__)
-                       if not k[0] == '_'])
-        local.update(joined)
+        local = {}
+        for key in self._column_keys():
+            local[key] = getattr(self, key)
+        for key, value in six.iteritems(self.__dict__):
+            if not key[0] == '_':
+                local[key] = value
         return local
 
     def iteritems(self):
@@ -73,7 +125,169 @@ class ModelBase(six.Iterator):
 
     def keys(self):
         """模拟dict方法."""
-        return [key for key, value in self.iteritems()]
+        return list(self._as_dict())
+
+
+def _assign_value(model, data, key, value, method, flat_dict, prefix):
+    """
+    通用的属性值序列化，与DictBase.to_dict等方法中的逻辑一致，用于无法静态确定类型的属性
+
+    :param model: 被序列化的Model对象
+    :type model: `DictBase`
+    :param data: 序列化结果
+    :type data: dict
+    :param key: 结果中的key
+    :type key: str
+    :param value: 属性值
+    :type value: any
+    :param method: 关联对象的序列化方法名
+    :type method: str
+    :param flat_dict: 是否转换为扁平结构字典
+    :type flat_dict: bool
+    :param prefix: 已去除空白的前缀，无前缀时为None
+    :type prefix: str
+    """
+    if isinstance(value, DictBase):
+        value = getattr(value, method)(flat_dict=flat_dict)
+        if flat_dict:
+            data.update(model._convert_flat_dict(value, prefix=prefix))
+            return
+    if isinstance(value, (tuple, list, set)):
+        if value:
+            if isinstance(value[0], DictBase):
+                value = [getattr(v, method)(flat_dict=flat_dict) for v in value]
+        else:
+            value = []
+    data[key] = value
+
+
+def _is_scalar_column(prop):
+    """判断列属性的值是否一定是标量"""
+    if len(prop.columns) != 1:
+        return False
+    try:
+        return issubclass(prop.columns[0].type.python_type, _SCALAR_TYPES)
+    except (NotImplementedError, AttributeError):
+        return False
+
+
+def _is_plain_relationship(prop):
+    """判断relationship的值是否为单个对象或list集合，dynamic以及其他集合类型使用通用序列化逻辑"""
+    if not prop.uselist:
+        return True
+    if prop.lazy == 'dynamic':
+        return False
+    collection_class = prop.collection_class
+    return collection_class is None or (isinstance(collection_class, type) and issubclass(collection_class, list))
+
+
+def _build_serializer(cls, level, prefix, flat_dict):
+    """
+    为Model类生成指定序列化级别的序列化函数
+
+    属性列表、属性的取值方式以及哪些属性是relationship在生成时确定，序列化时不再逐行判断；
+    属性列表依赖实例状态时(重写了属性列表方法或_extra_keys，或detail级别未指定detail_attributes)返回None
+
+    :param cls: Model类
+    :type cls: class
+    :param level: 序列化级别，list/detail/summary
+    :type level: str
+    :param prefix: 前缀
+    :type prefix: string/None
+    :param flat_dict: 是否转换为扁平结构字典
+    :type flat_dict: bool
+    :returns: 序列化函数func(model)，返回字典
+    :rtype: function
+    """
+    attr_name, method_name, nested_method = _SERIALIZE_LEVELS[level]
+    if six.get_unbound_function(getattr(cls, method_name)) is not \
+            six.get_unbound_function(getattr(DictBase, method_name)):
+        return None
+    try:
+        mapper = sqlalchemy.inspect(cls)
+    except sqlalchemy.exc.NoInspectionAvailable:
+        return None
+    attributes = getattr(cls, attr_name)
+    if not attributes:
+        if level == 'detail' or cls._extra_keys is not DictBase._extra_keys:
+            return None
+        attributes = list(_get_column_keys(cls))
+    prefix = prefix.strip() if prefix and prefix.strip() else None
+    namespace = {'_getattr': getattr, '_assign_value': _assign_value, '_flat_dict': flat_dict,
+                 '_prefix': prefix, '_method': nested_method}
+    lines = ['def _serialize(obj):', '    _d = obj.__dict__']
+    # (结果key, 变量名)，变量名为None表示该项需要通过语句处理
+    items = []
+    statements = []
+    for idx, attr in enumerate(attributes):
+        var = 'v%d' % idx
+        key = (prefix or '') + attr
+        prop = mapper.attrs.get(attr) if attr in mapper.attrs else None
+        if isinstance(prop, (ColumnProperty, RelationshipProperty)):
+            # 已加载的属性直接从实例字典取值，与InstrumentedAttribute.__get__一致
+            lines.append('    %s = _d[%r] if %r in _d else _getattr(obj, %r)' % (var, attr, attr, attr))
+        else:
+            lines.append('    %s = _getattr(obj, %r)' % (var, attr))
+        if isinstance(prop, ColumnProperty) and _is_scalar_column(prop):
+            items.append((key, var))
+        elif isinstance(prop, RelationshipProperty) and issubclass(prop.mapper.class_, DictBase) and \
+                _is_plain_relationship(prop):
+            if prop.uselist:
+                lines.append('    %s = [x.%s(flat_dict=_flat_dict) for x in %s] if %s else []' % (
+                    var, nested_method, var, var))
+                items.append((key, var))
+            elif flat_dict:
+                items.append((key, None))
+                statements.append([
+                    '    if %s is not None:' % var,
+                    '        d.update(obj._convert_flat_dict(%s.%s(flat_dict=True), prefix=_prefix))' % (
+                        var, nested_method),
+                    '    else:',
+                    '        d[%r] = None' % key])
+            else:
+                lines.append('    %s = %s.%s(flat_dict=False) if %s is not None else None' % (
+                    var, var, nested_method, var))
+                items.append((key, var))
+        else:
+            items.append((key, None))
+            statements.append(['    _assign_value(obj, d, %r, %s, _method, _flat_dict, _prefix)' % (key, var)])
+    if not statements:
+        # 所有属性都直接赋值时使用字典字面量构造结果
+        lines.append('    return {%s}' % ', '.join('%r: %s' % (key, var) for key, var in items))
+    else:
+        lines.append('    d = {}')
+        statements = iter(statements)
+        for key, var in items:
+            if var is None:
+                lines.extend(next(statements))
+            else:
+                lines.append('    d[%r] = %s' % (key, var))
+        lines.append('    return d')
+    six.exec_('\n'.join(lines), namespace)
+    return namespace['_serialize']
+
+
+def _get_serializer(cls, level, prefix, flat_dict):
+    """
+    获取Model类指定序列化级别的序列化函数，首次使用时生成并缓存
+
+    :param cls: Model类
+    :type cls: class
+    :param level: 序列化级别，list/detail/summary
+    :type level: str
+    :param prefix: 前缀
+    :type prefix: string/None
+    :param flat_dict: 是否转换为扁平结构字典
+    :type flat_dict: bool
+    :returns: 序列化函数，无法生成时返回None
+    :rtype: function
+    """
+    key = (cls, level, prefix, flat_dict)
+    try:
+        return _SERIALIZERS[key]
+    except KeyError:
+        serializer = _SERIALIZERS[key] = _build_serializer(cls, level, prefix, flat_dict)
+        return serializer
 
 
 class ModelIterator(six.Iterator):
@@ -98,9 +312,21 @@ class DictBase(ModelBase):
     detail_attributes = []
     summary_attributes = []
 
+    def _get_serializer(self, level, prefix, flat_dict):
+        """
+        获取生成的序列化函数，实例上设置了该级别的属性列表或_extra_keys时返回None，使用通用序列化
+
+        :returns: 序列化函数，无法使用时返回None
+        :rtype: function
+        """
+        instance_dict = self.__dict__
+        if _SERIALIZE_LEVELS[level][0] in instance_dict or '_extra_keys' in instance_dict:
+            return None
+        return _get_serializer(self.__class__, level, prefix, flat_dict)
+
     def list_columns(self):
         """默认list级别的属性列表，自身作为主资源时的属性值，默认不带有relationship"""
-        return self.attributes or [key for key, value in self]
+        return self.attributes or list(self._column_keys())
 
     def get_columns(self):
         """默认get级别的详细属性列表，即自身作为主资源且尽量详细时的属性值，默认带有relationship"""
@@ -108,7 +334,7 @@ class DictBase(ModelBase):
 
     def sum_columns(self):
         """默认summary级别的属性列表，即被其他资源引用时能展示的属性值，默认不带有relationship"""
-        return self.summary_attributes or [key for key, value in self]
+        return self.summary_attributes or list(self._column_keys())
 
     def _convert_flat_dict(self, data, prefix=None, separator='.'):
         flat_data = {}
@@ -142,6 +368,9 @@ class DictBase(ModelBase):
         :returns: 字典，对应Model的列以及值
         :rtype: dict
         """
+        serializer = self._get_serializer('list', prefix, flat_dict)
+        if serializer is not None:
+            return serializer(self)
         d = {}
         for attr in self.list_columns():
             value = getattr(self, attr)
@@ -181,6 +410,9 @@ class DictBase(ModelBase):
         :returns: 字典，对应Model的列以及值
         :rtype: dict
         """
+        serializer = self._get_serializer('detail', prefix, flat_dict)
+        if serializer is not None:
+            return serializer(self)
         d = {}
         for attr in self.get_columns():
             value = getattr(self, attr)
@@ -220,6 +452,9 @@ class DictBase(ModelBase):
         :returns: 字典，对应Model的列以及值
         :rtype: dict
         """
+        serializer = self._get_serializer('summary', prefix, flat_dict)
+        if serializer is not None:
+            return serializer(self)
         d = {}
         for attr in self.sum_columns():
             value = getattr(self, attr)
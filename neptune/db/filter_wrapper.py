@@ -248,3 +248,76 @@ class FilterNumber(Filter):
     def op_iends(self, column, value):
         pass
 
+
+class FilterDateTime(FilterNumber):
+    """日期时间类型过滤"""
+    pass
+
+
+class FilterNetwork(FilterNumber):
+    """网络地址类型过滤"""
+    pass
+
+
+class FilterBool(Filter):
+    """布尔类型过滤"""
+
+    def op(self, column, value):
+        if utils.is_list_type(value):
+            return column.in_(tuple([utils.bool_from_string(v) for v in value]))
+        return column == utils.bool_from_string(value)
+
+    def op_in(self, column, value):
+        return self.op(column, value)
+
+    def op_nin(self, column, value):
+        if utils.is_list_type(value):
+            return column.notin_(tuple([utils.bool_from_string(v) for v in value]))
+        return column != utils.bool_from_string(value)
+
+    def op_eq(self, column, value):
+        return column == utils.bool_from_string(value)
+
+    def op_ne(self, column, value):
+        return column != utils.bool_from_string(value)
+
+    def op_lt(self, column, value):
+        pass
+
+    def op_lte(self, column, value):
+        pass
+
+    def op_gt(self, column, value):
+        pass
+
+    def op_gte(self, column, value):
+        pass
+
+    def op_like(self, column, value):
+        pass
+
+    def op_nlike(self, column, value):
+        pass
+
+    def op_starts(self, column, value):
+        pass
+
+    def op_ends(self, column, value):
+        pass
+
+    def op_ilike(self, column, value):
+        pass
+
+    def op_nilike(self, column, value):
+        pass
+
+    def op_istarts(self, column, value):
+        pass
+
+    def op_iends(self, column, value):
+        pass
+
+
+class FilterJSON(Filter):
+    """JSON类型过滤，行为与Filter相同，JSON子路径表达式的类型转换由Filter的比较操作通过cast完成"""
+    pass
@@ -1,17 +1,129 @@
 from __future__ import absolute_import
 
+import collections
+
+import sqlalchemy
+import sqlalchemy.orm.exc
+from sqlalchemy import event
+from sqlalchemy import UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Mapper
 
 
 Base = declarative_base()
 metadata = Base.metadata
 
+# Model目录，由mapper事件维护，仅包含Base的子类
+# 类名 -> Model类，类名重复时为最后定义的类
+_NAMES = {}
+# Model类 -> 类名
+_CLASSES = {}
+# 表名 -> Model类，单表继承时为定义该表的类
+_TABLENAMES = {}
+# Model类 -> ModelInfo，Model映射发生变化时清空，下次使用时重建，可用于任意映射类
+_MODEL_INFOS = {}
+# 索引信息，name: 索引名称，columns: 属性名列表，unique: 是否唯一
+IndexInfo = collections.namedtuple('IndexInfo', ['name', 'columns', 'unique'])
+
+
+@event.listens_for(Mapper, 'instrument_class')
+def _register_model(mapper, cls):
+    """Model类定义时登记类名以及表名"""
+    if not issubclass(cls, Base):
+        return
+    _NAMES[cls.__name__] = cls
+    _CLASSES[cls] = cls.__name__
+    tablename = getattr(cls, '__tablename__', None)
+    if tablename:
+        _TABLENAMES.setdefault(tablename, cls)
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _reset_model_infos():
+    """Model映射发生变化时，清空Model元数据，下次使用时重建"""
+    _MODEL_INFOS.clear()
+
+
+@event.listens_for(object, 'attribute_instrument', propagate=True)
+def _attribute_instrumented(cls, key, inst):
+    """已完成配置的Model新增属性(如declarative类赋值新列)时不会触发after_configured，同样需要清空"""
+    _reset_model_infos()
+
+
+class ModelInfo(object):
+    """Model的元数据，构建后只读"""
+
+    def __init__(self, model):
+        """
+        从mapper获取Model的元数据
+
+        :param model: Model类
+        :type model: class
+        """
+        mapper = sqlalchemy.inspect(model)
+        self.model = model
+        self.mapper = mapper
+        self.name = model.__name__
+        self.table = mapper.local_table
+        self.tablename = getattr(model, '__tablename__', None) or getattr(mapper.local_table, 'name', None)
+        # 主键属性名列表
+        self.primary_keys = [self._column_key(col) for col in mapper.primary_key]
+        # 列属性名 -> 列类型
+        self.columns = collections.OrderedDict((prop.key, prop.columns[0].type) for prop in mapper.column_attrs)
+        # 列名，与mapper.columns一致，用于DictBase
+        self.column_keys = tuple(mapper.columns.keys())
+        # relationship属性名 -> RelationshipProperty
+        self.relationships = collections.OrderedDict((prop.key, prop) for prop in mapper.relationships)
+        self.indexes = []
+        for table in mapper.tables:
+            for index in sorted(getattr(table, 'indexes', ()), key=lambda item: item.name or ''):
+                self.indexes.append(IndexInfo(index.name, [self._column_key(col) for col in index.columns],
+                                              bool(index.unique)))
+            for constraint in getattr(table, 'constraints', ()):
+                if isinstance(constraint, UniqueConstraint):
+                    self.indexes.append(IndexInfo(constraint.name,
+                                                  [self._column_key(col) for col in constraint.columns], True))
+        # 查询结果涉及的表名，包括序列化时可能引用的relationship表
+        tables = set()
+        mappers = [mapper]
+        visited = set()
+        while mappers:
+            item = mappers.pop()
+            if item in visited:
+                continue
+            visited.add(item)
+            tables.update(table.fullname for table in item.tables)
+            mappers.extend(prop.mapper for prop in item.relationships)
+        self.related_tables = sorted(tables)
+
+    def _column_key(self, column):
+        try:
+            return self.mapper.get_property_by_column(column).key
+        except sqlalchemy.orm.exc.UnmappedColumnError:
+            return column.key
+
+
+def get_model_info(model):
+    """
+    获取Model的元数据，每个Model只构建一次
+
+    :param model: Model类
+    :type model: class
+    :returns: Model元数据
+    :rtype: `ModelInfo`
+    """
+    info = _MODEL_INFOS.get(model)
+    if info is None:
+        info = ModelInfo(model)
+        _MODEL_INFOS[model] = info
+    return info
+
 
 def get_names():
     """
     获取所有Model类名
     """
-    return Base._decl_class_registry.keys()
+    return list(_NAMES.keys())
 
 
 def get_class_by_name(name):
@@ -23,7 +135,7 @@ def get_class_by_name(name):
     :returns: Model类
     :rtype: class
     """
-    return Base._decl_class_registry.get(name, None)
+    return _NAMES.get(name, None)
 
 
 def get_class_by_tablename(tablename):
@@ -35,9 +147,7 @@ def get_class_by_tablename(tablename):
     :returns: Model类
     :rtype: class
     """
-    for c in Base._decl_class_registry.values():
-        if hasattr(c, '__tablename__') and c.__tablename__ == tablename:
-            return c
+    return _TABLENAMES.get(tablename, None)
 
 
 def get_tablename_by_name(name):
@@ -46,10 +156,11 @@ def get_tablename_by_name(name):
 
     :param name: Model类名
     :type name: str
-    :returns: 表名
+    :returns: 表名，类不存在时返回None
     :rtype: str
     """
-    return Base._decl_class_registry.get(name, None).__tablename__
+    model = _NAMES.get(name, None)
+    return getattr(model, '__tablename__', None)
 
 
 def get_name_by_class(modelclass):
@@ -61,6 +172,4 @@ def get_name_by_class(modelclass):
     :returns: 类名
     :rtype: str
     """
-    for n, c in Base._decl_class_registry.items():
-        if c == modelclass:
-            return n
+    return _CLASSES.get(modelclass, None)
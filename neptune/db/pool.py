@@ -6,10 +6,90 @@
 
 from __future__ import absolute_import
 
+import collections
+import contextlib
+import itertools
+import logging
+import threading
+import time
+import zlib
+
+import six
 import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
 from neptune.core import decorators as deco
+from neptune.core import utils
+from neptune.db import slowlog
+from neptune.db import stats
+from neptune.db import warmup
+
+LOG = logging.getLogger(__name__)
+# 当前上下文中各连接池的工作单元会话，id(连接池) -> 会话对象，线程以及协程之间相互隔离
+_SCOPES = utils.ContextVar('neptune_db_scopes', default={})
+# session.info中标记是否为只读工作单元
+_SCOPE_READONLY_KEY = 'neptune.scope_readonly'
+
+
+class ReplicaNode(object):
+    """只读副本节点，记录连接使用数量以及连续失败次数"""
+
+    def __init__(self, name, engine, max_failures=3, eject_seconds=30):
+        """
+        初始化副本节点
+
+        :param name: 节点名称，用于日志
+        :type name: str
+        :param engine: 数据库引擎
+        :type engine: `Engine`
+        :param max_failures: 连续失败次数达到此值时剔除节点
+        :type max_failures: int
+        :param eject_seconds: 节点被剔除的时长(秒)，之后重新参与路由
+        :type eject_seconds: float
+        """
+        self.name = name
+        self.engine = engine
+        self.session_maker = sessionmaker(bind=engine, autocommit=True)
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.in_use = 0
+        self.failures = 0
+        self.ejected_until = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'handle_error', self._on_error)
+
+    @property
+    def available(self):
+        """节点是否可用"""
+        return self.ejected_until <= time.time()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.in_use += 1
+            self.failures = 0
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def _on_error(self, context):
+        # 仅连接类错误(断开、无法连接)计入失败，SQL错误与节点状态无关
+        if not (context.is_disconnect or context.connection is None or
+                isinstance(context.original_exception, sqlalchemy.exc.OperationalError)):
+            return
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self.failures = 0
+                self.ejected_until = time.time() + self.eject_seconds
+                LOG.warning('replica %s ejected for %ss: %s', self.name, self.eject_seconds,
+                            context.original_exception)
 
 
 class DBPool(object):
@@ -19,29 +99,61 @@ class DBPool(object):
         """初始化连接池
 
         :param params: 连接信息列表
-        {connection: xxx, [pool_size: xxx], [pool_recycle: xxx], [pool_timeout: xxx], [max_overflow: xxx]}
+        {connection: xxx, [pool_size: xxx], [pool_recycle: xxx], [pool_timeout: xxx], [max_overflow: xxx],
+         [replicas: [xxx]], [replica_strategy: xxx], [replica_max_failures: xxx], [replica_eject_seconds: xxx]}
         :type params: list
         :param connecter: 连接器，可选pymysql,psycopg2
         :type connecter: str
         :raises: None
         """
+        self._pool = None
+        self._replicas = []
+        self._replica_strategy = 'round_robin'
+        self._round_robin = itertools.count()
+        # 名称 -> EngineStats，主库名称为primary
+        self._stats = collections.OrderedDict()
+        self._maintainer = None
+        # 当前使用的所有引擎(主库、副本以及EXPLAIN引擎)，重建时释放
+        self._engines = []
         if param:
             self.reflesh(param=param)
 
-    def get_session(self):
+    def _select_replica(self):
+        """
+        选择一个可用的只读副本节点
+
+        :returns: 副本节点，无可用节点时返回None
+        :rtype: `ReplicaNode`
+        """
+        replicas = [replica for replica in self._replicas if replica.available]
+        if not replicas:
+            return None
+        if self._replica_strategy == 'least_busy':
+            return min(replicas, key=lambda replica: replica.in_use)
+        return replicas[next(self._round_robin) % len(replicas)]
+
+    def get_session(self, primary=False):
         """从连接池中获取一个会话对象
 
+        配置了只读副本时，默认按replica_strategy选择可用的副本，副本全部不可用时使用主库；
+        写操作请使用transaction()或指定primary=True
+
+        :param primary: 是否强制使用主库
+        :type primary: bool
         :returns: 会话对象
         :rtype: scoped_session
         :raises: ValueError
         """
         if self._pool:
+            replica = None if primary else self._select_replica()
+            if replica is not None:
+                return scoped_session(replica.session_maker)
             session = scoped_session(self._pool)
             return session
         raise ValueError('failed to get session')
 
     def transaction(self):
-        """从连接池中获取一个事务对象
+        """从连接池中获取一个事务对象，始终使用主库
 
         :returns: 会话对象
         :rtype: scoped_session
@@ -53,23 +165,371 @@ class DBPool(object):
             return session
         raise ValueError('failed to get session')
 
+    def current_session(self, write=False):
+        """
+        获取当前上下文中本连接池的工作单元会话
+
+        :param write: 是否用于写操作，只读工作单元不用于写操作
+        :type write: bool
+        :returns: 会话对象，不在scope()中时返回None
+        :rtype: `Session`
+        """
+        session = _SCOPES.get().get(id(self))
+        if session is not None and write and session.info.get(_SCOPE_READONLY_KEY):
+            return None
+        return session
+
+    @contextlib.contextmanager
+    def scope(self, readonly=False, transactional=False):
+        """
+        工作单元上下文，上下文中所有使用本连接池的ResourceBase共享同一个会话以及数据库连接，退出时统一释放
+
+        会话绑定到一个检出的连接上，上下文中的读写始终使用该连接(可读到本上下文已提交的写入)；
+        ResourceBase.transaction()在该连接上开启并提交事务，嵌套时加入已开启的事务；
+        上下文通过contextvars传递，每个线程/协程任务独立，在上下文中创建的协程任务会继承该会话，
+        会话非线程安全，并发任务请分别使用各自的scope；已在scope中时嵌套调用直接返回当前会话
+
+        eg.
+
+        with POOL.scope():
+
+            User().list(filters)
+
+            with Address().transaction() as session:
+
+                Address().create_many(rows)
+
+        :param readonly: 是否为只读上下文，只读上下文使用只读副本(未配置时使用主库)，其中的transaction()不使用本会话
+        :type readonly: bool
+        :param transactional: 是否在整个上下文中开启事务，正常退出时提交，异常时回滚，读取结果为一致的快照
+        :type transactional: bool
+        :returns: 会话对象
+        :rtype: `Session`
+        :raises: ValueError
+        """
+        session = self.current_session()
+        if session is not None:
+            yield session
+            return
+        if not self._pool:
+            raise ValueError('failed to get session')
+        replica = self._select_replica() if readonly else None
+        if replica is not None:
+            connection = replica.engine.connect()
+            session = replica.session_maker(bind=connection)
+        else:
+            connection = self._pool.kw['bind'].connect()
+            session = self._pool(bind=connection)
+        session.info[_SCOPE_READONLY_KEY] = readonly
+        scopes = dict(_SCOPES.get())
+        scopes[id(self)] = session
+        token = _SCOPES.set(scopes)
+        try:
+            if transactional:
+                session.begin()
+            yield session
+            if session.transaction is not None:
+                session.commit()
+        except Exception:
+            if session.transaction is not None:
+                session.rollback()
+            raise
+        finally:
+            _SCOPES.reset(token)
+            session.close()
+            connection.close()
+
+    def _stop_maintainer(self):
+        """停止最小空闲连接维护线程"""
+        if self._maintainer is not None:
+            self._maintainer.stop()
+            self._maintainer = None
+
+    def dispose(self):
+        """停止最小空闲连接维护线程并关闭连接池中的所有空闲连接，使用中的连接归还时关闭"""
+        self._stop_maintainer()
+        for engine in self._engines:
+            engine.dispose()
+
+    def _create_engine(self, param, instrument=True):
+        """
+        根据连接信息创建数据库引擎
+
+        :param param: 连接信息
+        :type param: dict
+        :param instrument: 是否使用记录等待时间的连接池(仅在默认连接池为QueuePool时替换)
+        :type instrument: bool
+        :returns: 数据库引擎
+        :rtype: `Engine`
+        """
+        param = dict(param)
+        echo = param.get('echo', 'DEBUG')
+        if utils.is_string_type(echo):
+            param['echo'] = echo.upper() == 'DEBUG'
+        connection = param.pop('connection')
+        if instrument and 'poolclass' not in param and 'pool' not in param and stats.instrumented_pool_supported():
+            url = make_url(connection)
+            if url.get_dialect().get_pool_class(url) is QueuePool:
+                param['poolclass'] = stats.InstrumentedQueuePool
+        return sqlalchemy.create_engine(connection, **param)
+
+    def _create_explain_engine(self, param, slow_query):
+        """
+        创建慢查询EXPLAIN使用的引擎，使用NullPool，连接池耗尽时EXPLAIN不会等待连接池
+
+        :param param: 连接信息
+        :type param: dict
+        :param slow_query: 慢查询日志配置
+        :type slow_query: dict
+        :returns: 数据库引擎，未启用EXPLAIN时返回None
+        :rtype: `Engine`
+        """
+        if not slow_query['explain']:
+            return None
+        param = dict((key, value) for key, value in param.items()
+                     if not key.startswith('pool') and key != 'max_overflow')
+        param['poolclass'] = NullPool
+        return self._create_engine(param, instrument=False)
+
+    def stats(self, statements=True):
+        """
+        获取连接池以及SQL执行统计快照
+
+        :param statements: 是否包含按语句统计的耗时直方图
+        :type statements: bool
+        :returns: {名称: 统计信息}，主库名称为primary，副本名称为其连接地址(不含密码)，参见EngineStats.snapshot
+        :rtype: dict
+        """
+        return collections.OrderedDict(
+            (name, engine_stats.snapshot(statements=statements)) for name, engine_stats in self._stats.items())
+
     def reflesh(self, param):
         """
         重建连接池
 
         :param params: 连接信息列表
-        {connection: xxx, [pool_size: xxx], [pool_recycle: xxx], [pool_timeout: xxx], [max_overflow: xxx]}
+        {connection: xxx, [pool_size: xxx], [pool_recycle: xxx], [pool_timeout: xxx], [max_overflow: xxx],
+         [replicas: [xxx]], [replica_strategy: xxx], [replica_max_failures: xxx], [replica_eject_seconds: xxx]}
+        replicas为只读副本列表，元素为连接字符串或连接信息(未指定的参数继承主库配置)，
+        replica_strategy可选round_robin(默认)、least_busy(使用中连接数最少)，
+        副本连续replica_max_failures(默认3)次连接失败后剔除replica_eject_seconds(默认30)秒，
+        stats为是否启用统计(默认True)，stats_callback为统计观测回调函数，参见stats.EngineStats，
+        slow_query_threshold为慢查询阈值(秒，默认None表示仅记录资源类指定了阈值的操作)，
+        slow_query_explain为是否附带EXPLAIN结果，slow_query_max_per_minute为每分钟最多记录数量，
+        slow_query_callback为慢查询记录回调函数，参见slowlog.SlowQueryLog，
+        pool_prewarm为重建时预先建立的连接数量，pool_min_idle为后台线程维护的最小空闲连接数量，
+        pool_maintain_interval为维护间隔(秒，默认30)，pool_ping_idle为空闲超过此时长(秒)的连接在检出时执行ping，
+        以上仅对QueuePool生效(pool_ping_idle除外)，主库以及副本分别生效，参见warmup
         :type params: list
         :param connector: 连接器，可选pymysql,psycopg2
         :type connector: str
         :returns: 是否重建成功
         :rtype: bool
         """
-        log_type = param.get("echo", "DEBUG").upper()
-        is_echo = True if log_type == "DEBUG" else False
-        param.setdefault('echo', is_echo)
-        connection = param.pop('connection')
-        self._pool = sessionmaker(bind=sqlalchemy.create_engine(connection, **param), autocommit=True)
+        param = dict(param)
+        replicas = param.pop('replicas', None) or []
+        strategy = param.pop('replica_strategy', 'round_robin')
+        max_failures = param.pop('replica_max_failures', 3)
+        eject_seconds = param.pop('replica_eject_seconds', 30)
+        enable_stats = param.pop('stats', True)
+        stats_callback = param.pop('stats_callback', None)
+        slow_query = {
+            'threshold': param.pop('slow_query_threshold', None),
+            'explain': param.pop('slow_query_explain', False),
+            'max_per_minute': param.pop('slow_query_max_per_minute', 30),
+            'callback': param.pop('slow_query_callback', None),
+        }
+        prewarm_count = param.pop('pool_prewarm', 0)
+        min_idle = param.pop('pool_min_idle', 0)
+        maintain_interval = param.pop('pool_maintain_interval', 30)
+        ping_idle = param.pop('pool_ping_idle', None)
+        engines = []
+        engine_stats = collections.OrderedDict()
+        engine = self._create_engine(param, instrument=enable_stats)
+        if enable_stats:
+            engine_stats['primary'] = stats.EngineStats(engine, 'primary', callback=stats_callback)
+        explain_engine = self._create_explain_engine(param, slow_query)
+        slowlog.SlowQueryLog(engine, explain_engine=explain_engine, **slow_query)
+        engines.append((engine, engine_stats.get('primary')))
+        all_engines = [engine, explain_engine]
+        nodes = []
+        for replica in replicas:
+            if utils.is_string_type(replica):
+                replica = {'connection': replica}
+            replica_param = dict(param)
+            replica_param.update(replica)
+            replica_engine = self._create_engine(replica_param, instrument=enable_stats)
+            # repr(url)隐藏了密码
+            name = repr(replica_engine.url)
+            nodes.append(ReplicaNode(name, replica_engine, max_failures=max_failures, eject_seconds=eject_seconds))
+            if enable_stats:
+                engine_stats[name] = stats.EngineStats(replica_engine, name, callback=stats_callback)
+            explain_engine = self._create_explain_engine(replica_param, slow_query)
+            slowlog.SlowQueryLog(replica_engine, explain_engine=explain_engine, **slow_query)
+            engines.append((replica_engine, engine_stats.get(name)))
+            all_engines.extend([replica_engine, explain_engine])
+        for item_engine, item_stats in engines:
+            if ping_idle is not None:
+                warmup.LivenessCheck(item_engine, ping_idle, engine_stats=item_stats)
+            warmup.prewarm(item_engine, prewarm_count, engine_stats=item_stats)
+        self._stop_maintainer()
+        if min_idle:
+            self._maintainer = warmup.IdleMaintainer(engines, min_idle, interval=maintain_interval)
+            self._maintainer.start()
+        self._pool = sessionmaker(bind=engine, autocommit=True)
+        self._replicas = nodes
+        self._replica_strategy = strategy
+        self._stats = engine_stats
+        # 释放被替换的引擎，否则预热以及维护的空闲连接直到垃圾回收才会关闭
+        old_engines, self._engines = self._engines, [item for item in all_engines if item is not None]
+        for old_engine in old_engines:
+            old_engine.dispose()
+        return True
+
+
+def hash_shard(value, names):
+    """
+    默认的分片函数，整数按取模分片，其他值按字符串的crc32取模分片
+
+    :param value: 分片键的值
+    :type value: any
+    :param names: 分片名称列表
+    :type names: list
+    :returns: 分片名称
+    :rtype: str
+    """
+    if isinstance(value, six.integer_types) and not isinstance(value, bool):
+        return names[value % len(names)]
+    return names[(zlib.crc32(six.text_type(value).encode('utf-8')) & 0xffffffff) % len(names)]
+
+
+class ShardedDBPool(object):
+    """
+    分片数据库连接池，每个分片为一个DBPool
+
+    ResourceBase声明_shard_key后，过滤条件指定了分片键(等于/IN)时list/count等操作只访问对应的分片，
+    否则在所有分片上并行查询并合并结果；事务只能在单个分片上执行，参见ResourceBase.shard
+    """
+
+    def __init__(self, param=None):
+        """初始化连接池
+
+        :param param: 连接信息，参见reflesh
+        :type param: dict
+        """
+        self._shards = collections.OrderedDict()
+        self._shard_func = hash_shard
+        if param:
+            self.reflesh(param=param)
+
+    @property
+    def shard_names(self):
+        """分片名称列表"""
+        return list(self._shards.keys())
+
+    def get_shard(self, value):
+        """
+        获取分片键的值所在的分片名称
+
+        :param value: 分片键的值
+        :type value: any
+        :returns: 分片名称
+        :rtype: str
+        :raises: ValueError
+        """
+        if not self._shards:
+            raise ValueError('no shard configured')
+        return self._shard_func(value, self.shard_names)
+
+    def get_shards(self, values=None):
+        """
+        获取分片键的值所在的分片名称列表
+
+        :param values: 分片键的值列表，None表示全部分片
+        :type values: list
+        :returns: 去重后的分片名称列表，按配置顺序
+        :rtype: list
+        """
+        if values is None:
+            return self.shard_names
+        names = set(self.get_shard(value) for value in values)
+        return [name for name in self._shards if name in names]
+
+    def get_pool(self, name):
+        """
+        获取分片的连接池
+
+        :param name: 分片名称
+        :type name: str
+        :returns: 连接池
+        :rtype: `DBPool`
+        :raises: ValueError
+        """
+        if name not in self._shards:
+            raise ValueError('unknown shard: %s' % name)
+        return self._shards[name]
+
+    def _stop_maintainer(self):
+        """停止各分片的最小空闲连接维护线程"""
+        for shard in self._shards.values():
+            shard._stop_maintainer()
+
+    def dispose(self):
+        """关闭各分片连接池，参见DBPool.dispose"""
+        for shard in self._shards.values():
+            shard.dispose()
+
+    def current_session(self, write=False):
+        """分片连接池没有工作单元会话，请使用各分片连接池的scope()"""
+        return None
+
+    def get_session(self, primary=False):
+        raise ValueError('failed to get session: shard is not specified')
+
+    def transaction(self):
+        raise ValueError('failed to get session: shard is not specified')
+
+    def stats(self, statements=True):
+        """
+        获取各分片的连接池以及SQL执行统计快照
+
+        :param statements: 是否包含按语句统计的耗时直方图
+        :type statements: bool
+        :returns: {分片名称: DBPool.stats()}
+        :rtype: dict
+        """
+        return collections.OrderedDict(
+            (name, shard.stats(statements=statements)) for name, shard in self._shards.items())
+
+    def reflesh(self, param):
+        """
+        重建连接池
+
+        :param param: 连接信息
+        {shards: {name: xxx}|[xxx], [shard_func: xxx], [pool_size: xxx], [pool_recycle: xxx], ...}
+        shards为分片，元素为连接字符串或DBPool连接信息(未指定的参数继承公共配置)，列表时分片名称为'0','1'...，
+        shard_func为分片函数func(value, names)，返回分片名称，默认为hash_shard，
+        其余参数为各分片的公共配置，参见DBPool.reflesh
+        :type param: dict
+        :returns: 是否重建成功
+        :rtype: bool
+        """
+        param = dict(param)
+        shards = param.pop('shards')
+        shard_func = param.pop('shard_func', None) or hash_shard
+        if not isinstance(shards, dict):
+            shards = collections.OrderedDict((str(idx), shard) for idx, shard in enumerate(shards))
+        pools = collections.OrderedDict()
+        for name, shard in shards.items():
+            if utils.is_string_type(shard):
+                shard = {'connection': shard}
+            shard_param = dict(param)
+            shard_param.update(shard)
+            pools[name] = DBPool(shard_param)
+        old_pools, self._shards = self._shards, pools
+        self._shard_func = shard_func
+        for old_pool in old_pools.values():
+            old_pool.dispose()
         return True
 
 
@@ -82,3 +542,106 @@ class DefaultDBPool(DBPool):
 
 
 POOL = DefaultDBPool()
+
+
+class PoolRegistry(object):
+    """
+    命名数据库连接池注册表，名称default对应默认连接池POOL
+
+    配置时在锁内构建新的名称映射后整体替换，读取时不加锁
+
+    eg.
+
+    REGISTRY.configure({
+        'default': {'connection': 'mysql+pymysql://...'},
+        'report': {'connection': 'mysql+pymysql://...', 'replicas': [...]},
+        'tenant': {'shards': ['mysql+pymysql://...', 'mysql+pymysql://...']},
+    })
+
+    class Report(ResourceBase):
+        orm_meta = models.Report
+        _dbpool_name = 'report'
+    """
+
+    def __init__(self, default=None):
+        """
+        初始化注册表
+
+        :param default: 默认连接池
+        :type default: `DBPool`
+        """
+        self._lock = threading.Lock()
+        self._pools = {'default': default} if default is not None else {}
+
+    def get(self, name):
+        """
+        获取命名连接池
+
+        :param name: 连接池名称
+        :type name: str
+        :returns: 连接池
+        :rtype: `DBPool`/`ShardedDBPool`
+        :raises: ValueError
+        """
+        try:
+            return self._pools[name]
+        except KeyError:
+            raise ValueError('unknown dbpool: %s' % name)
+
+    def names(self):
+        """已注册的连接池名称列表"""
+        return sorted(self._pools)
+
+    def register(self, name, dbpool):
+        """
+        注册连接池，同名的连接池将被替换
+
+        :param name: 连接池名称
+        :type name: str
+        :param dbpool: 连接池
+        :type dbpool: `DBPool`/`ShardedDBPool`
+        """
+        with self._lock:
+            pools = dict(self._pools)
+            current = pools.get(name)
+            if current is not None and current is not dbpool:
+                current._stop_maintainer()
+            pools[name] = dbpool
+            self._pools = pools
+
+    def configure(self, config):
+        """
+        根据配置创建或重建命名连接池，已存在的同类型连接池原地重建(保持对象不变)
+
+        :param config: {名称: 连接信息}，连接信息包含shards时创建ShardedDBPool，否则创建DBPool，
+                       参见DBPool.reflesh、ShardedDBPool.reflesh
+        :type config: dict
+        """
+        with self._lock:
+            pools = dict(self._pools)
+            for name, param in config.items():
+                pool_class = ShardedDBPool if 'shards' in param else DBPool
+                current = pools.get(name)
+                if current is not None and isinstance(current, pool_class):
+                    current.reflesh(param)
+                else:
+                    if current is not None:
+                        current._stop_maintainer()
+                    pools[name] = pool_class(param)
+            self._pools = pools
+
+
+REGISTRY = PoolRegistry(default=POOL)
+
+
+def get_pool(name):
+    """
+    获取命名连接池，参见PoolRegistry.get
+
+    :param name: 连接池名称
+    :type name: str
+    :returns: 连接池
+    :rtype: `DBPool`/`ShardedDBPool`
+    :raises: ValueError
+    """
+    return REGISTRY.get(name)
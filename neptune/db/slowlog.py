@@ -0,0 +1,242 @@
+# coding=utf-8
+"""
+本模块提供慢查询日志
+
+SQL执行耗时超过阈值时，记录SQL、绑定参数(敏感字段脱敏)、耗时、影响行数，以及发起查询的资源类、方法和过滤条件，
+可选附带EXPLAIN结果；记录按速率限制，避免数据库过载时日志以及EXPLAIN进一步放大负载
+"""
+
+from __future__ import absolute_import
+
+import contextlib
+import logging
+import re
+import threading
+import time
+
+import six
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from neptune.core import utils
+
+LOG = logging.getLogger(__name__)
+# 当前正在执行的资源操作
+_OPERATION = utils.ContextVar('neptune_slow_query_operation', default=None)
+# connection.info中记录语句开始执行时间
+_STARTED_AT_KEY = 'neptune.slow_query_started_at'
+# 执行EXPLAIN的连接使用此执行选项，避免被再次记录
+_SKIP_OPTION = 'neptune_slow_query_skip'
+# 参数名或过滤字段名匹配时脱敏
+DEFAULT_REDACT_PATTERN = re.compile(r'passw|secret|token|salt|credential|api_?key', re.IGNORECASE)
+# 超过此长度的字符串参数被截断
+MAX_VALUE_LENGTH = 128
+# 超过此数量的列表参数被截断
+MAX_LIST_LENGTH = 20
+# EXPLAIN语句前缀
+_EXPLAIN_PREFIXES = {
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+@contextlib.contextmanager
+def operation(resource, method, filters=None, threshold=None):
+    """
+    标记当前正在执行的资源操作，慢查询日志中记录该信息
+
+    :param resource: 资源对象或名称
+    :type resource: any
+    :param method: 方法名
+    :type method: str
+    :param filters: 过滤条件
+    :type filters: dict
+    :param threshold: 本操作的慢查询阈值(秒)，None表示使用连接池的配置
+    :type threshold: float
+    """
+    if not utils.is_string_type(resource):
+        resource = resource.__class__.__name__
+    token = _OPERATION.set({'resource': resource, 'method': method, 'filters': filters, 'threshold': threshold})
+    try:
+        yield
+    finally:
+        _OPERATION.reset(token)
+
+
+def redact(value, name=None, pattern=DEFAULT_REDACT_PATTERN):
+    """
+    对参数值脱敏以及截断
+
+    :param value: 参数值
+    :type value: any
+    :param name: 参数名或字段名
+    :type name: str
+    :param pattern: 敏感名称的正则
+    :type pattern: `re.Pattern`
+    :returns: 处理后的值
+    :rtype: any
+    """
+    if name is not None and utils.is_string_type(name) and pattern.search(name):
+        return '***'
+    if isinstance(value, dict):
+        return dict((key, redact(item, key, pattern)) for key, item in value.items())
+    if utils.is_list_type(value):
+        items = [redact(item, name, pattern) for item in list(value)[:MAX_LIST_LENGTH]]
+        if len(value) > MAX_LIST_LENGTH:
+            items.append('...(%d items)' % len(value))
+        return items
+    if isinstance(value, six.binary_type):
+        return '<%d bytes>' % len(value)
+    if isinstance(value, six.string_types) and len(value) > MAX_VALUE_LENGTH:
+        return value[:MAX_VALUE_LENGTH] + '...'
+    return value
+
+
+class RateLimiter(object):
+    """令牌桶速率限制，线程安全"""
+
+    def __init__(self, rate, per=60.0):
+        """
+        :param rate: 每个周期允许的次数
+        :type rate: int
+        :param per: 周期(秒)
+        :type per: float
+        """
+        self.rate = rate
+        self.per = per
+        self._allowance = float(rate)
+        self._last = time.time()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def acquire(self):
+        """
+        尝试获取一次许可
+
+        :returns: (是否允许, 上次允许后被抑制的次数)
+        :rtype: tuple
+        """
+        with self._lock:
+            now = time.time()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate / self.per)
+            self._last = now
+            if self._allowance < 1:
+                self.suppressed += 1
+                return False, 0
+            self._allowance -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+
+class SlowQueryLog(object):
+    """单个数据库引擎的慢查询日志"""
+
+    def __init__(self, engine, threshold=None, explain=False, max_per_minute=30, callback=None,
+                 redact_pattern=DEFAULT_REDACT_PATTERN, explain_engine=None):
+        """
+        初始化并注册引擎事件
+
+        :param engine: 数据库引擎
+        :type engine: `Engine`
+        :param threshold: 慢查询阈值(秒)，None表示仅记录资源类指定了阈值的操作
+        :type threshold: float
+        :param explain: 是否对慢SELECT语句执行EXPLAIN
+        :type explain: bool
+        :param max_per_minute: 每分钟最多记录的慢查询数量
+        :type max_per_minute: int
+        :param callback: 记录回调函数func(record)，默认写入日志
+        :type callback: callable
+        :param redact_pattern: 敏感参数名的正则
+        :type redact_pattern: `re.Pattern`
+        :param explain_engine: 执行EXPLAIN使用的引擎，应使用NullPool，EXPLAIN不占用engine的连接池，
+                               连接池耗尽时也不会阻塞慢查询所在的请求；默认按engine的连接地址创建
+        :type explain_engine: `Engine`
+        """
+        self.engine = engine
+        self.threshold = threshold
+        self.explain = explain
+        self.callback = callback
+        self.redact_pattern = redact_pattern
+        self.limiter = RateLimiter(max_per_minute)
+        if explain and explain_engine is None:
+            explain_engine = sqlalchemy.create_engine(engine.url, poolclass=NullPool)
+        self.explain_engine = explain_engine
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_STARTED_AT_KEY, []).append(time.time())
+
+    def _on_error(self, context):
+        if context.connection is not None:
+            started = context.connection.info.get(_STARTED_AT_KEY)
+            if started:
+                started.pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get(_STARTED_AT_KEY)
+        if not started:
+            return
+        elapsed = time.time() - started.pop()
+        current = _OPERATION.get()
+        threshold = self.threshold
+        if current is not None and current['threshold'] is not None:
+            threshold = current['threshold']
+        if threshold is None or elapsed < threshold:
+            return
+        if conn.get_execution_options().get(_SKIP_OPTION):
+            return
+        allowed, suppressed = self.limiter.acquire()
+        if not allowed:
+            return
+        record = {
+            'duration': elapsed,
+            'statement': statement,
+            'parameters': self._redact_parameters(parameters, context),
+            'rowcount': getattr(cursor, 'rowcount', None),
+            'resource': current['resource'] if current else None,
+            'method': current['method'] if current else None,
+            'filters': redact(current['filters'], pattern=self.redact_pattern) if current else None,
+            'suppressed': suppressed,
+        }
+        if self.explain and not executemany:
+            record['explain'] = self._explain(statement, parameters)
+        if self.callback is not None:
+            self.callback(record)
+        else:
+            LOG.warning('slow query: %(duration).3fs resource=%(resource)s.%(method)s filters=%(filters)s '
+                        'rowcount=%(rowcount)s suppressed=%(suppressed)s sql=%(statement)s '
+                        'parameters=%(parameters)s explain=%(explain)s', dict(record, explain=record.get('explain')))
+
+    def _redact_parameters(self, parameters, context):
+        """按参数名脱敏绑定参数，位置参数通过编译信息获取参数名"""
+        if isinstance(parameters, dict):
+            return redact(parameters, pattern=self.redact_pattern)
+        names = None
+        compiled = getattr(context, 'compiled', None)
+        if compiled is not None and getattr(compiled, 'positiontup', None):
+            names = compiled.positiontup
+        if utils.is_list_type(parameters) and names and len(names) == len(parameters):
+            return [redact(value, name, self.redact_pattern) for name, value in zip(names, parameters)]
+        return redact(parameters, pattern=self.redact_pattern)
+
+    def _explain(self, statement, parameters):
+        """
+        使用explain_engine新建的连接对SELECT语句执行EXPLAIN
+
+        :returns: EXPLAIN结果行，不支持或失败时返回None
+        :rtype: list
+        """
+        prefix = _EXPLAIN_PREFIXES.get(self.engine.dialect.name)
+        if prefix is None or not statement.lstrip()[:6].upper() == 'SELECT':
+            return None
+        try:
+            with self.explain_engine.connect() as conn:
+                conn = conn.execution_options(**{_SKIP_OPTION: True})
+                result = conn.execute(prefix + statement, parameters)
+                return [tuple(row) for row in result]
+        except Exception as e:
+            LOG.debug('failed to explain slow query: %s', e)
+            return None
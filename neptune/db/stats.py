@@ -0,0 +1,330 @@
+# coding=utf-8
+"""
+本模块提供数据库连接池以及SQL执行的统计信息
+
+通过连接池事件以及连接事件采集，DBPool创建的引擎默认启用，可通过DBPool.stats()获取快照
+"""
+
+from __future__ import absolute_import
+
+import bisect
+import collections
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# 默认的耗时直方图区间上限(秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 按语句统计时最多记录的语句数量，超出的语句计入OTHER_STATEMENT
+MAX_STATEMENTS = 200
+OTHER_STATEMENT = '<other>'
+# connection_record.info中记录连接建立时间
+_CONNECTED_AT_KEY = 'neptune.connected_at'
+# connection.info中记录语句开始执行时间
+_STARTED_AT_KEY = 'neptune.started_at'
+
+
+class Histogram(object):
+    """固定区间的耗时直方图，非线程安全，由调用方加锁"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        初始化直方图
+
+        :param buckets: 递增的区间上限列表
+        :type buckets: tuple
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        记录一个观测值
+
+        :param value: 观测值
+        :type value: float
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        估算分位值，返回分位点所在区间的上限，落在最后一个区间时返回最大值
+
+        :param q: 分位，0~1
+        :type q: float
+        :returns: 分位值，无观测值时返回None
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for idx, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count:
+                return self.buckets[idx] if idx < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        """
+        获取直方图快照
+
+        :returns: {'count', 'sum', 'max', 'p50', 'p95', 'p99', 'buckets': [(区间上限, 累计数量)]}
+        :rtype: dict
+        """
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    记录获取连接等待时间的QueuePool，等待时间包括池满时的排队时间以及新建连接的时间
+
+    依赖Pool._do_get(SQLAlchemy 1.3/1.4)，不存在时不使用本类，参见instrumented_pool_supported
+    """
+
+    stats = None
+
+    def _do_get(self):
+        started = time.time()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.observe_wait(time.time() - started)
+
+    def recreate(self):
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def instrumented_pool_supported():
+    """
+    当前SQLAlchemy版本是否支持InstrumentedQueuePool
+
+    :returns: QueuePool是否实现了_do_get
+    :rtype: bool
+    """
+    return callable(getattr(QueuePool, '_do_get', None))
+
+
+class EngineStats(object):
+    """单个数据库引擎的连接池以及SQL执行统计"""
+
+    def __init__(self, engine, name, callback=None, buckets=DEFAULT_BUCKETS):
+        """
+        初始化统计并注册引擎事件
+
+        :param engine: 数据库引擎
+        :type engine: `Engine`
+        :param name: 名称
+        :type name: str
+        :param callback: 观测回调函数func(metric, value, labels)，metric为checkout_wait/statement/warmup，
+                         value为耗时(秒)，labels为{'pool': 名称[, 'statement': SQL]}
+        :type callback: callable
+        :param buckets: 直方图区间上限
+        :type buckets: tuple
+        """
+        self.engine = engine
+        self.name = name
+        self.callback = callback
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.errors = 0
+        self.in_use = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.warmup_connections = 0
+        self.warmup_elapsed = None
+        self.maintained = 0
+        self.wait = Histogram(buckets)
+        self.statements = collections.OrderedDict()
+        self.all_statements = Histogram(buckets)
+        # 当前存在的连接，connection_record -> 建立时间
+        self._connections = {}
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.stats = self
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'close', self._on_close)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def _emit(self, metric, value, labels):
+        if self.callback is not None:
+            self.callback(metric, value, labels)
+
+    def observe_wait(self, elapsed):
+        """
+        记录获取连接的等待时间
+
+        :param elapsed: 等待时间(秒)
+        :type elapsed: float
+        """
+        with self._lock:
+            self.wait.observe(elapsed)
+        self._emit('checkout_wait', elapsed, {'pool': self.name})
+
+    def observe_ping(self, alive):
+        """
+        记录一次连接存活检查
+
+        :param alive: 连接是否存活
+        :type alive: bool
+        """
+        with self._lock:
+            self.pings += 1
+            if not alive:
+                self.ping_failures += 1
+
+    def observe_warmup(self, connections, elapsed):
+        """
+        记录连接池预热
+
+        :param connections: 预热建立的连接数量
+        :type connections: int
+        :param elapsed: 预热耗时(秒)
+        :type elapsed: float
+        """
+        with self._lock:
+            self.warmup_connections = connections
+            self.warmup_elapsed = elapsed
+        self._emit('warmup', elapsed, {'pool': self.name})
+
+    def observe_maintain(self, connections):
+        """
+        记录最小空闲连接维护新建的连接
+
+        :param connections: 新建的连接数量
+        :type connections: int
+        """
+        with self._lock:
+            self.maintained += connections
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        now = time.time()
+        connection_record.info[_CONNECTED_AT_KEY] = now
+        with self._lock:
+            self.connects += 1
+            self._connections[connection_record] = now
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(self.in_use - 1, 0)
+
+    def _on_close(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.closes += 1
+            self._connections.pop(connection_record, None)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+            self._connections.pop(connection_record, None)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_STARTED_AT_KEY, []).append(time.time())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get(_STARTED_AT_KEY)
+        if not started:
+            return
+        elapsed = time.time() - started.pop()
+        with self._lock:
+            self.all_statements.observe(elapsed)
+            histogram = self.statements.get(statement)
+            if histogram is None:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    statement = OTHER_STATEMENT
+                histogram = self.statements.get(statement)
+                if histogram is None:
+                    histogram = self.statements[statement] = Histogram(self._buckets)
+            histogram.observe(elapsed)
+        self._emit('statement', elapsed, {'pool': self.name, 'statement': statement})
+
+    def _on_error(self, context):
+        with self._lock:
+            self.errors += 1
+        if context.connection is not None:
+            started = context.connection.info.get(_STARTED_AT_KEY)
+            if started:
+                started.pop()
+
+    def snapshot(self, statements=True):
+        """
+        获取统计快照
+
+        :param statements: 是否包含按语句统计的直方图
+        :type statements: bool
+        :returns: 统计信息，QueuePool时包含pool_size、idle、overflow
+        :rtype: dict
+        """
+        pool = self.engine.pool
+        now = time.time()
+        with self._lock:
+            ages = [now - connected_at for connected_at in self._connections.values()]
+            data = {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'closes': self.closes,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                'in_use': self.in_use,
+                'pings': self.pings,
+                'ping_failures': self.ping_failures,
+                'warmup': {'connections': self.warmup_connections, 'elapsed': self.warmup_elapsed},
+                'maintained': self.maintained,
+                'connections': len(ages),
+                'connection_age': {
+                    'min': min(ages) if ages else None,
+                    'max': max(ages) if ages else None,
+                    'avg': sum(ages) / len(ages) if ages else None,
+                },
+                'checkout_wait': self.wait.snapshot(),
+                'execute': self.all_statements.snapshot(),
+            }
+            if statements:
+                data['statements'] = dict((sql, histogram.snapshot()) for sql, histogram in self.statements.items())
+        if isinstance(pool, QueuePool):
+            data['pool_size'] = pool.size()
+            data['in_use'] = pool.checkedout()
+            data['idle'] = pool.checkedin()
+            data['overflow'] = max(pool.overflow(), 0)
+        return data
@@ -0,0 +1,214 @@
+# coding=utf-8
+"""
+本模块提供连接池预热、最小空闲连接维护以及按空闲时长的连接存活检查
+
+pool_pre_ping在每次检出连接时都执行一次ping，本模块仅对空闲超过阈值的连接执行ping；
+预热以及最小空闲连接维护仅对QueuePool生效，新建的连接数量不超过pool_size
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+import sqlalchemy.exc
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+LOG = logging.getLogger(__name__)
+# connection_record.info中记录连接开始空闲的时间
+_IDLE_SINCE_KEY = 'neptune.idle_since'
+# 直接新建空闲连接使用的QueuePool内部方法(SQLAlchemy 1.3/1.4)，不存在时退化为检出再归还连接
+_POOL_INTERNALS = ('_inc_overflow', '_dec_overflow', '_create_connection', '_do_return_conn')
+
+
+def _missing_connections(pool, idle):
+    """
+    计算需要新建的连接数量，使空闲连接数达到idle且总连接数不超过pool_size
+
+    :param pool: 连接池
+    :type pool: `QueuePool`
+    :param idle: 期望的空闲连接数量
+    :type idle: int
+    :returns: 需要新建的连接数量
+    :rtype: int
+    """
+    # overflow()从-pool_size开始计数，小于0时表示还可以新建的连接数量
+    return max(min(idle - pool.checkedin(), -pool.overflow()), 0)
+
+
+def _open_connections(pool, count):
+    """
+    新建count个连接并直接放入空闲队列，不检出已有的空闲连接，期间请求线程仍可正常获取空闲连接
+
+    QueuePool没有新建空闲连接的公开接口，此处与QueuePool._do_get相同，先占用连接数量再新建连接；
+    当前SQLAlchemy版本没有这些内部方法时使用_checkout_connections
+
+    :returns: 实际新建的连接数量
+    :rtype: int
+    """
+    if not all(hasattr(pool, name) for name in _POOL_INTERNALS):
+        return _checkout_connections(pool, count)
+    opened = 0
+    for _i in range(count):
+        if not pool._inc_overflow():
+            break
+        try:
+            record = pool._create_connection()
+        except Exception:
+            pool._dec_overflow()
+            raise
+        # 队列已满时(并发归还)连接被关闭并释放占用的数量
+        pool._do_return_conn(record)
+        opened += 1
+    return opened
+
+
+def _checkout_connections(pool, count):
+    """
+    通过公开接口新建count个空闲连接：同时检出已有的空闲连接以及count个新连接后一并归还，
+    期间已有的空闲连接被占用，请求线程可能需要等待或新建连接
+
+    :returns: 实际新建的连接数量
+    :rtype: int
+    """
+    connections = []
+    try:
+        for _i in range(pool.checkedin() + count):
+            connections.append(pool.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+    return count
+
+
+def prewarm(engine, count, engine_stats=None):
+    """
+    预先建立连接，避免重建连接池后的首批请求承担建立连接以及认证的耗时
+
+    :param engine: 数据库引擎
+    :type engine: `Engine`
+    :param count: 预先建立的连接数量，不超过pool_size
+    :type count: int
+    :param engine_stats: 统计对象，记录预热耗时
+    :type engine_stats: `EngineStats`
+    :returns: 实际新建的连接数量
+    :rtype: int
+    """
+    pool = engine.pool
+    if not count or not isinstance(pool, QueuePool):
+        return 0
+    started = time.time()
+    opened = _open_connections(pool, _missing_connections(pool, count))
+    elapsed = time.time() - started
+    if engine_stats is not None:
+        engine_stats.observe_warmup(opened, elapsed)
+    LOG.info('prewarmed %d connections for %r in %.3fs', opened, engine.url, elapsed)
+    return opened
+
+
+class LivenessCheck(object):
+    """检出连接时，仅对空闲时间超过阈值的连接执行ping，ping失败时由连接池重新建立连接"""
+
+    def __init__(self, engine, idle_threshold, engine_stats=None):
+        """
+        初始化并注册连接池事件
+
+        :param engine: 数据库引擎
+        :type engine: `Engine`
+        :param idle_threshold: 空闲时长阈值(秒)
+        :type idle_threshold: float
+        :param engine_stats: 统计对象，记录ping次数以及失败次数
+        :type engine_stats: `EngineStats`
+        """
+        self.engine = engine
+        self.idle_threshold = idle_threshold
+        self.engine_stats = engine_stats
+        event.listen(engine, 'connect', self._mark_idle)
+        event.listen(engine, 'checkin', self._mark_idle)
+        event.listen(engine, 'checkout', self._on_checkout)
+
+    def _mark_idle(self, dbapi_connection, connection_record):
+        if connection_record is not None:
+            connection_record.info[_IDLE_SINCE_KEY] = time.time()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        idle_since = connection_record.info.get(_IDLE_SINCE_KEY)
+        if idle_since is None or time.time() - idle_since < self.idle_threshold:
+            return
+        try:
+            alive = self.engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            LOG.debug('failed to ping connection: %s', e)
+            alive = False
+        if self.engine_stats is not None:
+            self.engine_stats.observe_ping(alive)
+        if not alive:
+            # 连接池捕获DisconnectionError后丢弃该连接并重新建立
+            raise sqlalchemy.exc.DisconnectionError('connection idle for %.1fs failed liveness check' %
+                                                    (time.time() - idle_since))
+
+
+class IdleMaintainer(object):
+    """后台线程，定期为连接池补充空闲连接，使空闲连接数不低于min_idle"""
+
+    def __init__(self, engines, min_idle, interval=30):
+        """
+        初始化维护线程，调用start()启动
+
+        :param engines: [(数据库引擎, 统计对象或None)]
+        :type engines: list
+        :param min_idle: 最小空闲连接数量
+        :type min_idle: int
+        :param interval: 检查间隔(秒)
+        :type interval: float
+        """
+        self.engines = list(engines)
+        self.min_idle = min_idle
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def maintain(self):
+        """
+        检查一次并补充空闲连接
+
+        :returns: 新建的连接数量
+        :rtype: int
+        """
+        total = 0
+        for engine, engine_stats in self.engines:
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            missing = _missing_connections(pool, self.min_idle)
+            if not missing:
+                continue
+            try:
+                opened = _open_connections(pool, missing)
+            except Exception as e:
+                LOG.warning('failed to open idle connections for %r: %s', engine.url, e)
+                continue
+            if engine_stats is not None:
+                engine_stats.observe_maintain(opened)
+            total += opened
+        return total
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                LOG.exception(e)
+
+    def start(self):
+        """启动维护线程"""
+        self._thread = threading.Thread(target=self._run, name='neptune-pool-maintainer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """停止维护线程，并释放对引擎的引用"""
+        self._stopped.set()
+        self.engines = []
@@ -0,0 +1,83 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import sqlalchemy
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.core import exceptions
+from neptune.db.dictbase import DictBase
+
+try:
+    import aiosqlite  # noqa
+except ImportError:
+    aiosqlite = None
+
+SUPPORTED = tuple(int(x) for x in sqlalchemy.__version__.split('.')[:2]) >= (1, 4) and aiosqlite is not None
+
+Base = declarative_base()
+
+
+class Member(Base, DictBase):
+    __tablename__ = 'aio_member'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    removed = Column(Integer)
+
+
+@unittest.skipUnless(SUPPORTED, 'asyncio support requires SQLAlchemy>=1.4 and aiosqlite')
+class AsyncResourceTest(unittest.IsolatedAsyncioTestCase if SUPPORTED else unittest.TestCase):
+
+    def setUp(self):
+        from neptune.db import aio
+
+        self.tempdir = tempfile.mkdtemp()
+        path = os.path.join(self.tempdir, 'aio.db')
+        engine = create_engine('sqlite:///' + path)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        aio.REGISTRY.configure({'aio_test': {'connection': 'sqlite+aiosqlite:///' + path, 'echo': False}})
+
+        class MemberResource(aio.AsyncResourceBase):
+            orm_meta = Member
+            _default_filter = {'removed': None}
+            _default_order = ['id']
+            _dbpool_name = 'aio_test'
+
+        self.resource = MemberResource()
+
+    async def asyncTearDown(self):
+        from neptune.db import aio
+
+        await aio.get_pool('aio_test').dispose()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    async def test_crud(self):
+        from neptune.db import aio
+
+        self.assertIs(self.resource._pool, aio.get_pool('aio_test'))
+        await self.resource.create_many([{'id': i, 'name': 'm%d' % i} for i in range(1, 4)])
+        self.assertEqual(await self.resource.count(), 3)
+        await self.resource.delete_by_filter({'id': 1})
+        rows = await self.resource.list()
+        self.assertEqual([row['id'] for row in rows], [2, 3])
+        await self.resource.update_by_filter({'id': 2}, {'name': 'x'})
+        self.assertEqual((await self.resource.get(2))['name'], 'x')
+
+    async def test_unsupported(self):
+        for method in ('list_parallel', 'shard', '_execute_by_filter', 'iter_batches', 'list_columnar'):
+            with self.assertRaises(exceptions.CriticalError):
+                getattr(self.resource, method)({})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+import uuid
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
+
+from neptune.core import exceptions
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class GUID(TypeDecorator):
+    impl = String(36)
+
+    @property
+    def python_type(self):
+        return uuid.UUID
+
+    def process_bind_param(self, value, dialect):
+        return str(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return uuid.UUID(value) if value is not None else None
+
+
+class Ticket(Base, DictBase):
+    __tablename__ = 'cursor_ticket'
+
+    id = Column(Integer, primary_key=True)
+    priority = Column(Integer, nullable=False)
+    owner = Column(String(32))
+    token = Column(GUID)
+
+
+class TicketResource(crud.ResourceBase):
+    orm_meta = Ticket
+    _default_order = ['id']
+
+
+ROWS = [
+    {'id': 1, 'priority': 2, 'owner': 'bob', 'token': str(uuid.UUID(int=5))},
+    {'id': 2, 'priority': 1, 'owner': None, 'token': str(uuid.UUID(int=3))},
+    {'id': 3, 'priority': 2, 'owner': 'alice', 'token': str(uuid.UUID(int=9))},
+    {'id': 4, 'priority': 2, 'owner': None, 'token': str(uuid.UUID(int=1))},
+    {'id': 5, 'priority': 1, 'owner': 'bob', 'token': str(uuid.UUID(int=7))},
+    {'id': 6, 'priority': 3, 'owner': 'carol', 'token': str(uuid.UUID(int=2))},
+    {'id': 7, 'priority': 2, 'owner': None, 'token': str(uuid.UUID(int=8))},
+]
+
+
+class ListByCursorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(engine)
+        engine.execute(Ticket.__table__.insert(), ROWS)
+        self.resource = TicketResource(dbpool=self.dbpool)
+
+    def _walk(self, orders, limit=2):
+        ids = []
+        cursor = None
+        for _ in range(len(ROWS) + 1):
+            rows, cursor = self.resource.list_by_cursor(orders=orders, limit=limit, cursor=cursor)
+            ids.extend([row['id'] for row in rows])
+            if cursor is None:
+                return ids
+        self.fail('pagination did not terminate')
+
+    def _expected(self, orders):
+        return [row['id'] for row in self.resource.list(orders=orders)]
+
+    def test_ties(self):
+        for orders in (['+priority'], ['-priority'], ['+priority', '-id']):
+            self.assertEqual(self._walk(orders), self._expected(orders))
+
+    def test_nullable_column(self):
+        for orders in (['+owner'], ['-owner'], ['+owner', '-priority'], ['-owner', '+priority']):
+            for limit in (1, 2, 3):
+                self.assertEqual(self._walk(orders, limit=limit), self._expected(orders))
+
+    def test_typed_values(self):
+        for orders in (['+token'], ['-token']):
+            self.assertEqual(self._walk(orders, limit=3), self._expected(orders))
+
+    def test_invalid_cursor(self):
+        _rows, cursor = self.resource.list_by_cursor(orders=['+token'], limit=2)
+        self.assertRaises(exceptions.ValidationError, self.resource.list_by_cursor,
+                          orders=['+token'], limit=2, cursor=cursor[:-4])
+        self.assertRaises(exceptions.ValidationError, self.resource.list_by_cursor,
+                          orders=['+owner'], limit=2, cursor=cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm.collections import attribute_mapped_collection
+
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Owner(Base, DictBase):
+    __tablename__ = 'dictbase_owner'
+    attributes = ['id', 'name', 'tags']
+    detail_attributes = ['id', 'name', 'items']
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    items = relationship('Item', lazy='dynamic')
+    tags = relationship('Tag', collection_class=attribute_mapped_collection('name'))
+
+
+class Item(Base, DictBase):
+    __tablename__ = 'dictbase_item'
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey('dictbase_owner.id'))
+
+
+class Tag(Base, DictBase):
+    __tablename__ = 'dictbase_tag'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    owner_id = Column(Integer, ForeignKey('dictbase_owner.id'))
+
+
+class DictBaseTest(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        owner = Owner(id=1, name='o1')
+        owner.tags['a'] = Tag(id=1, name='a')
+        self.session.add_all([owner, Item(id=1, owner_id=1)])
+        self.session.commit()
+        self.owner = self.session.query(Owner).get(1)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_instance_attributes_override(self):
+        self.owner.attributes = ['id']
+        self.assertEqual(self.owner.to_dict(), {'id': 1})
+        # 其他实例仍使用类属性
+        self.assertEqual(sorted(Owner(id=2, name='o2').to_dict()), ['id', 'name', 'tags'])
+
+    def test_dict_collection(self):
+        result = self.owner.to_dict()
+        self.assertEqual(list(result['tags']), ['a'])
+
+    def test_dynamic_relationship(self):
+        result = self.owner.to_detail_dict()
+        self.assertEqual(result['name'], 'o1')
+        self.assertNotIsInstance(result['items'], list)
+
+
+class Server(Base, DictBase):
+    __tablename__ = 'dictbase_server'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+    @property
+    def _extra_keys(self):
+        return ['display_name']
+
+    @property
+    def display_name(self):
+        return 'server-%s' % self.name
+
+
+class ModelBaseTest(unittest.TestCase):
+
+    def test_dict_protocol(self):
+        server = Server(id=1, name='s1')
+        self.assertEqual(list(server), [('id', 1), ('name', 's1'), ('display_name', 'server-s1')])
+        self.assertEqual(dict(server.items()), {'id': 1, 'name': 's1', 'display_name': 'server-s1'})
+        self.assertEqual(sorted(server.keys()), ['display_name', 'id', 'name'])
+        self.assertEqual(server['display_name'], 'server-s1')
+        self.assertIn('name', server)
+        self.assertNotIn('missing', server)
+
+    def test_joined_attributes(self):
+        owner = Owner(id=1, name='o1')
+        owner.label = 'joined'
+        self.assertEqual(owner._as_dict()['label'], 'joined')
+        self.assertIn('label', owner.keys())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, ForeignKey, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Project(Base, DictBase):
+    __tablename__ = 'eager_load_project'
+    attributes = ['id', 'name', 'owner', 'tasks']
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    owner_id = Column(Integer, ForeignKey('eager_load_user.id'))
+    owner = relationship('User')
+    tasks = relationship('Task')
+    audits = relationship('Audit', lazy='joined')
+
+
+class User(Base, DictBase):
+    __tablename__ = 'eager_load_user'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+class Task(Base, DictBase):
+    __tablename__ = 'eager_load_task'
+    summary_attributes = ['id', 'project_id', 'notes']
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey('eager_load_project.id'))
+    notes = relationship('Note')
+
+
+class Note(Base, DictBase):
+    __tablename__ = 'eager_load_note'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey('eager_load_task.id'))
+
+
+class Audit(Base, DictBase):
+    __tablename__ = 'eager_load_audit'
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey('eager_load_project.id'))
+
+
+class ProjectResource(crud.ResourceBase):
+    orm_meta = Project
+    _default_order = ['id']
+
+
+class EagerLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(self.engine)
+        self.engine.execute(User.__table__.insert(), [{'id': i, 'name': 'u%d' % i} for i in range(1, 4)])
+        self.engine.execute(Project.__table__.insert(),
+                            [{'id': i, 'name': 'p%d' % i, 'owner_id': i % 3 + 1} for i in range(1, 11)])
+        self.engine.execute(Task.__table__.insert(), [{'id': i, 'project_id': i % 10 + 1} for i in range(1, 31)])
+        self.engine.execute(Note.__table__.insert(), [{'id': i, 'task_id': i % 30 + 1} for i in range(1, 61)])
+        self.engine.execute(Audit.__table__.insert(), [{'id': i, 'project_id': 1} for i in range(1, 3)])
+        self.resource = ProjectResource(dbpool=self.dbpool)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_query_count(self):
+        rows = self.resource.list()
+        self.assertEqual(len(rows), 10)
+        # 项目+负责人(join)、任务(selectin)、任务备注(selectin)，与记录数量无关
+        self.assertEqual(len(self.statements), 3)
+        for row in rows:
+            self.assertEqual(row['owner']['id'], row['id'] % 3 + 1)
+            self.assertEqual(len(row['tasks']), 3)
+            for task in row['tasks']:
+                self.assertEqual(len(task['notes']), 2)
+                self.assertEqual(task['project_id'], row['id'])
+
+    def test_unserialized_relationship_not_loaded(self):
+        self.resource.list(limit=2)
+        self.assertFalse(any('eager_load_audit' in statement for statement in self.statements))
+
+    def test_iter_list_and_get_many(self):
+        self.assertEqual(list(self.resource.iter_list(batch_size=5)), self.resource.list())
+        del self.statements[:]
+        rows = self.resource.get_many(list(range(1, 11)))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(len(self.statements), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, DateTime, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Job(Base, DictBase):
+    __tablename__ = 'filter_write_job'
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(32))
+    removed = Column(DateTime)
+
+
+class JobResource(crud.ResourceBase):
+    orm_meta = Job
+    _default_filter = {'removed': None}
+    _default_order = ['id']
+
+
+class FilterWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(self.engine)
+        self.engine.execute(Job.__table__.insert(),
+                            [{'id': i, 'status': 'new' if i % 4 else 'done'} for i in range(1, 13)])
+        self.resource = JobResource(dbpool=self.dbpool)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split(None, 1)[0].upper())
+
+    def _statuses(self):
+        return dict(self.engine.execute('SELECT id, status FROM filter_write_job').fetchall())
+
+    def test_update(self):
+        self.assertEqual(self.resource.update_by_filter({'status': 'done'}, {'status': 'archived'}), 3)
+        self.assertEqual(self.statements.count('UPDATE'), 1)
+        self.assertEqual(sorted(k for k, v in self._statuses().items() if v == 'archived'), [4, 8, 12])
+
+    def test_update_chunks(self):
+        # 更新后的记录不再符合过滤条件，分块边界仍需覆盖全部记录；找不到边界时对剩余记录再执行一次
+        for chunk_size, chunks in ((3, 4), (4, 3), (9, 2), (20, 1)):
+            self.engine.execute("UPDATE filter_write_job SET status = 'new' WHERE id % 4 != 0")
+            del self.statements[:]
+            self.assertEqual(self.resource.update_by_filter({'status': 'new'}, {'status': 'run'},
+                                                            chunk_size=chunk_size), 9)
+            self.assertEqual(self.statements.count('UPDATE'), chunks)
+            self.assertEqual(sorted(self._statuses().values()), ['done'] * 3 + ['run'] * 9)
+
+    def test_update_empty_values(self):
+        self.assertEqual(self.resource.update_by_filter({'status': 'new'}, {}), 0)
+        self.assertEqual(self.statements.count('UPDATE'), 0)
+
+    def test_soft_delete(self):
+        self.assertEqual(self.resource.delete_by_filter({'id': {'lte': 5}}, chunk_size=2), 5)
+        self.assertEqual(self.resource.count(), 7)
+        self.assertEqual(self.engine.execute('SELECT COUNT(*) FROM filter_write_job').scalar(), 12)
+        # 已软删除的记录不再受影响
+        self.assertEqual(self.resource.delete_by_filter({'id': {'lte': 5}}), 0)
+
+    def test_hard_delete(self):
+        self.assertEqual(self.resource.delete_by_filter({'status': 'done'}, soft=False, chunk_size=2), 3)
+        self.assertEqual(self.statements.count('DELETE'), 2)
+        self.assertEqual(self.engine.execute('SELECT COUNT(*) FROM filter_write_job').scalar(), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
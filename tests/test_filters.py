@@ -0,0 +1,64 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import crud
+from neptune.db import filter_wrapper
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Person(Base, DictBase):
+    __tablename__ = 'filters_person'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+class FilterCaseInsensitive(filter_wrapper.Filter):
+
+    def op(self, column, value):
+        return func.lower(column) == value.lower()
+
+
+class PersonResource(crud.ResourceBase):
+    orm_meta = Person
+    _default_order = ['id']
+
+
+class CaseInsensitiveResource(PersonResource):
+
+    def _get_filter_handler(self, name):
+        if name.lower() == 'string':
+            return FilterCaseInsensitive()
+        return super(CaseInsensitiveResource, self)._get_filter_handler(name)
+
+
+class FilterHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(engine)
+        engine.execute(Person.__table__.insert(), [{'id': 1, 'name': 'Alice'}, {'id': 2, 'name': 'bob'}])
+
+    def test_default_handler(self):
+        resource = PersonResource(dbpool=self.dbpool)
+        self.assertEqual([], resource.list({'name': 'alice'}))
+        self.assertEqual([2], [row['id'] for row in resource.list({'name': {'in': ['bob', 'x']}})])
+
+    def test_overridden_filter_handler(self):
+        resource = CaseInsensitiveResource(dbpool=self.dbpool)
+        for name, expected in (('alice', [1]), ('BOB', [2]), ('carol', [])):
+            self.assertEqual(expected, [row['id'] for row in resource.list({'name': name})])
+
+
+if __name__ == '__main__':
+    unittest.main()
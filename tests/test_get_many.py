@@ -0,0 +1,109 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import datetime
+import unittest
+
+from sqlalchemy import Column, DateTime, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.core import exceptions
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Quota(Base, DictBase):
+    __tablename__ = 'get_many_quota'
+
+    tenant = Column(String(32), primary_key=True)
+    region = Column(String(32), primary_key=True)
+    value = Column(Integer)
+    removed = Column(DateTime)
+
+
+class Flavor(Base, DictBase):
+    __tablename__ = 'get_many_flavor'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+class QuotaResource(crud.ResourceBase):
+    orm_meta = Quota
+    _primary_keys = ('tenant', 'region')
+    _default_filter = {'removed': None}
+
+
+class FlavorResource(crud.ResourceBase):
+    orm_meta = Flavor
+
+
+class GetManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(self.engine)
+        self.engine.execute(Quota.__table__.insert(), [
+            {'tenant': 't1', 'region': 'r1', 'value': 1, 'removed': None},
+            {'tenant': 't1', 'region': 'r2', 'value': 2, 'removed': None},
+            {'tenant': 't2', 'region': 'r1', 'value': 3, 'removed': None},
+            {'tenant': 't2', 'region': 'r2', 'value': 4, 'removed': datetime.datetime(2020, 1, 1)},
+        ])
+        self.engine.execute(Flavor.__table__.insert(), [{'id': i, 'name': 'f%d' % i} for i in range(1, 8)])
+        self.selects = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.selects.append(statement)
+
+    def test_composite_keys(self):
+        resource = QuotaResource(dbpool=self.dbpool)
+        results = resource.get_many([('t2', 'r1'), {'region': 'r1', 'tenant': 't1'}, ['t1', 'r2'],
+                                     ('t9', 'r1'), ('t2', 'r2'), ('t2', 'r1')])
+        # 按传入顺序，去重，不包含不存在以及被默认过滤条件排除的记录
+        self.assertEqual(list(results.keys()), [('t2', 'r1'), ('t1', 'r1'), ('t1', 'r2')])
+        self.assertEqual([row['value'] for row in results.values()], [3, 1, 2])
+
+    def test_composite_chunks(self):
+        resource = QuotaResource(dbpool=self.dbpool)
+        results = resource.get_many([('t1', 'r1'), ('t1', 'r2'), ('t2', 'r1')], chunk_size=2)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(self.selects), 2)
+
+    def test_get(self):
+        resource = QuotaResource(dbpool=self.dbpool)
+        self.assertEqual(resource.get(('t1', 'r2'))['value'], 2)
+        self.assertEqual(resource.get({'tenant': 't1', 'region': 'r1'})['value'], 1)
+        self.assertIsNone(resource.get(('t2', 'r2')))
+        self.assertRaises(exceptions.ValidationError, resource.get, ('t1',))
+
+    def test_single_key(self):
+        resource = FlavorResource(dbpool=self.dbpool)
+        results = resource.get_many([5, 1, 9, 3], chunk_size=2)
+        self.assertEqual(list(results.keys()), [5, 1, 3])
+        self.assertEqual(results[5]['name'], 'f5')
+        self.assertEqual(len(self.selects), 2)
+        self.assertEqual(resource.get(2)['name'], 'f2')
+
+    def test_identity_map(self):
+        resource = FlavorResource(dbpool=self.dbpool)
+        with resource.transaction() as session:
+            rec = session.query(Flavor).get(1)
+            del self.selects[:]
+            results = FlavorResource(transaction=session).get_many([1, 2])
+            self.assertEqual(results[1], rec.to_dict())
+            self.assertEqual(len(self.selects), 1)
+            self.assertNotIn("get_many_flavor.id IN (?, ?)", self.selects[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Box(Base, DictBase):
+    __tablename__ = 'iter_list_box'
+    attributes = ['id', 'name', 'items']
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    items = relationship('BoxItem', lazy='joined')
+
+
+class BoxItem(Base, DictBase):
+    __tablename__ = 'iter_list_box_item'
+
+    id = Column(Integer, primary_key=True)
+    box_id = Column(Integer, ForeignKey('iter_list_box.id'))
+
+
+class BoxResource(crud.ResourceBase):
+    orm_meta = Box
+    _default_order = ['id']
+
+
+class IterListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(engine)
+        engine.execute(Box.__table__.insert(), [{'id': i, 'name': 'b%d' % (i % 3)} for i in range(1, 11)])
+        engine.execute(BoxItem.__table__.insert(), [{'id': i, 'box_id': (i % 10) + 1} for i in range(1, 21)])
+        self.resource = BoxResource(dbpool=self.dbpool)
+
+    def test_batches(self):
+        batches = list(self.resource.iter_batches(batch_size=4))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual([row['id'] for batch in batches for row in batch], list(range(1, 11)))
+
+    def test_same_as_list(self):
+        filters = {'name': 'b1'}
+        orders = ['-id']
+        self.assertEqual(list(self.resource.iter_list(filters=filters, orders=orders, batch_size=2)),
+                         self.resource.list(filters=filters, orders=orders))
+
+    def test_offset_limit(self):
+        rows = list(self.resource.iter_list(offset=3, limit=4, batch_size=3))
+        self.assertEqual([row['id'] for row in rows], [4, 5, 6, 7])
+
+    def test_joined_collection(self):
+        # joined集合无法与yield_per共用，应自动改为selectin加载且每个集合完整
+        rows = list(self.resource.iter_list(batch_size=3))
+        self.assertEqual(len(rows), 10)
+        for row in rows:
+            self.assertEqual(len(row['items']), 2)
+            self.assertTrue(all(item['box_id'] == row['id'] for item in row['items']))
+
+    def test_empty(self):
+        self.assertEqual(list(self.resource.iter_batches(filters={'name': 'none'})), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import Column, Index, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.core import exceptions
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Record(Base, DictBase):
+    __tablename__ = 'list_parallel_record'
+    __table_args__ = (Index('ix_list_parallel_record_code', 'code'),)
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(32))
+    score = Column(Integer)
+
+
+class RecordResource(crud.ResourceBase):
+    orm_meta = Record
+    _default_order = ['id']
+
+
+class ListParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        # 各分片使用独立连接，内存数据库无法共享数据
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbpool = pool.DBPool({'connection': 'sqlite:///%s' % os.path.join(self.tmpdir, 'parallel.db'),
+                                   'echo': False})
+        self.engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(self.engine)
+        self.engine.execute(Record.__table__.insert(), [
+            {'id': i, 'code': 'c%03d' % ((i * 37) % 101), 'score': None if i % 7 == 0 else i % 5}
+            for i in range(1, 101)])
+        self.resource = RecordResource(dbpool=self.dbpool)
+
+    def tearDown(self):
+        self.dbpool.dispose()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_merge_order(self):
+        for orders in (['id'], ['-id'], ['+score', '+id'], ['-score', '-code'], ['code']):
+            self.assertEqual(self.resource.list_parallel(orders=orders, partitions=4),
+                             self.resource.list(orders=orders))
+
+    def test_filters(self):
+        filters = {'score': {'gte': 2}}
+        self.assertEqual(self.resource.list_parallel(filters=filters, orders=['-score', 'id'], partitions=3),
+                         self.resource.list(filters=filters, orders=['-score', 'id']))
+        self.assertEqual(self.resource.list_parallel(filters={'id': {'gt': 1000}}), [])
+
+    def test_unordered(self):
+        rows = self.resource.list_parallel(orders=[], partitions=4)
+        self.assertEqual(sorted(row['id'] for row in rows), list(range(1, 101)))
+
+    def test_partition_column(self):
+        self.assertEqual(self.resource.list_parallel(orders=['score', 'id'], partitions=3, column='code'),
+                         self.resource.list(orders=['score', 'id']))
+        self.assertRaises(exceptions.ValidationError, self.resource.list_parallel, column='missing')
+
+    def test_partitions(self):
+        with self.resource.get_session() as session:
+            expressions = self.resource._get_partition_expressions(session, Record.id, None, None, 4)
+        self.assertEqual(len(expressions), 4)
+        with self.resource.get_session() as session:
+            expressions = self.resource._get_partition_expressions(session, Record.id, {'id': 5}, None, 4)
+        self.assertEqual(expressions, [None])
+
+    def test_fields(self):
+        self.assertRaises(exceptions.ValidationError, self.resource.list_parallel,
+                          orders=['score'], fields=['id'])
+        self.assertEqual(self.resource.list_parallel(orders=['-id'], fields=['id']),
+                         [{'id': i} for i in range(100, 0, -1)])
+
+    def test_external_transaction(self):
+        with self.resource.transaction() as session:
+            rows = RecordResource(transaction=session).list_parallel(orders=['-score', 'id'])
+        self.assertEqual(rows, self.resource.list(orders=['-score', 'id']))
+
+
+class MergeSortedTest(unittest.TestCase):
+
+    def test_nulls(self):
+        parts = [[{'v': 1}, {'v': 3}, {'v': None}], [{'v': 2}, {'v': None}]]
+        self.assertEqual([row['v'] for row in crud._merge_sorted(parts, [('v', False)], nulls_first=False)],
+                         [1, 2, 3, None, None])
+        parts = [[{'v': None}, {'v': 1}, {'v': 3}], [{'v': 2}]]
+        self.assertEqual([row['v'] for row in crud._merge_sorted(parts, [('v', False)], nulls_first=True)],
+                         [None, 1, 2, 3])
+        parts = [[{'v': 3}, {'v': 1}, {'v': None}], [{'v': 2}]]
+        self.assertEqual([row['v'] for row in crud._merge_sorted(parts, [('v', True)], nulls_first=True)],
+                         [3, 2, 1, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
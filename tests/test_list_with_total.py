@@ -0,0 +1,82 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Member(Base, DictBase):
+    __tablename__ = 'list_with_total_member'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    dept_id = Column(Integer)
+
+
+class MemberResource(crud.ResourceBase):
+    orm_meta = Member
+    _default_order = ['id']
+
+
+class DeptOneResource(MemberResource):
+
+    def _addtional_list(self, query, filters):
+        return query.filter(Member.dept_id == 1)
+
+
+class DeptOneCountResource(DeptOneResource):
+
+    def _addtional_count(self, query, filters):
+        return query.filter(Member.dept_id == 2)
+
+
+class UncachedResource(MemberResource):
+    _statement_cache = False
+
+
+class ListWithTotalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(engine)
+        engine.execute(Member.__table__.insert(),
+                       [{'id': i, 'name': 'm%d' % i, 'dept_id': i % 3} for i in range(1, 21)])
+
+    def test_addtional_list_is_applied(self):
+        resource = DeptOneResource(dbpool=self.dbpool)
+        ids = [row['id'] for row in resource.list()]
+        self.assertEqual(7, len(ids))
+        results, total = resource.list_with_total(offset=2, limit=3)
+        self.assertEqual(ids[2:5], [row['id'] for row in results])
+        self.assertEqual(7, total)
+        results, total = resource.list_with_total()
+        self.assertEqual(ids, [row['id'] for row in results])
+        self.assertEqual(7, total)
+        results, total = resource.list_with_total(offset=100, limit=3)
+        self.assertEqual(([], 7), (results, total))
+
+    def test_addtional_count_is_applied(self):
+        resource = DeptOneCountResource(dbpool=self.dbpool)
+        results, total = resource.list_with_total(limit=2, fields=['id'])
+        self.assertEqual([{'id': 1}, {'id': 4}], results)
+        self.assertEqual(resource.count(), total)
+
+    def test_statement_cache_disabled(self):
+        resource = UncachedResource(dbpool=self.dbpool)
+        results, total = resource.list_with_total({'dept_id': 0}, offset=1, limit=2)
+        self.assertEqual([6, 9], [row['id'] for row in results])
+        self.assertEqual(6, total)
+
+
+if __name__ == '__main__':
+    unittest.main()
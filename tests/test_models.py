@@ -0,0 +1,105 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, UniqueConstraint
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import configure_mappers, relationship
+
+from neptune.db import crud
+from neptune.db import models
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+OtherBase = declarative_base()
+
+
+class Region(models.Base, DictBase):
+    __tablename__ = 'models_region'
+    __table_args__ = (UniqueConstraint('name', name='uq_models_region_name'),
+                      Index('ix_models_region_code', 'region_code'))
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    code = Column('region_code', String(32))
+    zones = relationship('Zone')
+
+
+class Zone(models.Base, DictBase):
+    __tablename__ = 'models_zone'
+
+    id = Column(Integer, primary_key=True)
+    region_id = Column(Integer, ForeignKey('models_region.id'))
+
+
+class Unregistered(OtherBase, DictBase):
+    __tablename__ = 'models_unregistered'
+
+    id = Column(Integer, primary_key=True)
+
+
+class Rack(OtherBase, DictBase):
+    __tablename__ = 'models_rack'
+
+    id = Column(Integer, primary_key=True)
+
+
+class RackResource(crud.ResourceBase):
+    orm_meta = Rack
+    _default_order = ['id']
+
+
+class CatalogTest(unittest.TestCase):
+
+    def test_lookup(self):
+        self.assertIs(models.get_class_by_name('Region'), Region)
+        self.assertIs(models.get_class_by_tablename('models_zone'), Zone)
+        self.assertEqual(models.get_tablename_by_name('Region'), 'models_region')
+        self.assertEqual(models.get_name_by_class(Zone), 'Zone')
+        self.assertIn('Region', models.get_names())
+        # 仅登记models.Base的子类
+        self.assertIsNone(models.get_class_by_name('Unregistered'))
+        self.assertIsNone(models.get_class_by_tablename('models_unregistered'))
+        self.assertIsNone(models.get_tablename_by_name('Missing'))
+
+    def test_model_info(self):
+        info = models.get_model_info(Region)
+        self.assertIs(models.get_model_info(Region), info)
+        self.assertEqual(info.primary_keys, ['id'])
+        self.assertEqual(sorted(info.columns), ['code', 'id', 'name'])
+        self.assertEqual(list(info.relationships), ['zones'])
+        self.assertEqual(info.related_tables, ['models_region', 'models_zone'])
+        self.assertIn(models.IndexInfo('uq_models_region_name', ['name'], True), info.indexes)
+        self.assertIn(models.IndexInfo('ix_models_region_code', ['code'], False), info.indexes)
+
+    def test_reset_after_configured(self):
+        info = models.get_model_info(Region)
+
+        class Pod(models.Base, DictBase):
+            __tablename__ = 'models_pod'
+
+            id = Column(Integer, primary_key=True)
+
+        configure_mappers()
+        self.assertIsNot(models.get_model_info(Region), info)
+        self.assertIs(models.get_class_by_name('Pod'), Pod)
+
+    def test_reset_on_new_column(self):
+        dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        resource = RackResource(dbpool=dbpool)
+        self.assertEqual(models.get_model_info(Rack).column_keys, ('id',))
+        self.assertEqual(Rack(id=1).to_dict(), {'id': 1})
+        # 已完成配置的Model新增列不会触发after_configured
+        Rack.label = Column(String(32))
+        configure_mappers()
+        self.assertEqual(models.get_model_info(Rack).column_keys, ('id', 'label'))
+        self.assertEqual(Rack(id=1).to_dict(), {'id': 1, 'label': None})
+        OtherBase.metadata.create_all(dbpool._pool.kw['bind'])
+        dbpool._pool.kw['bind'].execute(Rack.__table__.insert(), [{'id': 1, 'label': 'r1'}])
+        self.assertEqual(resource.list(filters={'label': 'r1'}), [{'id': 1, 'label': 'r1'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+from neptune.core import exceptions
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Host(Base, DictBase):
+    __tablename__ = 'projection_host'
+    attributes = ['id', 'name', 'nics']
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    zone = Column(String(32))
+    nics = relationship('Nic')
+
+
+class Nic(Base, DictBase):
+    __tablename__ = 'projection_nic'
+
+    id = Column(Integer, primary_key=True)
+    host_id = Column(Integer, ForeignKey('projection_host.id'))
+
+
+class HostResource(crud.ResourceBase):
+    orm_meta = Host
+    _default_order = ['id']
+
+
+class ZoneAResource(HostResource):
+
+    def _addtional_list(self, query, filters):
+        return query.filter(Host.zone == 'a')
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(engine)
+        engine.execute(Host.__table__.insert(),
+                       [{'id': i, 'name': 'h%d' % i, 'zone': 'a' if i % 2 else 'b'} for i in range(1, 6)])
+        self.resource = HostResource(dbpool=self.dbpool)
+
+    def test_fields(self):
+        rows = self.resource.list(filters={'zone': 'a'}, orders=['-id'], fields=['name', 'id'])
+        self.assertEqual(rows, [{'name': 'h5', 'id': 5}, {'name': 'h3', 'id': 3}, {'name': 'h1', 'id': 1}])
+
+    def test_fields_true(self):
+        # 使用attributes中的列，排除relationship
+        rows = self.resource.list(limit=2, fields=True)
+        self.assertEqual(rows, [{'id': 1, 'name': 'h1'}, {'id': 2, 'name': 'h2'}])
+
+    def test_offset_limit(self):
+        rows = self.resource.list(offset=1, limit=2, fields=['id'])
+        self.assertEqual(rows, [{'id': 2}, {'id': 3}])
+
+    def test_hooks_and_additional_list(self):
+        hook = lambda query, filters: query.filter(Host.id > 1)
+        rows = ZoneAResource(dbpool=self.dbpool).list(hooks=[hook], fields=['id'])
+        self.assertEqual(rows, [{'id': 3}, {'id': 5}])
+
+    def test_list_with_total(self):
+        rows, total = self.resource.list_with_total(filters={'zone': 'b'}, limit=1, fields=['id', 'zone'])
+        self.assertEqual(rows, [{'id': 2, 'zone': 'b'}])
+        self.assertEqual(total, 2)
+
+    def test_invalid_fields(self):
+        self.assertRaises(exceptions.ValidationError, self.resource.list, fields=['nics'])
+        self.assertRaises(exceptions.ValidationError, self.resource.list, fields=['missing'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+from sqlalchemy import Column, Integer
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.core import decorators
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Metric(Base, DictBase):
+    __tablename__ = 'registry_metric'
+
+    id = Column(Integer, primary_key=True)
+
+
+class MetricResource(crud.ResourceBase):
+    orm_meta = Metric
+    _dbpool_name = 'registry_test'
+
+
+class PoolRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = pool.PoolRegistry()
+
+    def test_get(self):
+        dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.registry.register('main', dbpool)
+        self.assertIs(self.registry.get('main'), dbpool)
+        self.assertEqual(self.registry.names(), ['main'])
+        self.assertRaises(ValueError, self.registry.get, 'missing')
+        self.assertIs(pool.REGISTRY.get('default'), pool.POOL)
+
+    def test_register_replaces(self):
+        stopped = []
+        old = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        old._stop_maintainer = lambda: stopped.append(old)
+        self.registry.register('main', old)
+        snapshot = self.registry._pools
+        new = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.registry.register('main', new)
+        self.assertIs(self.registry.get('main'), new)
+        self.assertEqual(stopped, [old])
+        # 读取方持有的旧映射不受影响
+        self.assertIs(snapshot['main'], old)
+
+    def test_configure(self):
+        self.registry.configure({
+            'main': {'connection': 'sqlite://', 'echo': False},
+            'tenant': {'shards': ['sqlite://', 'sqlite://'], 'echo': False},
+        })
+        main = self.registry.get('main')
+        self.assertIsInstance(main, pool.DBPool)
+        self.assertIsInstance(self.registry.get('tenant'), pool.ShardedDBPool)
+        engine = main._pool.kw['bind']
+        # 同类型原地重建，对象不变
+        self.registry.configure({'main': {'connection': 'sqlite://', 'echo': False}})
+        self.assertIs(self.registry.get('main'), main)
+        self.assertIsNot(main._pool.kw['bind'], engine)
+        # 类型变化时替换
+        self.registry.configure({'main': {'shards': {'a': 'sqlite://'}, 'echo': False}})
+        self.assertIsInstance(self.registry.get('main'), pool.ShardedDBPool)
+        self.assertEqual(self.registry.names(), ['main', 'tenant'])
+
+
+class DBPoolNameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pools = pool.REGISTRY._pools
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        pool.REGISTRY.register('registry_test', self.dbpool)
+
+    def tearDown(self):
+        pool.REGISTRY._pools = self.pools
+
+    def test_resource_pool(self):
+        self.assertIs(MetricResource()._pool, self.dbpool)
+        other = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.assertIs(MetricResource(dbpool=other)._pool, other)
+        self.assertIs(pool.get_pool('registry_test'), self.dbpool)
+
+
+class SingletonTest(unittest.TestCase):
+
+    def test_singleton(self):
+        created = []
+
+        @decorators.singleton
+        class Service(object):
+            def __init__(self, *args, **kwargs):
+                created.append((args, kwargs))
+
+        self.assertIs(Service(), Service())
+        self.assertIs(Service(1, key='a'), Service(1, key='a'))
+        self.assertIsNot(Service(1), Service(2))
+        # 不可哈希的参数
+        self.assertIs(Service([1]), Service([1]))
+        self.assertIs(Service(key={'a': 1}), Service(key={'a': 1}))
+        self.assertEqual(len(created), 6)
+
+    def test_concurrent_creation(self):
+        created = []
+        barrier = threading.Event()
+
+        @decorators.singleton
+        class Service(object):
+            def __init__(self):
+                created.append(self)
+
+        def _get(results):
+            barrier.wait()
+            results.append(Service())
+
+        results = []
+        threads = [threading.Thread(target=_get, args=(results,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        barrier.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(result is created[0] for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
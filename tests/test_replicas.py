@@ -0,0 +1,112 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import sqlalchemy
+import sqlalchemy.exc
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Node(Base, DictBase):
+    __tablename__ = 'replicas_node'
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String(32))
+
+
+class NodeResource(crud.ResourceBase):
+    orm_meta = Node
+    _default_order = ['id']
+
+
+class ReplicaRoutingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # 各数据库写入不同的数据，用于区分查询使用的节点
+        self.urls = {}
+        for name in ('primary', 'r1', 'r2'):
+            url = self.urls[name] = 'sqlite:///' + os.path.join(self.tmpdir, name + '.db')
+            engine = sqlalchemy.create_engine(url)
+            Base.metadata.create_all(engine)
+            engine.execute(Node.__table__.insert(), [{'id': 1, 'source': name}])
+            engine.dispose()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _make_pool(self, replicas, **kwargs):
+        param = {'connection': self.urls['primary'], 'echo': False, 'replicas': replicas}
+        param.update(kwargs)
+        dbpool = pool.DBPool(param)
+        self.addCleanup(dbpool.dispose)
+        return dbpool
+
+    def _source(self, resource):
+        return resource.list()[0]['source']
+
+    def test_round_robin(self):
+        dbpool = self._make_pool([self.urls['r1'], self.urls['r2']])
+        resource = NodeResource(dbpool=dbpool)
+        sources = [self._source(resource) for _ in range(4)]
+        self.assertEqual(sorted(sources), ['r1', 'r1', 'r2', 'r2'])
+        self.assertNotEqual(sources[0], sources[1])
+        self.assertEqual(list(dbpool.stats()), ['primary', self.urls['r1'], self.urls['r2']])
+
+    def test_writes_use_primary(self):
+        dbpool = self._make_pool([self.urls['r1']])
+        resource = NodeResource(dbpool=dbpool)
+        resource.update_by_filter({'id': 1}, {'source': 'written'})
+        with resource.transaction() as session:
+            self.assertEqual(session.query(Node.source).scalar(), 'written')
+        self.assertEqual(self._source(resource), 'r1')
+
+    def test_least_busy(self):
+        dbpool = self._make_pool([self.urls['r1'], self.urls['r2']], replica_strategy='least_busy')
+        resource = NodeResource(dbpool=dbpool)
+        busy = dbpool._replicas[0].engine.connect()
+        try:
+            self.assertEqual([self._source(resource) for _ in range(3)], ['r2'] * 3)
+        finally:
+            busy.close()
+
+    def test_ejection(self):
+        broken = 'sqlite:///' + os.path.join(self.tmpdir, 'missing', 'broken.db')
+        dbpool = self._make_pool([broken], replica_max_failures=2, replica_eject_seconds=60)
+        resource = NodeResource(dbpool=dbpool)
+        node = dbpool._replicas[0]
+        for _ in range(2):
+            self.assertTrue(node.available)
+            self.assertRaises(sqlalchemy.exc.OperationalError, resource.list)
+        # 连续失败达到上限后剔除，读取回落到主库
+        self.assertFalse(node.available)
+        self.assertEqual(self._source(resource), 'primary')
+        node.ejected_until = time.time() - 1
+        self.assertTrue(node.available)
+        self.assertRaises(sqlalchemy.exc.OperationalError, resource.list)
+
+    def test_sql_error_not_counted(self):
+        dbpool = self._make_pool([self.urls['r1']], replica_max_failures=1)
+        session = dbpool.get_session()
+        try:
+            self.assertRaises(sqlalchemy.exc.DatabaseError, session.execute, 'SELECT * FROM missing_table')
+        finally:
+            session.remove()
+        self.assertTrue(dbpool._replicas[0].available)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import cache
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Article(Base, DictBase):
+    __tablename__ = 'result_cache_article'
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String(32))
+
+
+class ArticleResource(crud.ResourceBase):
+    orm_meta = Article
+    _default_order = ['id']
+    _result_cache = cache.QueryCache(max_entries=10, ttl=60)
+
+
+class QueryCacheTest(unittest.TestCase):
+
+    def test_lru(self):
+        qc = cache.QueryCache(max_entries=2)
+        qc.set('a', 1, ['t'])
+        qc.set('b', 2, ['t'])
+        # 访问a后b成为最久未使用的条目
+        self.assertEqual(qc.get('a'), 1)
+        qc.set('c', 3, ['t'])
+        self.assertIs(qc.get('b'), cache.MISSING)
+        self.assertEqual(qc.get('a'), 1)
+        self.assertEqual(qc.get('c'), 3)
+        self.assertEqual(qc.stats()['evictions'], 1)
+
+    def test_max_bytes(self):
+        qc = cache.QueryCache(max_bytes=200)
+        qc.set('big', 'x' * 500, ['t'])
+        self.assertIs(qc.get('big'), cache.MISSING)
+        qc.set('a', 'x' * 100, ['t'])
+        qc.set('b', 'x' * 100, ['t'])
+        self.assertIs(qc.get('a'), cache.MISSING)
+        self.assertEqual(qc.get('b'), 'x' * 100)
+        self.assertTrue(qc.stats()['bytes'] <= 200)
+
+    def test_ttl(self):
+        qc = cache.QueryCache(ttl=-1)
+        qc.set('a', 1, ['t'])
+        self.assertIs(qc.get('a'), cache.MISSING)
+        stats = qc.stats()
+        self.assertEqual((stats['entries'], stats['expirations']), (0, 1))
+
+    def test_copy_on_get(self):
+        qc = cache.QueryCache()
+        qc.set('a', [{'id': 1}], ['t'])
+        qc.get('a')[0]['id'] = 2
+        self.assertEqual(qc.get('a'), [{'id': 1}])
+
+    def test_invalidate(self):
+        qc = cache.QueryCache()
+        qc.set('a', 1, ['t1'])
+        qc.set('b', 2, ['t1', 't2'])
+        qc.set('c', 3, ['t3'])
+        cache.invalidate(['t2'])
+        self.assertEqual(qc.get('a'), 1)
+        self.assertIs(qc.get('b'), cache.MISSING)
+        self.assertEqual(qc.get('c'), 3)
+
+    def test_stale_generation(self):
+        qc = cache.QueryCache()
+        generation = qc.generation(['t'])
+        # 查询期间表已变更，结果不写入缓存
+        qc.invalidate(['t'])
+        qc.set('a', 1, ['t'], generation=generation)
+        self.assertIs(qc.get('a'), cache.MISSING)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        self.engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(self.engine)
+        self.engine.execute(Article.__table__.insert(), [{'id': i, 'title': 't%d' % i} for i in range(1, 4)])
+        ArticleResource._result_cache.clear()
+        self.resource = ArticleResource(dbpool=self.dbpool)
+
+    def test_hit(self):
+        self.assertEqual(len(self.resource.list()), 3)
+        # 绕过ORM直接写入，缓存不会失效
+        self.engine.execute(Article.__table__.insert(), [{'id': 4, 'title': 't4'}])
+        self.assertEqual(len(self.resource.list()), 3)
+        self.assertEqual(len(self.resource.list(filters={'id': {'gt': 0}})), 4)
+
+    def test_invalidate_on_write(self):
+        self.assertEqual(self.resource.count(), 3)
+        self.assertEqual(self.resource.list(filters={'title': 't1'})[0]['id'], 1)
+        self.resource.create_many([{'id': 4, 'title': 't4'}])
+        self.assertEqual(self.resource.count(), 4)
+        self.resource.update_by_filter({'id': 1}, {'title': 'changed'})
+        self.assertEqual(self.resource.list(filters={'title': 't1'}), [])
+
+    def test_hooks_bypass(self):
+        hook = lambda query, filters: query
+        self.assertEqual(len(self.resource.list(hooks=[hook])), 3)
+        self.engine.execute(Article.__table__.insert(), [{'id': 4, 'title': 't4'}])
+        self.assertEqual(len(self.resource.list(hooks=[hook])), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
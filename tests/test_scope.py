@@ -0,0 +1,107 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import Column, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Order(Base, DictBase):
+    __tablename__ = 'scope_order'
+
+    id = Column(Integer, primary_key=True)
+    state = Column(String(32))
+
+
+class OrderResource(crud.ResourceBase):
+    orm_meta = Order
+    _default_order = ['id']
+
+
+class ScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbpool = pool.DBPool({'connection': 'sqlite:///' + os.path.join(self.tmpdir, 'scope.db'),
+                                   'echo': False, 'connect_args': {'check_same_thread': False}})
+        self.engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(self.engine)
+        self.engine.execute(Order.__table__.insert(), [{'id': i, 'state': 'new'} for i in range(1, 4)])
+        self.checkouts = []
+        event.listen(self.engine, 'checkout', self._record)
+
+    def tearDown(self):
+        event.remove(self.engine, 'checkout', self._record)
+        self.dbpool.dispose()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _record(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts.append(dbapi_connection)
+
+    def test_shared_session(self):
+        with self.dbpool.scope() as session:
+            with OrderResource(dbpool=self.dbpool).get_session() as first:
+                self.assertIs(first, session)
+            with OrderResource(dbpool=self.dbpool).get_session() as second:
+                self.assertIs(second, session)
+            self.assertEqual(len(OrderResource(dbpool=self.dbpool).list()), 3)
+            self.assertEqual(OrderResource(dbpool=self.dbpool).count(), 3)
+            with self.dbpool.scope() as nested:
+                self.assertIs(nested, session)
+        self.assertEqual(len(self.checkouts), 1)
+        self.assertIsNone(self.dbpool.current_session())
+
+    def test_transaction(self):
+        resource = OrderResource(dbpool=self.dbpool)
+        with self.dbpool.scope() as session:
+            with resource.transaction() as txn:
+                self.assertIs(txn, session)
+                resource.update_by_filter({'id': 1}, {'state': 'paid'})
+                with OrderResource(dbpool=self.dbpool).transaction() as nested:
+                    self.assertIs(nested, session)
+            # 事务已提交，工作单元中可读到
+            self.assertEqual(resource.list(filters={'state': 'paid'})[0]['id'], 1)
+        self.assertEqual(resource.count(filters={'state': 'paid'}), 1)
+
+    def test_transactional_rollback(self):
+        resource = OrderResource(dbpool=self.dbpool)
+        with self.assertRaises(RuntimeError):
+            with self.dbpool.scope(transactional=True):
+                resource.update_by_filter({'id': 1}, {'state': 'paid'})
+                self.assertEqual(resource.count(filters={'state': 'paid'}), 1)
+                raise RuntimeError()
+        self.assertEqual(resource.count(filters={'state': 'paid'}), 0)
+        with self.dbpool.scope(transactional=True):
+            resource.update_by_filter({'id': 2}, {'state': 'paid'})
+        self.assertEqual(resource.count(filters={'state': 'paid'}), 1)
+
+    def test_readonly(self):
+        with self.dbpool.scope(readonly=True) as session:
+            self.assertIs(self.dbpool.current_session(), session)
+            self.assertIsNone(self.dbpool.current_session(write=True))
+            with OrderResource(dbpool=self.dbpool).transaction() as txn:
+                self.assertIsNot(txn, session)
+
+    def test_thread_isolation(self):
+        seen = []
+        with self.dbpool.scope():
+            thread = threading.Thread(target=lambda: seen.append(self.dbpool.current_session()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
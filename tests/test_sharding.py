@@ -0,0 +1,83 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.core import exceptions
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Tenant(Base, DictBase):
+    __tablename__ = 'sharding_tenant'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    dept_id = Column(Integer)
+
+
+class TenantResource(crud.ResourceBase):
+    orm_meta = Tenant
+    _default_order = ['id']
+    _shard_key = 'dept_id'
+
+
+class ShardedDBPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shards = ['sqlite:///' + os.path.join(self.tmpdir, 'shard%d.db' % idx) for idx in range(3)]
+        self.dbpool = pool.ShardedDBPool({'shards': shards, 'echo': False})
+        rows = [{'id': i, 'name': 't%d' % i, 'dept_id': i % 3} for i in range(1, 31)]
+        for name in self.dbpool.shard_names:
+            engine = self.dbpool.get_pool(name)._pool.kw['bind']
+            Base.metadata.create_all(engine)
+            shard_rows = [row for row in rows if self.dbpool.get_shard(row['dept_id']) == name]
+            if shard_rows:
+                engine.execute(Tenant.__table__.insert(), shard_rows)
+        self.resource = TenantResource(dbpool=self.dbpool)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_scatter_gather(self):
+        self.assertEqual(30, self.resource.count())
+        self.assertEqual(10, self.resource.count({'dept_id': 1}))
+        self.assertEqual(list(range(6, 11)), [row['id'] for row in self.resource.list(offset=5, limit=5)])
+        results, total = self.resource.list_with_total({'dept_id': [0, 2]}, limit=3)
+        self.assertEqual(([2, 3, 5], 20), ([row['id'] for row in results], total))
+
+    def test_string_shard_values(self):
+        self.assertEqual(10, self.resource.count({'dept_id': '1'}))
+        self.assertEqual(20, self.resource.count({'dept_id': ['0', '2']}))
+        self.assertEqual(10, self.resource.count({'dept_id': {'eq': '2'}}))
+        self.assertEqual(10, self.resource.shard('1').count({'dept_id': '1'}))
+        self.assertRaises(exceptions.ValidationError, self.resource.count, {'dept_id': 'x'})
+        self.assertRaises(exceptions.ValidationError, self.resource.shard, 'x')
+
+    def test_empty_in(self):
+        for filters in ({'dept_id': []}, {'dept_id': {'in': []}}):
+            self.assertEqual([], self.resource.list(filters))
+            self.assertEqual(0, self.resource.count(filters))
+            self.assertEqual(([], 0), self.resource.list_with_total(filters, limit=10))
+            self.assertEqual(0, self.resource.delete_by_filter(filters, soft=False))
+
+    def test_unrouted_methods_require_shard(self):
+        self.assertRaises(exceptions.CriticalError, self.resource.get, 1)
+        self.assertRaises(exceptions.CriticalError, self.resource.get_many, [1, 2])
+        self.assertRaises(exceptions.CriticalError, self.resource.list_by_cursor)
+        self.assertEqual('t3', self.resource.shard(0).get(3)['name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
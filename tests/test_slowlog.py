@@ -0,0 +1,72 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Entry(Base, DictBase):
+    __tablename__ = 'slowlog_entry'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    password = Column(String(32))
+
+
+class EntryResource(crud.ResourceBase):
+    orm_meta = Entry
+
+
+class SlowQueryLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.records = []
+        self.dbpool = pool.DBPool({
+            'connection': 'sqlite:///' + os.path.join(self.tmpdir, 'slowlog.db'), 'echo': False,
+            'poolclass': QueuePool, 'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 2,
+            'slow_query_threshold': 0, 'slow_query_explain': True, 'slow_query_callback': self.records.append,
+        })
+        Base.metadata.create_all(self.dbpool._pool.kw['bind'])
+        del self.records[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_explain_does_not_wait_for_saturated_pool(self):
+        started = time.time()
+        EntryResource(dbpool=self.dbpool).count({'name': 'x'})
+        self.assertLess(time.time() - started, 1)
+        record = [item for item in self.records if item['method'] == 'count'][0]
+        self.assertEqual('EntryResource', record['resource'])
+        self.assertTrue(record['explain'])
+
+    def test_cached_statement_parameters_are_redacted(self):
+        resource = EntryResource(dbpool=self.dbpool)
+        self.assertTrue(resource._statement_cache)
+        for _i in range(2):
+            resource.list({'password': 'hunter2', 'name': 'x'})
+        records = [item for item in self.records if item['method'] == 'list']
+        self.assertEqual(2, len(records))
+        for record in records:
+            self.assertNotIn('hunter2', repr(record['parameters']))
+            self.assertIn('x', record['parameters'])
+            self.assertEqual('***', record['filters']['password'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import event
+from sqlalchemy.ext.declarative import declarative_base
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Flagged(Base, DictBase):
+    __tablename__ = 'statement_cache_flagged'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    flag = Column(Boolean)
+
+
+class FlaggedResource(crud.ResourceBase):
+    orm_meta = Flagged
+    _default_order = ['id']
+
+
+class UncachedFlaggedResource(FlaggedResource):
+    _statement_cache = False
+
+
+class OwnedFlaggedResource(FlaggedResource):
+
+    def __init__(self, name, **kwargs):
+        super(OwnedFlaggedResource, self).__init__(**kwargs)
+        self.name = name
+
+    def _get_query(self, session, *args, **kwargs):
+        query = super(OwnedFlaggedResource, self)._get_query(session, *args, **kwargs)
+        return query.filter(Flagged.name == self.name)
+
+
+class StatementCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        engine = self.dbpool._pool.kw['bind']
+        Base.metadata.create_all(engine)
+        engine.execute(Flagged.__table__.insert(), [
+            {'id': 1, 'name': 'a', 'flag': True},
+            {'id': 2, 'name': 'b', 'flag': False},
+            {'id': 3, 'name': None, 'flag': True},
+            {'id': 4, 'name': 'd', 'flag': None},
+        ])
+        self.resource = FlaggedResource(dbpool=self.dbpool)
+
+    def _ids(self, filters):
+        return [row['id'] for row in self.resource.list(filters)]
+
+    def test_boolean_values_are_not_shared(self):
+        self.assertEqual([1, 3], self._ids({'flag': True}))
+        self.assertEqual([2], self._ids({'flag': False}))
+        self.assertEqual(2, self.resource.count({'flag': True}))
+        self.assertEqual(1, self.resource.count({'flag': False}))
+        self.assertEqual([1, 3], self._ids({'flag': {'ne': False}}))
+        self.assertEqual([2], self._ids({'flag': {'ne': True}}))
+
+    def test_boolean_strings_are_not_shared(self):
+        self.assertEqual([1, 3], self._ids({'flag': 'true'}))
+        self.assertEqual([2], self._ids({'flag': 'false'}))
+
+    def test_none_values_are_not_shared(self):
+        self.assertEqual([3], self._ids({'name': None}))
+        self.assertEqual([1], self._ids({'name': 'a'}))
+        self.assertEqual([1, 2], self._ids({'id': [1, 2]}))
+        self.assertEqual([3], self._ids({'id': [3, None]}))
+        self.assertEqual([1, 2], self._ids({'id': [1, 2]}))
+
+    def test_uncached_count_without_subquery(self):
+        statements = []
+        event.listen(self.dbpool._pool.kw['bind'], 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        resource = UncachedFlaggedResource(dbpool=self.dbpool)
+        self.assertEqual(2, resource.count({'flag': True}))
+        self.assertEqual(1, len(statements))
+        self.assertNotIn('(SELECT', statements[0])
+        self.assertEqual(1, resource.count({'flag': True}, offset=1))
+
+    def test_overridden_query_builder_is_not_cached(self):
+        for name, expected in (('a', [1]), ('b', [2]), ('d', [4])):
+            resource = OwnedFlaggedResource(name, dbpool=self.dbpool)
+            self.assertEqual(expected, [row['id'] for row in resource.list({'id': {'lt': 5}})])
+            self.assertEqual(len(expected), resource.count({'id': {'lt': 5}}))
+
+    def test_cache_hit_rebinds_values(self):
+        cached = FlaggedResource(dbpool=self.dbpool)
+        uncached = UncachedFlaggedResource(dbpool=self.dbpool)
+        cases = [
+            {'id': {'gte': 2, 'lt': 4}}, {'id': {'gte': 1, 'lt': 3}},
+            {'id': [1, 4]}, {'id': [2, 3]}, {'id': [3, None]}, {'id': [1, 2]},
+            {'name': 'a'}, {'name': None}, {'name': 'd'},
+            {'name': {'like': 'a'}}, {'name': {'like': 'b'}},
+            {'flag': 'true', 'id': {'ne': 1}}, {'flag': 'false', 'id': {'ne': 1}}, {'flag': None, 'id': {'ne': 1}},
+            {'$or': [{'id': 1}, {'name': 'b'}]}, {'$or': [{'id': 3}, {'name': 'd'}]},
+            {'$or': [{'id': 3}, {'name': None}]},
+        ]
+        for filters in cases:
+            expected = [row['id'] for row in uncached.list(filters)]
+            self.assertEqual(expected, [row['id'] for row in cached.list(filters)], filters)
+            self.assertEqual(len(expected), cached.count(filters), filters)
+
+    def test_cache_hit_skips_expression_building(self):
+        resource = FlaggedResource(dbpool=self.dbpool)
+        resource.list({'id': {'gte': 2}, 'name': ['b', 'x'], 'flag': True})
+        calls = []
+        original = crud._filter_expression
+
+        def _counting(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+
+        crud._filter_expression = _counting
+        try:
+            rows = resource.list({'id': {'gte': 1}, 'name': ['a', 'd'], 'flag': True})
+        finally:
+            crud._filter_expression = original
+        self.assertEqual([1], [row['id'] for row in rows])
+        self.assertEqual([], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import sqlalchemy
+import sqlalchemy.exc
+
+from neptune.db import pool
+from neptune.db import stats
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_snapshot(self):
+        histogram = stats.Histogram(buckets=(0.1, 1.0))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.05, 0.05, 0.5, 3.0):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 4)
+        self.assertAlmostEqual(snapshot['sum'], 3.6)
+        self.assertEqual(snapshot['max'], 3.0)
+        self.assertEqual(snapshot['buckets'], [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(snapshot['p50'], 0.1)
+        self.assertEqual(snapshot['p95'], 3.0)
+
+
+class DBPoolStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.observations = []
+        self.dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False,
+                                   'stats_callback': lambda *args: self.observations.append(args)})
+        self.engine = self.dbpool._pool.kw['bind']
+
+    def test_statements(self):
+        for idx in range(3):
+            self.engine.execute('SELECT %d' % (idx % 2))
+        snapshot = self.dbpool.stats()['primary']
+        self.assertEqual(snapshot['execute']['count'], 3)
+        self.assertEqual(snapshot['statements']['SELECT 0']['count'], 2)
+        self.assertEqual(snapshot['statements']['SELECT 1']['count'], 1)
+        self.assertTrue(snapshot['checkouts'] >= 3)
+        self.assertEqual(snapshot['checkouts'], snapshot['checkins'])
+        self.assertNotIn('statements', self.dbpool.stats(statements=False)['primary'])
+        self.assertEqual([args[0] for args in self.observations], ['statement'] * 3)
+        self.assertEqual(self.observations[0][2], {'pool': 'primary', 'statement': 'SELECT 0'})
+
+    def test_statement_limit(self):
+        original = stats.MAX_STATEMENTS
+        stats.MAX_STATEMENTS = 2
+        try:
+            for idx in range(4):
+                self.engine.execute('SELECT %d' % idx)
+        finally:
+            stats.MAX_STATEMENTS = original
+        statements = self.dbpool.stats()['primary']['statements']
+        self.assertEqual(sorted(statements), ['<other>', 'SELECT 0', 'SELECT 1'])
+        self.assertEqual(statements['<other>']['count'], 2)
+
+    def test_errors(self):
+        self.assertRaises(sqlalchemy.exc.OperationalError, self.engine.execute, 'SELECT * FROM missing_table')
+        self.engine.execute('SELECT 1')
+        snapshot = self.dbpool.stats()['primary']
+        self.assertEqual(snapshot['errors'], 1)
+        self.assertEqual(snapshot['execute']['count'], 1)
+
+    def test_disabled(self):
+        dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False, 'stats': False})
+        dbpool._pool.kw['bind'].execute('SELECT 1')
+        self.assertEqual(dict(dbpool.stats()), {})
+
+
+@unittest.skipUnless(stats.instrumented_pool_supported(), 'QueuePool._do_get is not available')
+class InstrumentedQueuePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.engine = sqlalchemy.create_engine('sqlite:///' + os.path.join(self.tmpdir, 'stats.db'),
+                                               poolclass=stats.InstrumentedQueuePool, pool_size=2, max_overflow=1,
+                                               connect_args={'check_same_thread': False})
+        self.observations = []
+        self.stats = stats.EngineStats(self.engine, 'primary', callback=lambda *args: self.observations.append(args))
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_checkout_wait(self):
+        connections = [self.engine.connect() for _ in range(3)]
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot['checkout_wait']['count'], 3)
+        self.assertEqual(snapshot['connections'], 3)
+        self.assertEqual((snapshot['pool_size'], snapshot['in_use'], snapshot['overflow']), (2, 3, 1))
+        for connection in connections:
+            connection.close()
+        snapshot = self.stats.snapshot()
+        self.assertEqual((snapshot['in_use'], snapshot['idle']), (0, 2))
+        self.assertEqual(snapshot['closes'], 1)
+        self.assertIn(('checkout_wait', self.observations[0][1], {'pool': 'primary'}), self.observations)
+
+    def test_recreate(self):
+        self.engine.dispose()
+        self.engine.connect().close()
+        self.assertIs(self.engine.pool.stats, self.stats)
+        self.assertEqual(self.stats.snapshot()['checkout_wait']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import collections
+import unittest
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.sql import Select
+
+from neptune.db import crud
+from neptune.db import pool
+from neptune.db.dictbase import DictBase
+
+Base = declarative_base()
+
+
+class Item(Base, DictBase):
+    __tablename__ = 'upsert_item'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+
+
+class ItemResource(crud.ResourceBase):
+    orm_meta = Item
+
+
+class _Bind(object):
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+
+
+class _Result(object):
+
+    def __init__(self, rows=None, rowcount=0):
+        self.rows = rows or []
+        self.rowcount = rowcount
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalar(self):
+        return self.rows[0][0]
+
+
+class FakeSession(object):
+    """模拟MySQL/PostgreSQL的upsert行为，表数据为{id: name}"""
+
+    def __init__(self, dialect, data):
+        self.dialect = dialect
+        self.data = data
+        self.info = {}
+        self.statements = []
+
+    def get_bind(self, mapper=None):
+        return _Bind(self.dialect)
+
+    def execute(self, stmt, mapper=None):
+        compiled = stmt.compile(dialect=self.dialect)
+        self.statements.append(str(compiled))
+        if isinstance(stmt, Select):
+            values = [value for value in compiled.params.values() for value in
+                      (value if isinstance(value, (list, tuple)) else [value])]
+            return _Result([(len([value for value in values if value in self.data]),)])
+        # 多行INSERT的参数名为<列名>_m<行号>
+        rows = collections.defaultdict(dict)
+        for name, value in compiled.params.items():
+            column, _sep, index = name.rpartition('_m')
+            rows[int(index)][column] = value
+        rows = [rows[index] for index in sorted(rows)]
+        do_nothing = 'DO NOTHING' in str(compiled)
+        rowcount = 0
+        flags = []
+        for row in rows:
+            if row['id'] not in self.data:
+                self.data[row['id']] = row.get('name')
+                rowcount += 1
+                flags.append((True,))
+            elif do_nothing:
+                continue
+            else:
+                # CLIENT_FOUND_ROWS: 值未变化计1行，变化计2行
+                rowcount += 1 if self.data[row['id']] == row.get('name') or 'name' not in row else 2
+                self.data[row['id']] = row.get('name', self.data[row['id']])
+                flags.append((False,))
+        return _Result(flags, rowcount)
+
+
+class UpsertCountTest(unittest.TestCase):
+
+    def _upsert(self, dialect, rows):
+        data = {1: 'a', 2: 'b'}
+        session = FakeSession(dialect, data)
+        summary = ItemResource(transaction=session).upsert_many(rows)
+        return summary, session
+
+    def test_mysql_counts_unchanged_rows_as_updated(self):
+        summary, session = self._upsert(mysql.dialect(), [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'x'},
+                                                          {'id': 3, 'name': 'c'}])
+        self.assertEqual((1, 2), (summary['inserted'], summary['updated']))
+        self.assertIn('ON DUPLICATE KEY UPDATE', session.statements[-1])
+
+    def test_mysql_without_update_columns(self):
+        summary, _session = self._upsert(mysql.dialect(), [{'id': 1}, {'id': 3}])
+        self.assertEqual((1, 1), (summary['inserted'], summary['updated']))
+
+    def test_postgresql_counts(self):
+        summary, session = self._upsert(postgresql.dialect(), [{'id': 1, 'name': 'a'}, {'id': 3, 'name': 'c'}])
+        self.assertEqual((1, 1), (summary['inserted'], summary['updated']))
+        self.assertIn('ON CONFLICT (id) DO UPDATE', session.statements[-1])
+
+    def test_postgresql_do_nothing_counts_skipped_rows(self):
+        summary, session = self._upsert(postgresql.dialect(), [{'id': 1}, {'id': 2}, {'id': 3}])
+        self.assertEqual((1, 2), (summary['inserted'], summary['updated']))
+        self.assertIn('DO NOTHING', session.statements[-1])
+
+    def test_sqlite_counts(self):
+        dbpool = pool.DBPool({'connection': 'sqlite://', 'echo': False})
+        Base.metadata.create_all(dbpool._pool.kw['bind'])
+        resource = ItemResource(dbpool=dbpool)
+        resource.create_many([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])
+        summary = resource.upsert_many([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'x'}, {'id': 3, 'name': 'c'}])
+        self.assertEqual((1, 2), (summary['inserted'], summary['updated']))
+        self.assertEqual(['a', 'x', 'c'], [row['name'] for row in resource.list(orders=['id'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from neptune.db import pool
+from neptune.db import stats
+from neptune.db import warmup
+
+
+class WarmupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbpool = pool.DBPool({
+            'connection': 'sqlite:///' + os.path.join(self.tmpdir, 'warmup.db'), 'echo': False,
+            'poolclass': QueuePool, 'pool_size': 5, 'max_overflow': 0,
+            'connect_args': {'check_same_thread': False}, 'pool_prewarm': 2,
+        })
+        self.engine = self.dbpool._pool.kw['bind']
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_prewarm(self):
+        self.assertEqual(2, self.engine.pool.checkedin())
+        self.assertEqual(2, self.dbpool.stats()['primary']['warmup']['connections'])
+
+    def test_maintain_does_not_borrow_idle_connections(self):
+        checkouts = []
+        event.listen(self.engine, 'checkout', lambda *args: checkouts.append(args))
+        in_use = self.engine.connect()
+        maintainer = warmup.IdleMaintainer([(self.engine, None)], min_idle=4, interval=60)
+        self.assertEqual(3, maintainer.maintain())
+        self.assertEqual(1, len(checkouts))
+        self.assertEqual(4, self.engine.pool.checkedin())
+        # 总连接数不超过pool_size
+        maintainer.min_idle = 10
+        self.assertEqual(0, maintainer.maintain())
+        self.assertEqual(4, self.engine.pool.checkedin())
+        in_use.close()
+        self.assertEqual(5, self.engine.pool.checkedin())
+
+    def test_open_connections_without_pool_internals(self):
+        original = warmup._POOL_INTERNALS
+        warmup._POOL_INTERNALS = original + ('_missing_internal',)
+        try:
+            in_use = self.engine.connect()
+            maintainer = warmup.IdleMaintainer([(self.engine, None)], min_idle=3, interval=60)
+            self.assertEqual(2, maintainer.maintain())
+            self.assertEqual(3, self.engine.pool.checkedin())
+            self.assertEqual(0, warmup.prewarm(self.engine, 3))
+            in_use.close()
+            self.assertEqual(4, self.engine.pool.checkedin())
+        finally:
+            warmup._POOL_INTERNALS = original
+
+    def test_stats_without_instrumented_pool(self):
+        original = stats.instrumented_pool_supported
+        stats.instrumented_pool_supported = lambda: False
+        try:
+            dbpool = pool.DBPool({'connection': 'sqlite:///' + os.path.join(self.tmpdir, 'plain.db'), 'echo': False})
+        finally:
+            stats.instrumented_pool_supported = original
+        engine = dbpool._pool.kw['bind']
+        self.assertNotIsInstance(engine.pool, stats.InstrumentedQueuePool)
+        with engine.connect() as connection:
+            connection.execute('SELECT 1')
+        self.assertIn('primary', dbpool.stats())
+        dbpool.dispose()
+
+    def test_reflesh_disposes_previous_engines(self):
+        closed = []
+        event.listen(self.engine, 'close', lambda *args: closed.append(args))
+        param = {
+            'connection': 'sqlite:///' + os.path.join(self.tmpdir, 'warmup.db'), 'echo': False,
+            'poolclass': QueuePool, 'pool_size': 5, 'max_overflow': 0,
+            'connect_args': {'check_same_thread': False}, 'pool_prewarm': 2,
+            'pool_min_idle': 1, 'pool_maintain_interval': 60, 'slow_query_explain': True,
+        }
+        self.dbpool.reflesh(param)
+        self.assertEqual(2, len(closed))
+        first_maintainer = self.dbpool._maintainer
+        first_engines = list(self.dbpool._engines)
+        self.assertEqual(2, len(first_engines))
+        self.dbpool.reflesh(param)
+        self.assertTrue(first_maintainer._stopped.is_set())
+        self.assertEqual([], first_maintainer.engines)
+        self.assertEqual(0, first_engines[0].pool.checkedin())
+        self.assertNotIn(first_engines[0], self.dbpool._engines)
+        self.engine = self.dbpool._pool.kw['bind']
+        self.assertEqual(2, self.engine.pool.checkedin())
+        self.dbpool.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()